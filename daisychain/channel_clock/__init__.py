@@ -0,0 +1 @@
+default_app_config = 'channel_clock.apps.ChannelClockConfig'
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ChannelClockConfig(AppConfig):
     name = 'channel_clock'
+
+    def ready(self):
+        import channel_clock.signals  # noqa
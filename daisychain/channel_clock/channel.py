@@ -4,7 +4,7 @@ from django.contrib.humanize.templatetags.humanize import ordinal
 from core.channel import (Channel, NotSupportedTrigger, NotSupportedAction,
                           ConditionNotMet, ChannelStateForUser)
 from core.models import Trigger, TriggerInput
-from core.utils import replace_text_mappings
+from core.templating import render_mappings
 from channel_clock.models import ClockUserSettings
 from locale import (nl_langinfo,
                     DAY_1, DAY_2, DAY_3, DAY_4, DAY_5, DAY_6, DAY_7,
@@ -89,7 +89,12 @@ class ClockChannel(Channel):
 
         offset = ClockUserSettings.objects.get(user__pk=userid).utcoffset
         user_timezone = timezone(timedelta(minutes=offset))
-        current_datetime = mockable_now(tz=user_timezone)
+        if payload and payload.get('fire_time') is not None:
+            # scheduled minute, which may be in the past if fired late
+            current_datetime = datetime.fromtimestamp(payload['fire_time'],
+                                                      tz=user_timezone)
+        else:
+            current_datetime = mockable_now(tz=user_timezone)
 
         # check if trigger is valid
         try:
@@ -137,18 +142,8 @@ class ClockChannel(Channel):
         current_time = current_datetime.strftime("%X")
 
         # fill mappings (equal for all Triggers)
-        mappings_filled = {}
-
-        for key in mappings:
-            val = mappings[key]
-            if type(val) is str:
-                if val.find("%date%") > -1:
-                    val = val.replace("%date%", current_date)
-                if val.find("%time%") > -1:
-                    val = val.replace("%time%", current_time)
-            mappings_filled[key] = val
-
-        return mappings_filled
+        return render_mappings(mappings, {"date": current_date,
+                                          "time": current_time})
 
     def user_is_connected(self, user):
         if ClockUserSettings.objects.filter(user=user).count() > 0:
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-18 18:07
+from __future__ import unicode_literals
+
+from datetime import datetime, time, timedelta, timezone
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# a copy of channel_clock.schedule.next_fire_time at the time of this
+# migration, with the trigger types of channel_clock.channel.TriggerType
+def next_fire_time(trigger_type, conditions, utcoffset, after):
+    user_timezone = timezone(timedelta(minutes=utcoffset))
+    start = after.astimezone(user_timezone)
+    if start.second or start.microsecond:
+        start = start.replace(second=0, microsecond=0) + timedelta(minutes=1)
+
+    try:
+        if trigger_type == 2:  # every hour
+            minute = int(conditions["Minutes"])
+            candidate = start.replace(minute=minute)
+            if candidate < start:
+                candidate += timedelta(hours=1)
+            return candidate.astimezone(timezone.utc)
+
+        hour, minute = (int(x) for x in conditions["Time"].split(":"))
+        fire_time = time(hour, minute, tzinfo=user_timezone)
+
+        if trigger_type == 1:  # every day
+            def matches(day):
+                return True
+        elif trigger_type == 3:  # every weekday
+            weekdays = set(int(x) for x in conditions["Weekdays"].split(","))
+
+            def matches(day):
+                return day.weekday() in weekdays
+        elif trigger_type == 4:  # every month
+            month_day = int(conditions["Day"])
+
+            def matches(day):
+                return day.day == month_day
+        elif trigger_type == 5:  # every year
+            date = conditions["Date"]
+
+            def matches(day):
+                return day.strftime("%m-%d") == date
+        else:
+            return None
+    except (KeyError, ValueError, AttributeError):
+        return None
+
+    day = start.date()
+    for _ in range(8 * 366):
+        if matches(day):
+            candidate = datetime.combine(day, fire_time)
+            if candidate >= start:
+                return candidate.astimezone(timezone.utc)
+        day += timedelta(days=1)
+    return None
+
+
+def create_schedules(apps, schema_editor):
+    Recipe = apps.get_model('core', 'Recipe')
+    ClockSchedule = apps.get_model('channel_clock', 'ClockSchedule')
+    ClockUserSettings = apps.get_model('channel_clock', 'ClockUserSettings')
+
+    now = datetime.now(timezone.utc)
+    offsets = dict(ClockUserSettings.objects.values_list('user_id',
+                                                         'utcoffset'))
+    for recipe in Recipe.objects.filter(trigger__channel__name="Clock") \
+                                .select_related('trigger'):
+        next_fire = None
+        if recipe.user_id in offsets:
+            conditions = dict(recipe.recipecondition_set
+                              .values_list('trigger_input__name', 'value'))
+            next_fire = next_fire_time(recipe.trigger.trigger_type,
+                                       conditions, offsets[recipe.user_id],
+                                       now)
+        ClockSchedule.objects.create(recipe=recipe, next_fire=next_fire)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_recipecondition_value_hash'),
+        ('channel_clock', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClockSchedule',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('next_fire', models.DateTimeField(db_index=True, null=True, verbose_name='Next fire time')),
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='core.Recipe')),
+            ],
+        ),
+        migrations.RunPython(create_schedules, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,7 @@
 from django.contrib.auth.models import User
 from django.db import models
 from django.utils.translation import ugettext_lazy as _
+from core.models import Recipe
 
 # Create your models here.
 class ClockUserSettings(models.Model):
@@ -16,3 +17,19 @@ class ClockUserSettings(models.Model):
     def __str__(self):
         return "Clock settings for user {} (id={})".format(self.user.username,
                                                            self.user.id)
+
+
+class ClockSchedule(models.Model):
+    """Next fire time of a Clock recipe, kept up to date on changes of the
+    recipe, its conditions and the Clock settings of its user."""
+
+    recipe = models.OneToOneField(Recipe, on_delete=models.CASCADE)
+    next_fire = models.DateTimeField(_("Next fire time"), null=True,
+                                     db_index=True)
+
+    class Meta:
+        app_label = "channel_clock"
+
+    def __str__(self):
+        return "Clock schedule of recipe {}: {}".format(self.recipe_id,
+                                                        self.next_fire)
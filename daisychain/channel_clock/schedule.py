@@ -0,0 +1,113 @@
+from datetime import datetime, time, timedelta, timezone
+
+from channel_clock.channel import TriggerType
+from channel_clock.models import ClockSchedule, ClockUserSettings
+from core.models import RecipeCondition
+
+# every date of a year recurs within eight years, even the 29th of February
+MAX_DAYS = 8 * 366
+
+
+def next_fire_time(trigger_type, conditions, utcoffset, after):
+    """
+    Computes when a Clock trigger fires next.
+
+    Args:
+        trigger_type: Trigger type of the recipe, see TriggerType.
+        conditions: Dict of the recipe conditions by TriggerInput name.
+        utcoffset: UTC offset of the user in minutes.
+        after: Aware datetime, the earliest time to consider.
+
+    Returns:
+        The first full minute at or after `after` at which the conditions
+        are met, as an aware datetime in UTC, or None if the conditions are
+        incomplete or can never be met.
+    """
+    user_timezone = timezone(timedelta(minutes=utcoffset))
+    start = after.astimezone(user_timezone)
+    if start.second or start.microsecond:
+        start = start.replace(second=0, microsecond=0) + timedelta(minutes=1)
+
+    try:
+        trigger_type = TriggerType(trigger_type)
+
+        if trigger_type is TriggerType.every_hour:
+            minute = int(conditions["Minutes"])
+            candidate = start.replace(minute=minute)
+            if candidate < start:
+                candidate += timedelta(hours=1)
+            return candidate.astimezone(timezone.utc)
+
+        hour, minute = (int(x) for x in conditions["Time"].split(":"))
+        fire_time = time(hour, minute, tzinfo=user_timezone)
+
+        if trigger_type is TriggerType.every_day:
+            def matches(day):
+                return True
+        elif trigger_type is TriggerType.every_weekday:
+            weekdays = set(int(x) for x in conditions["Weekdays"].split(","))
+
+            def matches(day):
+                return day.weekday() in weekdays
+        elif trigger_type is TriggerType.every_month:
+            month_day = int(conditions["Day"])
+
+            def matches(day):
+                return day.day == month_day
+        else:  # if trigger_type is TriggerType.every_year
+            date = conditions["Date"]
+
+            def matches(day):
+                return day.strftime("%m-%d") == date
+    except (KeyError, ValueError, AttributeError):
+        return None
+
+    day = start.date()
+    for _ in range(MAX_DAYS):
+        if matches(day):
+            candidate = datetime.combine(day, fire_time)
+            if candidate >= start:
+                return candidate.astimezone(timezone.utc)
+        day += timedelta(days=1)
+    return None
+
+
+def compute_next_fires(recipes, after):
+    """Computes the next fire times after `after` of Clock recipes, with
+    two queries for all of them.
+
+    Args:
+        recipes: Recipes, with their triggers loaded.
+        after: Aware datetime, the earliest time to consider.
+
+    Returns:
+        A dict of the next fire time by recipe id. The fire time is None as
+        long as the user has no Clock settings.
+    """
+    utcoffsets = dict(ClockUserSettings.objects
+                      .filter(user_id__in={r.user_id for r in recipes})
+                      .values_list('user_id', 'utcoffset'))
+    conditions = {}
+    for recipe_id, name, value in RecipeCondition.objects \
+            .filter(recipe_id__in=[r.id for r in recipes]) \
+            .values_list('recipe_id', 'trigger_input__name', 'value'):
+        conditions.setdefault(recipe_id, {})[name] = value
+
+    next_fires = {}
+    for recipe in recipes:
+        utcoffset = utcoffsets.get(recipe.user_id)
+        if utcoffset is None:
+            next_fires[recipe.id] = None
+        else:
+            next_fires[recipe.id] = next_fire_time(
+                recipe.trigger.trigger_type, conditions.get(recipe.id, {}),
+                utcoffset, after)
+    return next_fires
+
+
+def update_schedule(recipe, after):
+    """Stores the next fire time after `after` of a Clock recipe."""
+    next_fire = compute_next_fires([recipe], after)[recipe.id]
+    ClockSchedule.objects.update_or_create(recipe=recipe,
+                                           defaults={'next_fire': next_fire})
+    return next_fire
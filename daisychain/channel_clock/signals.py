@@ -0,0 +1,52 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import Recipe, RecipeCondition, Trigger
+from channel_clock.models import ClockSchedule, ClockUserSettings
+from channel_clock.schedule import update_schedule
+
+
+def _is_clock_recipe(recipe):
+    # one small query for the saves of recipes of all channels
+    return Trigger.objects.filter(pk=recipe.trigger_id,
+                                  channel__name="Clock").exists()
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, raw=False, **kwargs):
+    if raw or not _is_clock_recipe(instance):
+        return
+    update_schedule(instance, timezone.now())
+
+
+@receiver(post_save, sender=RecipeCondition)
+@receiver(post_delete, sender=RecipeCondition)
+def recipe_condition_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    try:
+        recipe = instance.recipe
+    except Recipe.DoesNotExist:
+        # deleted together with its recipe, and so is the schedule
+        return
+    if _is_clock_recipe(recipe):
+        update_schedule(recipe, timezone.now())
+
+
+@receiver(post_save, sender=ClockUserSettings)
+def clock_settings_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    now = timezone.now()
+    for recipe in Recipe.objects.filter(user_id=instance.user_id,
+                                        trigger__channel__name="Clock") \
+                                .select_related('trigger'):
+        update_schedule(recipe, now)
+
+
+@receiver(post_delete, sender=ClockUserSettings)
+def clock_settings_deleted(sender, instance, **kwargs):
+    # without an utcoffset the recipes cannot fire
+    ClockSchedule.objects.filter(recipe__user_id=instance.user_id) \
+                         .update(next_fire=None)
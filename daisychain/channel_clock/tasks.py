@@ -1,25 +1,48 @@
-from datetime import datetime, timedelta, timezone
+from datetime import timedelta, timezone
 from celery import shared_task
+from django.conf import settings
 from core.core import Core
-from core.models import Recipe
+from channel_clock.channel import mockable_now
+from channel_clock.models import ClockSchedule
+from channel_clock.schedule import compute_next_fires
 
 @shared_task
 def beat():
 
-    clock_recipes = Recipe.objects.filter(trigger__channel__name="Clock")
-
-    triggered_combinations = set()
-
-    for recipe in clock_recipes:
-
-        trigger_user_pair = (recipe.trigger.trigger_type, recipe.user.id)
-
-        if trigger_user_pair in triggered_combinations:
+    minute = mockable_now(tz=timezone.utc).replace(second=0, microsecond=0)
+    next_minute = minute + timedelta(minutes=1)
+    # minutes missed while no beat was running are fired late, up to
+    # CLOCK_CATCH_UP seconds
+    catch_up = timedelta(seconds=getattr(settings, 'CLOCK_CATCH_UP', 300))
+
+    # schedule the next fire of the recipes due now, and skip the minutes
+    # missed for longer than CLOCK_CATCH_UP. A schedule is claimed by moving
+    # its fire time on only if it is unchanged, so overlapping beat runs
+    # never fire it twice.
+    due = list(ClockSchedule.objects.filter(next_fire__lt=next_minute)
+                                    .select_related('recipe__trigger'))
+    next_fires = compute_next_fires([schedule.recipe for schedule in due],
+                                    next_minute)
+
+    triggered_combinations = []
+    for schedule in due:
+        claimed = ClockSchedule.objects \
+            .filter(pk=schedule.pk, next_fire=schedule.next_fire) \
+            .update(next_fire=next_fires[schedule.recipe_id])
+        if not claimed or schedule.next_fire < minute - catch_up:
             continue
-
-        Core().handle_trigger(channel_name="Clock",
-                              trigger_type=recipe.trigger.trigger_type,
-                              userid=recipe.user.id,
-                              payload=None)
-
-        triggered_combinations.add(trigger_user_pair)
+        combination = (schedule.recipe.trigger.trigger_type,
+                       schedule.recipe.user_id, schedule.next_fire)
+        if combination not in triggered_combinations:
+            triggered_combinations.append(combination)
+
+    if not triggered_combinations:
+        return
+
+    # the channel checks the conditions against the scheduled minute
+    Core().handle_triggers({'channel_name': "Clock",
+                            'trigger_type': trigger_type,
+                            'userid': user_id,
+                            'payload': {'fire_time': next_fire.timestamp()}}
+                           for trigger_type, user_id, next_fire
+                           in triggered_combinations)
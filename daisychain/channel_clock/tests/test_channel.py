@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from mock import patch
 from django.contrib.auth.models import User
 from django.test import TestCase
@@ -100,6 +100,20 @@ class ChannelTest(TestCase):
                     trigger_type, self.bob.id, {}, conditions, mappings)
         self.assertEqual(mappings_expected, mappings_filled)
 
+    @patch("channel_clock.channel.mockable_now")
+    def test_fill_recipe_mappings__fire_time(self, mock_now):
+        # fired late, the conditions are checked against the scheduled time
+        mock_now.return_value = self.wednesday_1530 + timedelta(minutes=2)
+        # 15:30 at the UTC offset of bob
+        fire_time = datetime(2016, 9, 21, 13, 30, tzinfo=timezone.utc)
+        payload = {'fire_time': fire_time.timestamp()}
+
+        mappings = {"time": "%time%"}
+        mappings_filled = self.channel.fill_recipe_mappings(
+                TriggerType.every_day, self.bob.id, payload,
+                {'Time': '15:30'}, mappings)
+        self.assertEqual({"time": "15:30:00"}, mappings_filled)
+
     def test_user_is_connected__initial(self):
         state = self.channel.user_is_connected(self.mallory)
         self.assertEqual(ChannelStateForUser.initial, state)
@@ -0,0 +1,122 @@
+from datetime import datetime, timezone
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone as django_timezone
+from core.models import (Channel, Trigger, TriggerInput, Action, Recipe,
+                         RecipeCondition)
+from channel_clock.models import ClockSchedule, ClockUserSettings
+from channel_clock.schedule import next_fire_time
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+class NextFireTimeTest(TestCase):
+
+    # Monday, the 3rd of October 2016, 10:30:20 UTC
+    after = utc(2016, 10, 3, 10, 30, 20)
+
+    def test_every_day(self):
+        self.assertEqual(next_fire_time(1, {"Time": "14:00"}, 0, self.after),
+                         utc(2016, 10, 3, 14, 0))
+        self.assertEqual(next_fire_time(1, {"Time": "9:00"}, 0, self.after),
+                         utc(2016, 10, 4, 9, 0))
+
+    def test_utcoffset(self):
+        # 12:45 at UTC+2 is 10:45 UTC
+        self.assertEqual(next_fire_time(1, {"Time": "12:45"}, 120,
+                                        self.after),
+                         utc(2016, 10, 3, 10, 45))
+        # 1:00 at UTC-10 is 11:00 UTC on the same day
+        self.assertEqual(next_fire_time(1, {"Time": "1:00"}, -600,
+                                        self.after),
+                         utc(2016, 10, 3, 11, 0))
+
+    def test_at_full_minute(self):
+        after = utc(2016, 10, 3, 14, 0)
+        self.assertEqual(next_fire_time(1, {"Time": "14:00"}, 0, after),
+                         after)
+
+    def test_every_hour(self):
+        self.assertEqual(next_fire_time(2, {"Minutes": "45"}, 0, self.after),
+                         utc(2016, 10, 3, 10, 45))
+        self.assertEqual(next_fire_time(2, {"Minutes": "30"}, 0, self.after),
+                         utc(2016, 10, 3, 11, 30))
+
+    def test_every_weekday(self):
+        # Wednesday and Sunday
+        conditions = {"Weekdays": "2,6", "Time": "8:15"}
+        self.assertEqual(next_fire_time(3, conditions, 0, self.after),
+                         utc(2016, 10, 5, 8, 15))
+
+    def test_every_month(self):
+        conditions = {"Day": "31", "Time": "0:00"}
+        self.assertEqual(next_fire_time(4, conditions, 0, self.after),
+                         utc(2016, 10, 31, 0, 0))
+        after = utc(2016, 11, 1)
+        self.assertEqual(next_fire_time(4, conditions, 0, after),
+                         utc(2016, 12, 31, 0, 0))
+
+    def test_every_year(self):
+        conditions = {"Date": "02-29", "Time": "12:00"}
+        self.assertEqual(next_fire_time(5, conditions, 0, self.after),
+                         utc(2020, 2, 29, 12, 0))
+
+    def test_invalid_conditions(self):
+        self.assertIsNone(next_fire_time(1, {}, 0, self.after))
+        self.assertIsNone(next_fire_time(1, {"Time": "noon"}, 0, self.after))
+        self.assertIsNone(next_fire_time(3, {"Weekdays": "", "Time": "1:00"},
+                                         0, self.after))
+        self.assertIsNone(next_fire_time(5, {"Date": "02-30", "Time": "1:00"},
+                                         0, self.after))
+        self.assertIsNone(next_fire_time(42, {"Time": "1:00"}, 0, self.after))
+
+
+class ScheduleSignalsTest(TestCase):
+    fixtures = ['channel_clock/fixtures/initial_data.json']
+
+    def setUp(self):
+        self.user = User.objects.create_user('max')
+        trigger = Trigger.objects.get(channel__name="Clock", trigger_type=2)
+        self.recipe = Recipe.objects.create(
+                trigger=trigger,
+                action=Action.objects.create(channel=trigger.channel,
+                                             action_type=2,
+                                             name="Test Action"),
+                user=self.user,
+                synopsis="Test synopsis")
+        self.condition = RecipeCondition(
+                recipe=self.recipe,
+                trigger_input=TriggerInput.objects.get(trigger=trigger),
+                value="15")
+
+    def next_fire(self):
+        return ClockSchedule.objects.get(recipe=self.recipe).next_fire
+
+    def test_recompute_on_changes(self):
+        self.condition.save()
+        self.assertIsNone(self.next_fire())
+
+        ClockUserSettings.objects.create(user=self.user, utcoffset=0)
+        next_fire = self.next_fire()
+        self.assertEqual(next_fire.minute, 15)
+        self.assertGreaterEqual(next_fire, django_timezone.now())
+
+        self.condition.value = "40"
+        self.condition.save()
+        self.assertEqual(self.next_fire().minute, 40)
+
+        ClockUserSettings.objects.filter(user=self.user).delete()
+        self.assertIsNone(self.next_fire())
+
+    def test_ignore_other_channels(self):
+        trigger = Trigger.objects.create(
+                channel=Channel.objects.create(name="Other"),
+                trigger_type=1,
+                name="Other Trigger")
+        recipe = Recipe.objects.create(trigger=trigger,
+                                       action=self.recipe.action,
+                                       user=self.user,
+                                       synopsis="Test synopsis")
+        self.assertFalse(ClockSchedule.objects.filter(recipe=recipe).exists())
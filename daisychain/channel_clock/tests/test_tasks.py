@@ -1,32 +1,159 @@
+from datetime import datetime, timezone
 from mock import patch
 from django.contrib.auth.models import User
-from django.test import TransactionTestCase
-from core.models import Channel, Trigger, Action, Recipe
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from core.models import (Channel, Trigger, TriggerInput, Action, Recipe,
+                         RecipeCondition)
+from channel_clock.models import ClockSchedule, ClockUserSettings
 from channel_clock.tasks import beat
 
 
 class TasksTest(TransactionTestCase):
     fixtures = ['channel_clock/fixtures/initial_data.json']
 
-    @patch("core.core.Core.handle_trigger")
-    def test_beat(self, mock_handle_trigger):
+    def setUp(self):
+        self.channel = Channel.objects.get(name="Clock")
+        self.trigger = Trigger.objects.get(channel=self.channel,
+                                           trigger_type=1)
+        self.action = Action.objects.create(channel=self.channel,
+                                            action_type=2,
+                                            name="Test Action")
 
+    def create_recipe(self, user, time):
+        recipe = Recipe.objects.create(trigger=self.trigger,
+                                       action=self.action,
+                                       user=user,
+                                       synopsis="Test synopsis")
+        RecipeCondition.objects.create(
+                recipe=recipe,
+                trigger_input=TriggerInput.objects.get(trigger=self.trigger,
+                                                       name="Time"),
+                value=time)
+        return recipe
+
+    @patch("core.core.Core.handle_triggers")
+    @patch("channel_clock.tasks.mockable_now")
+    def test_beat(self, mock_now, mock_handle_triggers):
+        maxmuster = User.objects.create_user('max')
+        erika = User.objects.create_user('erika')
+        ClockUserSettings.objects.create(user=maxmuster, utcoffset=120)
+        ClockUserSettings.objects.create(user=erika, utcoffset=0)
+
+        for i in range(2):
+            self.create_recipe(maxmuster, "12:30")
+        erikas_recipe = self.create_recipe(erika, "12:30")
+        due = datetime(2016, 10, 3, 10, 30, tzinfo=timezone.utc)
+        ClockSchedule.objects.update(next_fire=due)
+        ClockSchedule.objects.filter(recipe=erikas_recipe).update(
+                next_fire=datetime(2016, 10, 3, 12, 30, tzinfo=timezone.utc))
+
+        mock_now.return_value = datetime(2016, 10, 3, 10, 30, 5,
+                                         tzinfo=timezone.utc)
+        beat()
+
+        mock_handle_triggers.assert_called_once()
+        events = list(mock_handle_triggers.call_args[0][0])
+        self.assertEqual(events, [{'channel_name': self.channel.name,
+                                   'trigger_type': self.trigger.trigger_type,
+                                   'userid': maxmuster.id,
+                                   'payload': {'fire_time': due.timestamp()}}])
+
+        # the fired recipes are due on the next day
+        next_fires = set(ClockSchedule.objects
+                         .filter(recipe__user=maxmuster)
+                         .values_list('next_fire', flat=True))
+        self.assertEqual(next_fires, {datetime(2016, 10, 4, 10, 30,
+                                               tzinfo=timezone.utc)})
+
+    @patch("core.core.Core.handle_triggers")
+    @patch("channel_clock.tasks.mockable_now")
+    def test_beat_catch_up(self, mock_now, mock_handle_triggers):
+        maxmuster = User.objects.create_user('max')
+        ClockUserSettings.objects.create(user=maxmuster, utcoffset=0)
+        self.create_recipe(maxmuster, "10:30")
+        missed = datetime(2016, 10, 3, 10, 30, tzinfo=timezone.utc)
+        ClockSchedule.objects.update(next_fire=missed)
+
+        mock_now.return_value = datetime(2016, 10, 3, 10, 32,
+                                         tzinfo=timezone.utc)
+        beat()
+
+        events = list(mock_handle_triggers.call_args[0][0])
+        self.assertEqual([e['payload'] for e in events],
+                         [{'fire_time': missed.timestamp()}])
+        self.assertEqual(ClockSchedule.objects.get().next_fire,
+                         datetime(2016, 10, 4, 10, 30, tzinfo=timezone.utc))
+
+    @override_settings(CLOCK_CATCH_UP=60)
+    @patch("core.core.Core.handle_triggers")
+    @patch("channel_clock.tasks.mockable_now")
+    def test_beat_missed_minute(self, mock_now, mock_handle_triggers):
         maxmuster = User.objects.create_user('max')
-        channel = Channel.objects.get(name="Clock")
-        trigger = Trigger.objects.filter(channel=channel)[0]
-        action = Action.objects.create(channel=channel,
-                                       action_type=2,
-                                       name="Test Action")
+        ClockUserSettings.objects.create(user=maxmuster, utcoffset=0)
+        self.create_recipe(maxmuster, "10:30")
+        ClockSchedule.objects.update(
+                next_fire=datetime(2016, 10, 3, 10, 30, tzinfo=timezone.utc))
 
-        Recipe.objects.create(trigger=trigger,
-                              action=action,
-                              user=maxmuster,
-                              synopsis="Test synopsis")
+        mock_now.return_value = datetime(2016, 10, 3, 10, 32,
+                                         tzinfo=timezone.utc)
+        beat()
+
+        mock_handle_triggers.assert_not_called()
+        self.assertEqual(ClockSchedule.objects.get().next_fire,
+                         datetime(2016, 10, 4, 10, 30, tzinfo=timezone.utc))
+
+    @patch("core.core.Core.handle_triggers")
+    @patch("channel_clock.tasks.mockable_now")
+    def test_beat_claimed_by_other_run(self, mock_now, mock_handle_triggers):
+        maxmuster = User.objects.create_user('max')
+        ClockUserSettings.objects.create(user=maxmuster, utcoffset=0)
+        self.create_recipe(maxmuster, "10:30")
+        ClockSchedule.objects.update(
+                next_fire=datetime(2016, 10, 3, 10, 30, tzinfo=timezone.utc))
+        mock_now.return_value = datetime(2016, 10, 3, 10, 30,
+                                         tzinfo=timezone.utc)
+        next_fire = datetime(2016, 10, 4, 10, 30, tzinfo=timezone.utc)
+
+        def claimed_meanwhile(recipes, after):
+            # an overlapping beat run moves the schedule on first
+            ClockSchedule.objects.update(next_fire=next_fire)
+            return {recipe.id: next_fire for recipe in recipes}
+
+        with patch("channel_clock.tasks.compute_next_fires",
+                   side_effect=claimed_meanwhile):
+            beat()
+
+        mock_handle_triggers.assert_not_called()
+        self.assertEqual(ClockSchedule.objects.get().next_fire, next_fire)
+
+    @patch("core.core.Core.handle_triggers")
+    @patch("channel_clock.tasks.mockable_now")
+    def test_beat_queries(self, mock_now, mock_handle_triggers):
+        maxmuster = User.objects.create_user('max')
+        ClockUserSettings.objects.create(user=maxmuster, utcoffset=0)
+        for i in range(5):
+            self.create_recipe(maxmuster, "10:30")
+        ClockSchedule.objects.update(
+                next_fire=datetime(2016, 10, 3, 10, 30, tzinfo=timezone.utc))
+        mock_now.return_value = datetime(2016, 10, 3, 10, 30,
+                                         tzinfo=timezone.utc)
+
+        with CaptureQueriesContext(connection) as queries:
+            beat()
+
+        # the due schedules, and the settings and conditions of all recipes
+        self.assertEqual(len([q for q in queries.captured_queries
+                              if q['sql'].startswith('SELECT')]), 3)
+        mock_handle_triggers.assert_called_once()
+
+    @patch("core.core.Core.handle_triggers")
+    def test_beat_without_settings(self, mock_handle_triggers):
+        maxmuster = User.objects.create_user('max')
+        self.create_recipe(maxmuster, "10:30")
 
         beat()
 
-        mock_handle_trigger.assert_called_once_with(
-                channel_name=channel.name,
-                trigger_type=trigger.trigger_type,
-                userid=maxmuster.id,
-                payload=None)
+        self.assertIsNone(ClockSchedule.objects.get().next_fire)
+        mock_handle_triggers.assert_not_called()
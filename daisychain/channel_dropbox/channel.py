@@ -1,5 +1,4 @@
 import contextlib
-import datetime
 import time
 import os
 #import six
@@ -9,17 +8,26 @@ import unicodedata
 import dropbox
 from .models import DropboxAccount, DropboxUser
 
-from core.channel import (Channel, NotSupportedTrigger, NotSupportedAction,
-                          ConditionNotMet, ChannelStateForUser)
+from core.channel import (Channel, NotSupportedAction, ConditionNotMet,
+                          ChannelStateForUser)
+from core.templating import compile_template
 
 from django.contrib.auth.models import User
-from tempfile import TemporaryFile
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
 from enum import IntEnum
-import re
 import logging
 
 logger = logging.getLogger('channel')
 
+# downloads are streamed in chunks of this size and kept in memory only up
+# to SPOOL_MAX_SIZE bytes
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+# larger files are uploaded in chunks using an upload session
+UPLOAD_SESSION_THRESHOLD = 8 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+
 class ActionType(IntEnum):
     upload = 1
     download = 2
@@ -62,65 +70,57 @@ class DropboxChannel(Channel):
 
     def _fill_mappings(self, dbx, mappings, payload):
         #TODO check file size and Users max_space i.e. disk_allocated
-        download_trigger_names = ["data","jpg","png","video","audio"]
+        download_trigger_names = {"data","jpg","png","video","audio"}
         for key in mappings:
+            template = compile_template(mappings[key])
             #get all the fields to fill, with %<fields>%
-            fields = re.findall(r'%[a-z]+_?\-?[a-z]+%', mappings[key].lower())
-            if not fields:
+            match_fields = {field.lower() for field in template.fields}
+            if not match_fields:
                 continue
-            #remove the percent sign from fields
-            match_fields = list(map(lambda fields: fields[1:-1], fields))
 
             #check if mappings is expecting any file-object
-            if not set(download_trigger_names) & set(match_fields):
+            if not download_trigger_names & match_fields:
                 #no data objects necessary,
                 #so just fill from mappings from payload
-                #replace values from the key with the payload
-                for opts in payload:
-                    if opts in match_fields:
-                        #get index of entry in match_field, because it will
-                        #be the same in the fields, which we have to replace
-                        index = match_fields.index(opts)
-                        mappings[key] = mappings[key].replace(fields[index],
-                            payload[opts])
+                mappings[key] = template.render(payload)
             else:
-                for data in download_trigger_names:
-                    if data in match_fields:
-                        mappings[key] = self._fill_data(dbx, payload)
-                        #this key is set, and no further search
-                        #in payloads is required
-                        break
+                mappings[key] = self._fill_data(dbx, payload)
         return mappings
 
     def _fill_data(self, dbx, payload):
-        #Dropbox API suggests to use this method only if
-        #file size is below 150 MB
-        if payload['size'] < 150.0:
-            with self.stopwatch('fill_data'):
-                try:
-                    #meta is MetaData of file
-                    meta, res = dbx.files_download(payload['path'])
-                    data = res.content
-                    tmp_file = TemporaryFile()
-                    tmp_file.write(data)
-                    tmp_file.seek(0)
-
-                    logger.debug('downloading: %d bytes; metadata: %s' % \
-                        (len(data), meta))
-
-                    return tmp_file
-                except (TypeError, dropbox.exceptions.ApiError) as err:
-                        logger.error("[Dropbox Channel - fill_data] \
-                            Api_Error: ", err)
-                        raise ConditionNotMet("[DropboxChannel - fill_data]: ", err)
-
-        else :
-            #TODO write method which downlaods the data in chunks
-            #meanwhile
-            logger.error("[Dropbox Channel - fill_data] \
-                FileSize not supported")
-            raise NotSupportedTrigger("[Dropbox Channel - fill_data] \
-                The File size for download is not yet supported.")
+        with self.stopwatch('fill_data'):
+            try:
+                return self._download_to_spool(dbx, payload['path'])
+            except (TypeError, dropbox.exceptions.ApiError) as err:
+                    logger.error("[Dropbox Channel - fill_data] \
+                        Api_Error: ", err)
+                    raise ConditionNotMet("[DropboxChannel - fill_data]: ", err)
+
+    def _download_to_spool(self, dbx, path):
+        """Download a file in chunks of DOWNLOAD_CHUNK_SIZE bytes.
+
+        The chunks are written to a spooled temporary file, which is kept in
+        memory up to SPOOL_MAX_SIZE bytes and moved to disk when it gets
+        larger, so files of any size can be downloaded with flat memory use.
+        Return the file, positioned at its start.
+        """
+        #meta is MetaData of file, res the streamed http response
+        meta, res = dbx.files_download(path)
+        tmp_file = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        size = 0
+        try:
+            for chunk in res.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                tmp_file.write(chunk)
+                size += len(chunk)
+        except Exception:
+            tmp_file.close()
+            raise
+        finally:
+            res.close()
+        tmp_file.seek(0)
+
+        logger.debug('downloading: %d bytes; metadata: %s' % (size, meta))
+        return tmp_file
 
     def handle_action(self, action_type, userid, inputs):
         logger.debug("[DropboxChannel - handle_action] action_type: {}\
@@ -156,19 +156,13 @@ class DropboxChannel(Channel):
     def _dbx_download(self, dbx, path):
         """Download a file.
 
-        Return the bytes of the file, or None if it doesn't exist.
+        Return the file, streamed into a temporary file.
         """
         #Here we can start stop the time it takes to downlaod:
         #https://github.com/dropbox/dropbox-sdk-python/blob/master/example/updown.py
         with self.stopwatch('download'):
             try:
-                meta, res = dbx.files_download(path)
-                data = res.content
-                tmp_file = TemporaryFile()
-                tmp_file.write(data)
-                tmp_file.seek(0)
-                logger.debug('downloading: %d bytes; metadata: %s' % \
-                    (len(data), meta))
+                tmp_file = self._download_to_spool(dbx, path)
             except (TypeError, dropbox.exceptions.ApiError) as err:
                 logger.error("[Dropbox Channel - dbx_download] \
                     Api Error while downloading: ", err)
@@ -201,20 +195,33 @@ class DropboxChannel(Channel):
     def _dbx_upload(self, dbx, data, path, overwrite=False):
         """Upload a file.
 
-        Return the request response, or None in case of error.
+        data can be bytes, a string or a file, e.g. one filled in by another
+        channel. Files larger than UPLOAD_SESSION_THRESHOLD bytes are
+        uploaded in chunks using an upload session, so they are never read
+        into memory completely.
+
+        Return the metadata of the uploaded file.
         """
 
         mode = (dropbox.files.WriteMode.overwrite
                 if overwrite
                 else dropbox.files.WriteMode.add)
-        mtime = os.path.getmtime(path)
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        if isinstance(data, bytes):
+            data = BytesIO(data)
+        # SpooledTemporaryFile.seek() does not return the position
+        data.seek(0, os.SEEK_END)
+        size = data.tell()
+        data.seek(0)
         #Here we can start stop the time it takes to downlaod:
         #https://github.com/dropbox/dropbox-sdk-python/blob/master/example/updown.py
-        with self.stopwatch('upload %d bytes: ' % data):
+        with self.stopwatch('upload %d bytes: ' % size):
             try:
-                res = dbx.files_upload(data, path, mode,
-                    client_modified=datetime.datetime(*time.gmtime(mtime)[:6]),
-                    mute=True)
+                if size <= UPLOAD_SESSION_THRESHOLD:
+                    res = dbx.files_upload(data.read(), path, mode, mute=True)
+                else:
+                    res = self._dbx_upload_session(dbx, data, size, path, mode)
                 logger.debug('uploaded as {}'.format(res.name.encode('utf8')))
                 return res
             except (dropbox.exceptions.BadInputError, dropbox.exceptions.ApiError) as err:
@@ -223,6 +230,21 @@ class DropboxChannel(Channel):
                 raise ConditionNotMet("[Dropbox Channel - dbx_upload] \
                     API Failure")
 
+    def _dbx_upload_session(self, dbx, data, size, path, mode):
+        """Upload the file data in chunks of UPLOAD_CHUNK_SIZE bytes."""
+        session = dbx.files_upload_session_start(data.read(UPLOAD_CHUNK_SIZE))
+        cursor = dropbox.files.UploadSessionCursor(
+            session_id=session.session_id, offset=data.tell())
+        commit = dropbox.files.CommitInfo(path=path, mode=mode, mute=True)
+
+        while size - data.tell() > UPLOAD_CHUNK_SIZE:
+            dbx.files_upload_session_append_v2(data.read(UPLOAD_CHUNK_SIZE),
+                                               cursor)
+            cursor.offset = data.tell()
+
+        return dbx.files_upload_session_finish(data.read(UPLOAD_CHUNK_SIZE),
+                                               cursor, commit)
+
     #TODO easy implement features:
     #   restore, backup
 
@@ -0,0 +1,91 @@
+from collections import OrderedDict
+from threading import Lock
+import json
+import time
+
+from django.conf import settings
+
+
+def file_version(entry):
+    """Return the key and version of a FileMetadata entry.
+
+    The key is the file id, and the version the content hash if the SDK
+    returns one. The pinned Dropbox SDK does not, so files are deduplicated
+    by revision: an entry listed again with the same revision is
+    suppressed, e.g. in a walk repeated after a failure. Copies and
+    re-saves of identical content get a new revision and fire again.
+    """
+    key = getattr(entry, 'id', None) or entry.path_lower
+    version = (getattr(entry, 'content_hash', None) or
+               getattr(entry, 'rev', None))
+    return key, version
+
+
+class DedupStats():
+    """Counts the file entries that fired and those that were suppressed."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.clear()
+
+    def record(self, fired):
+        with self._lock:
+            if fired:
+                self.fired += 1
+            else:
+                self.suppressed += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {'fired': self.fired,
+                    'suppressed': self.suppressed}
+
+    def clear(self):
+        with self._lock:
+            self.fired = 0
+            self.suppressed = 0
+
+
+dedup_stats = DedupStats()
+
+
+class SeenFiles():
+    """The file versions seen for one Dropbox account.
+
+    Used to suppress the triggers of cursor entries whose version was seen
+    before, see file_version(). The versions are stored as JSON in
+    DropboxAccount.seen_files, so all workers share them. At most
+    ``max_entries`` files are kept, for ``ttl`` seconds, dropping the least
+    recently seen first.
+
+    A version should only be recorded once the trigger of its entry has been
+    dispatched, otherwise a failed walk would suppress it when repeated.
+    """
+
+    def __init__(self, data='', max_entries=None, ttl=None):
+        self.max_entries = (max_entries if max_entries is not None else
+                            getattr(settings,
+                                    'DROPBOX_SEEN_FILES_MAX_ENTRIES', 1024))
+        self.ttl = (ttl if ttl is not None else
+                    getattr(settings, 'DROPBOX_SEEN_FILES_TTL', 3600))
+        # key -> [version, time last seen], the least recently seen first
+        self._files = OrderedDict(json.loads(data) if data else [])
+
+    def is_seen(self, key, version):
+        """Return True if the version of the file was seen before."""
+        if version is None:
+            return False
+        seen = self._files.get(key)
+        return (seen is not None and seen[0] == version and
+                seen[1] + self.ttl >= time.time())
+
+    def record(self, key, version):
+        if version is None:
+            return
+        self._files.pop(key, None)
+        self._files[key] = [version, time.time()]
+        while len(self._files) > self.max_entries:
+            self._files.popitem(last=False)
+
+    def dumps(self):
+        return json.dumps(list(self._files.items()))
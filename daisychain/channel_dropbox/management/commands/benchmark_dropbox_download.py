@@ -0,0 +1,90 @@
+from multiprocessing import Pool
+from tempfile import TemporaryFile
+import resource
+
+from django.core.management.base import BaseCommand
+
+from channel_dropbox.channel import DropboxChannel
+
+MEGA_BYTE = 1000000
+CHUNK = b'\0' * (64 * 1024)
+
+
+class FakeResponse():
+    """Streams size bytes like the response of files_download."""
+
+    def __init__(self, size):
+        self.size = size
+
+    def iter_content(self, chunk_size):
+        remaining = self.size
+        while remaining > 0:
+            n = min(chunk_size, remaining)
+            yield CHUNK * (n // len(CHUNK)) + CHUNK[:n % len(CHUNK)]
+            remaining -= n
+
+    @property
+    def content(self):
+        return b''.join(self.iter_content(len(CHUNK)))
+
+    def close(self):
+        pass
+
+
+class FakeDropbox():
+
+    def __init__(self, size):
+        self.size = size
+
+    def files_download(self, path):
+        return {'path': path}, FakeResponse(self.size)
+
+
+def download_buffered(dbx):
+    """The former implementation, holding the whole file in memory."""
+    meta, res = dbx.files_download('/file')
+    data = res.content
+    tmp_file = TemporaryFile()
+    tmp_file.write(data)
+    tmp_file.seek(0)
+    return tmp_file
+
+
+def download_streamed(dbx):
+    return DropboxChannel()._download_to_spool(dbx, '/file')
+
+
+def peak_rss(args):
+    """Download in a fresh process and return its peak RSS in MB."""
+    mode, size = args
+    download = download_streamed if mode == 'streamed' else download_buffered
+    download(FakeDropbox(size)).close()
+    # ru_maxrss is given in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1000
+
+
+class Command(BaseCommand):
+    help = ("Record the peak RSS of Dropbox downloads, streamed in chunks and "
+            "fully buffered, for several file sizes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+',
+                            default=[10, 200, 1000],
+                            help="file sizes in MB")
+        parser.add_argument('--streamed-only', action='store_true',
+                            help="skip the buffered downloads")
+
+    def handle(self, *args, **options):
+        modes = ['streamed']
+        if not options['streamed_only']:
+            modes.append('buffered')
+
+        self.stdout.write("{:>8} {:>10} {:>14}".format("size MB", "mode",
+                                                       "peak RSS MB"))
+        for size in options['sizes']:
+            for mode in modes:
+                # one process per run, since the peak RSS never decreases
+                with Pool(1, maxtasksperchild=1) as pool:
+                    rss = pool.map(peak_rss, [(mode, size * MEGA_BYTE)])[0]
+                self.stdout.write("{:>8} {:>10} {:>14.1f}".format(size, mode,
+                                                                  rss))
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('channel_dropbox', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dropboxaccount',
+            name='walk_requested',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Walk Requested'),
+        ),
+        migrations.AddField(
+            model_name='dropboxaccount',
+            name='lock_owner',
+            field=models.CharField(blank=True, default='', max_length=36, verbose_name='Lock Owner'),
+        ),
+        migrations.AddField(
+            model_name='dropboxaccount',
+            name='locked_until',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Locked Until'),
+        ),
+    ]
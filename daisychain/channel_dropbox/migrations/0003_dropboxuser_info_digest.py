@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('channel_dropbox', '0002_dropboxaccount_walk_lock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dropboxuser',
+            name='info_digest',
+            field=models.CharField(blank=True, default='', max_length=64, verbose_name='Info Digest'),
+        ),
+        migrations.AddField(
+            model_name='dropboxuser',
+            name='info_checked',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Info Checked'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-18 18:30
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('channel_dropbox', '0003_dropboxuser_info_digest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dropboxaccount',
+            name='seen_files',
+            field=models.TextField(blank=True, default='', verbose_name='Seen Files'),
+        ),
+    ]
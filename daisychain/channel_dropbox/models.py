@@ -9,10 +9,23 @@ class DropboxAccount(models.Model):
         Dropbox account model that stores the access token and cursor
         for a given user.
         'cursor' - is used to save the last changed_file
+        'walk_requested' - time of the first webhook notification that
+        has not been handled by a cursor walk yet
+        'lock_owner', 'locked_until' - the worker walking the cursor
+        and when its lock expires
+        'seen_files' - the file versions that fired before, see
+        channel_dropbox.dedup.SeenFiles
     """
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     access_token = models.CharField(_("Access Token"), max_length=255)
     cursor = models.CharField(_("Cursor"), max_length=255)
+    walk_requested = models.DateTimeField(_("Walk Requested"), null=True,
+                                          blank=True)
+    lock_owner = models.CharField(_("Lock Owner"), max_length=36, blank=True,
+                                  default='')
+    locked_until = models.DateTimeField(_("Locked Until"), null=True,
+                                        blank=True)
+    seen_files = models.TextField(_("Seen Files"), blank=True, default='')
 
     class Meta:
         verbose_name = _("Dropbox Account")
@@ -31,6 +44,8 @@ class DropboxUser(models.Model):
             webhook is received.
             the other fields are used to save the user informations.
             the changes are used for a trigger (pk=7705)
+            'info_digest' - digest of the user informations
+            'info_checked' - when the user informations were last fetched
     """
     dropbox_account = models.ForeignKey(DropboxAccount, on_delete=models.CASCADE)
     dropbox_userid = models.CharField(_("DropBox User ID"), null=False, max_length=255)
@@ -39,6 +54,10 @@ class DropboxUser(models.Model):
     profile_photo_url =  models.CharField(_("email"), null=True, max_length=255)
     disk_used = models.DecimalField(_("Used Disk Space"),  max_digits=12, decimal_places=4)
     disk_allocated = models.DecimalField(_("Total Allocated Disk Usage"), max_digits=12, decimal_places=4)
+    info_digest = models.CharField(_("Info Digest"), max_length=64, blank=True,
+                                   default='')
+    info_checked = models.DateTimeField(_("Info Checked"), null=True,
+                                        blank=True)
 
     class Meta:
         verbose_name = _("Dropbox User")
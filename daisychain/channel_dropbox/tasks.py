@@ -1,21 +1,124 @@
 from __future__ import absolute_import
 
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from hashlib import sha256
+from uuid import uuid4
+
 from celery import shared_task
 import dropbox
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from .dedup import SeenFiles, dedup_stats, file_version
 from .models import DropboxAccount, DropboxUser
 from dropbox.files import FileMetadata, FolderMetadata, DeletedMetadata
 
 from core.core import Core
 import os
+import json
 import logging
 
 logger = logging.getLogger('channel')
 
 MEGA_BYTE = 1000000
-@shared_task
-def fireTrigger(userid):
+CHANNEL_NAME = "Dropbox"
+# notifications for an account within this many seconds are handled by a
+# single cursor walk
+WEBHOOK_DEBOUNCE = 5
+# seconds a worker may hold the lock of an account without renewing it
+ACCOUNT_LOCK_TIMEOUT = 300
+# a queued walk that did not start within this many seconds is considered
+# lost, e.g. in a broker restart, and queued again by the next notification
+WALK_REQUEST_TIMEOUT = ACCOUNT_LOCK_TIMEOUT + WEBHOOK_DEBOUNCE
+# retries of a walk waiting for the lock of the account, about as long as
+# a lock may be held without renewal
+WALK_MAX_RETRIES = ACCOUNT_LOCK_TIMEOUT // WEBHOOK_DEBOUNCE
+LIST_FOLDER_ARGS = {'path': '',
+                    'recursive': True,
+                    'include_media_info': True,
+                    'include_deleted': True}
+
+
+def queue_walk(userid):
+    """Queue a cursor walk for a Dropbox user notified by the webhook.
+
+    If a walk is already queued for the account, the notification is
+    coalesced into it, unless it was queued more than WALK_REQUEST_TIMEOUT
+    seconds ago and may have been lost.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=WALK_REQUEST_TIMEOUT)
+    requested = DropboxAccount.objects.filter(
+        Q(walk_requested__isnull=True) | Q(walk_requested__lt=stale),
+        dropboxuser__dropbox_userid=userid).update(walk_requested=now)
+
+    if requested:
+        fireTrigger.apply_async(args=[userid], countdown=WEBHOOK_DEBOUNCE)
+    else:
+        logger.debug('[Dropbox - tasks - queue_walk] walk for {} already '
+                     'queued'.format(userid))
+
+
+def lock_account(dropbox_account):
+    """Lock the account for a cursor walk.
+
+    Return the lock owner token, or None if another worker holds the lock.
+    """
+    now = timezone.now()
+    owner = uuid4().hex
+    locked = DropboxAccount.objects.filter(
+        Q(locked_until__isnull=True) | Q(locked_until__lt=now),
+        pk=dropbox_account.pk).update(
+            lock_owner=owner,
+            locked_until=now + timedelta(seconds=ACCOUNT_LOCK_TIMEOUT))
+    return owner if locked else None
+
+
+def unlock_account(dropbox_account, owner):
+    DropboxAccount.objects.filter(pk=dropbox_account.pk,
+                                  lock_owner=owner).update(lock_owner='',
+                                                           locked_until=None)
+
+
+@shared_task(bind=True, max_retries=WALK_MAX_RETRIES)
+def fireTrigger(self, userid):
     dropbox_user = DropboxUser.objects.get(dropbox_userid=userid)
     dropbox_account = dropbox_user.dropbox_account
+
+    owner = lock_account(dropbox_account)
+    if owner is None:
+        if self.request.retries >= self.max_retries:
+            # let the next notification queue a new walk
+            logger.error('[Dropbox - tasks - fireTrigger] gave up waiting '
+                         'for the lock of the account of {}'.format(userid))
+            DropboxAccount.objects.filter(pk=dropbox_account.pk).update(
+                walk_requested=None)
+            return
+        # another worker walks the cursor, walk again after it is done
+        logger.debug('[Dropbox - tasks - fireTrigger] account of {} is '
+                     'locked'.format(userid))
+        raise self.retry(countdown=WEBHOOK_DEBOUNCE)
+
+    try:
+        # notifications arriving from now on need another walk
+        DropboxAccount.objects.filter(pk=dropbox_account.pk).update(
+            walk_requested=None)
+        walk_cursor(dropbox_account, userid, owner)
+    finally:
+        unlock_account(dropbox_account, owner)
+
+
+def walk_cursor(dropbox_account, userid, owner):
+    """Fire the triggers for the changes since the stored cursor.
+
+    An account without a cursor starts at the current state of the account,
+    unless settings.DROPBOX_BACKFILL is set to fire the triggers for all
+    existing files. The next page is fetched while the entries of the
+    current page are dispatched. The cursor and the seen files are saved
+    once, at the end of the walk, so a failed walk is repeated from the
+    previous cursor.
+    """
     daisy_userid = dropbox_account.user.id
     dbx = dropbox.Dropbox(dropbox_account.access_token)
     core = Core()
@@ -25,105 +128,189 @@ def fireTrigger(userid):
     if user_info is not None:
         logger.debug("user_info changed")
         #print(type(user_info) is dict)
-        core.handle_trigger(channel_id=770,
+        core.handle_trigger(channel_name=CHANNEL_NAME,
                             trigger_type=5,
                             userid=daisy_userid,
                             payload=user_info)
 
     cursor = dropbox_account.cursor
-    if cursor == '':
-        cursor = None
-
-    has_more_files_modified = True
-    while has_more_files_modified:
-        if cursor is None:
-            result = dbx.files_list_folder(path='',
-                recursive=True, include_media_info=True,
-                include_deleted=True)
+    # read after locking the account, the previous walk may have changed it
+    seen = SeenFiles(DropboxAccount.objects.filter(pk=dropbox_account.pk)
+                     .values_list('seen_files', flat=True).get())
+    if cursor == '' and not getattr(settings, 'DROPBOX_BACKFILL', False):
+        logger.debug('[Dropbox - tasks - fireTrigger] - onboarding')
+        result = dbx.files_list_folder_get_latest_cursor(**LIST_FOLDER_ARGS)
+        save_cursor(dropbox_account, owner, result.cursor)
+        return
+
+    lock_renewal = timezone.now() + timedelta(seconds=ACCOUNT_LOCK_TIMEOUT / 2)
+    with ThreadPoolExecutor(max_workers=1) as prefetch:
+        if cursor == '':
+            page = prefetch.submit(dbx.files_list_folder, **LIST_FOLDER_ARGS)
         else:
-            result = dbx.files_list_folder_continue(cursor)
+            page = prefetch.submit(dbx.files_list_folder_continue, cursor)
             logger.debug('[Dropbox - tasks - fireTrigger] - has cursor')
 
-        if  not result.entries:
-            logger.debug('[Dropbox - tasks - fireTrigger] - list is empty')
-        else:
-            logger.debug('[Dropbox - tasks - fireTrigger] - list has {}'.format(
-                                                            len(result.entries)))
-
-        for entry in result.entries:
-            # Ignore deleted files, folders, and previously modified files
-            if isinstance(entry, FileMetadata):
-                logger.debug('[Dropbox - tasks - fireTrigger] - entry:\n{}'
-                    .format(entry))
-                payload = {}
-                url = dbx.files_get_temporary_link(entry.path_display).link
-                filename, file_extension = os.path.splitext(entry.name)
-                #skip dot of file_extension
-                file_extension =  file_extension[1:]
-                payload['filename'] = filename+"."+file_extension
-                payload['file_extension'] = file_extension
-                payload['path'] =  entry.path_display
-                payload['url'] = url
-            #    payload['modified'] = (entry.server_modified).isoformat()
-                payload['size'] = entry.size / MEGA_BYTE
-            #    print(type(entry.server_modified))
-                trigger_type = get_trigger_type(file_extension)
-
-                if trigger_type is not None:
-                    core.handle_trigger(channel_id=770,
-                                            trigger_type=trigger_type,
-                                            userid=daisy_userid,
-                                            payload=payload)
-                #trigger_type 1 reresents that there is a file change or new file
-                #file was modified
-                core.handle_trigger(channel_id=770,
-                                    trigger_type=1,
-                                    userid=daisy_userid,
-                                    payload=payload)
-
-        # Update ans overwrite cursor
-        cursor = result.cursor
-        dropbox_account.cursor = cursor
-        dropbox_account.save()
-
-        has_more_files_modified = result.has_more
+        while page is not None:
+            result = page.result()
+            if result.has_more:
+                page = prefetch.submit(dbx.files_list_folder_continue,
+                                       result.cursor)
+            else:
+                page = None
+
+            if  not result.entries:
+                logger.debug('[Dropbox - tasks - fireTrigger] - list is empty')
+            else:
+                logger.debug('[Dropbox - tasks - fireTrigger] - list has {}'
+                    .format(len(result.entries)))
+
+            # queue the triggers of the whole page at once
+            events, versions = get_events(dbx, result.entries, seen,
+                                          daisy_userid)
+            core.handle_triggers(events)
+            # the files count as seen once their triggers are queued
+            for key, version in versions:
+                seen.record(key, version)
+            cursor = result.cursor
+
+            if timezone.now() > lock_renewal:
+                if not renew_lock(dropbox_account, owner):
+                    logger.error('[Dropbox - tasks - fireTrigger] lost the '
+                                 'lock of the account of {}'.format(userid))
+                    return
+                lock_renewal = timezone.now() + timedelta(
+                    seconds=ACCOUNT_LOCK_TIMEOUT / 2)
+
+    if not save_cursor(dropbox_account, owner, cursor, seen):
+        logger.error('[Dropbox - tasks - fireTrigger] lost the lock of the '
+                     'account of {}'.format(userid))
+
+
+def get_events(dbx, entries, seen, daisy_userid):
+    """Return the trigger events of a page of cursor entries, and the file
+    versions to record in SeenFiles once the events are queued.
+
+    Files whose content was seen already are skipped.
+    """
+    events = []
+    versions = []
+    for entry in entries:
+        # Ignore deleted files, folders, and previously modified files
+        if isinstance(entry, FileMetadata):
+            key, version = file_version(entry)
+            if seen.is_seen(key, version):
+                dedup_stats.record(fired=False)
+                logger.debug('[Dropbox - tasks - fireTrigger] - unchanged '
+                             'entry: {}'.format(entry.path_display))
+                continue
+            dedup_stats.record(fired=True)
+            versions.append((key, version))
+
+            logger.debug('[Dropbox - tasks - fireTrigger] - entry:\n{}'
+                .format(entry))
+            payload = {}
+            url = dbx.files_get_temporary_link(entry.path_display).link
+            filename, file_extension = os.path.splitext(entry.name)
+            #skip dot of file_extension
+            file_extension =  file_extension[1:]
+            payload['filename'] = filename+"."+file_extension
+            payload['file_extension'] = file_extension
+            payload['path'] =  entry.path_display
+            payload['url'] = url
+        #    payload['modified'] = (entry.server_modified).isoformat()
+            payload['size'] = entry.size / MEGA_BYTE
+        #    print(type(entry.server_modified))
+            trigger_type = get_trigger_type(file_extension)
+
+            if trigger_type is not None:
+                events.append({'channel_name': CHANNEL_NAME,
+                               'trigger_type': trigger_type,
+                               'userid': daisy_userid,
+                               'payload': payload})
+            #trigger_type 1 reresents that there is a file change or new file
+            #file was modified
+            events.append({'channel_name': CHANNEL_NAME,
+                           'trigger_type': 1,
+                           'userid': daisy_userid,
+                           'payload': payload})
+    return events, versions
+
+
+def renew_lock(dropbox_account, owner):
+    return DropboxAccount.objects.filter(
+        pk=dropbox_account.pk, lock_owner=owner).update(
+            locked_until=timezone.now() + timedelta(
+                seconds=ACCOUNT_LOCK_TIMEOUT))
+
+
+def save_cursor(dropbox_account, owner, cursor, seen=None):
+    """Save the cursor, and the seen file versions if given, if the lock of
+    the account is still owned."""
+    fields = {'cursor': cursor}
+    if seen is not None:
+        fields['seen_files'] = seen.dumps()
+    return DropboxAccount.objects.filter(
+        pk=dropbox_account.pk, lock_owner=owner).update(**fields)
+
+def account_info_digest(display_name, email, profile_photo_url, allocated):
+    """Return the digest of the user informations, allocated in MB."""
+    info = json.dumps([display_name, email, profile_photo_url,
+                       float(allocated)])
+    return sha256(info.encode('utf-8')).hexdigest()
+
 
 #check whether User_Info changed
 def account_info_changed(dbx, userid):
+    """Return the user informations if they changed, else None.
+
+    The informations are fetched from Dropbox at most once every
+    settings.DROPBOX_ACCOUNT_INFO_TTL seconds, and compared to the stored
+    digest. The user is saved only if they changed.
+    """
     dropbox_user = DropboxUser.objects.get(dropbox_userid=userid)
+    now = timezone.now()
+    ttl = getattr(settings, 'DROPBOX_ACCOUNT_INFO_TTL', 3600)
+    if (dropbox_user.info_checked is not None and
+            dropbox_user.info_checked > now - timedelta(seconds=ttl)):
+        return None
+
     user_info = {}
     current_account = dbx.users_get_current_account()
     disk = dbx.users_get_space_usage()
     allocated = disk.allocation.get_individual().allocated
 
-    changed_flag = False
-    if current_account.name.display_name != dropbox_user.display_name:
-        dropbox_user.display_name = current_account.name.display_name
-        changed_flag = True
-    if current_account.email != dropbox_user.email:
-        dropbox_user.email =  current_account.email
-        changed_flag = True
-    if current_account.profile_photo_url != dropbox_user.profile_photo_url:
-        dropbox_user.profile_photo_url =  current_account.profile_photo_url
-        changed_flag = True
-    #if (disk.used/MEGA_BYTE) != float(dropbox_user.disk_used):
-    #    dropbox_user.disk_used = (disk.used / MEGA_BYTE)
-    #    changed_flag = True
-    if (allocated/MEGA_BYTE) != float(dropbox_user.disk_allocated):
-        dropbox_user.disk_allocated = (allocated / MEGA_BYTE)
-        changed_flag = True
-
-    if not changed_flag:
+    stored_digest = dropbox_user.info_digest or account_info_digest(
+        dropbox_user.display_name, dropbox_user.email,
+        dropbox_user.profile_photo_url, dropbox_user.disk_allocated)
+    digest = account_info_digest(current_account.name.display_name,
+                                 current_account.email,
+                                 current_account.profile_photo_url,
+                                 allocated / MEGA_BYTE)
+
+    if digest == stored_digest:
+        DropboxUser.objects.filter(pk=dropbox_user.pk).update(
+            info_digest=digest, info_checked=now)
         return None
-    else:
-        dropbox_user.save()
-        user_info['display_name'] = dropbox_user.display_name
-        user_info['email'] = dropbox_user.email
-        user_info['profile_photo_url'] = dropbox_user.profile_photo_url
-        #user_info['disk_used'] = dropbox_user.disk_used
-        user_info['disk_allocated'] = allocated
-        #user_info['disk_allocated'] = dropbox_user.disk_allocated
-        return user_info
+
+    dropbox_user.display_name = current_account.name.display_name
+    dropbox_user.email = current_account.email
+    dropbox_user.profile_photo_url = current_account.profile_photo_url
+    #dropbox_user.disk_used = (disk.used / MEGA_BYTE)
+    dropbox_user.disk_allocated = (allocated / MEGA_BYTE)
+    dropbox_user.info_digest = digest
+    dropbox_user.info_checked = now
+    dropbox_user.save(update_fields=['display_name', 'email',
+                                     'profile_photo_url', 'disk_allocated',
+                                     'info_digest', 'info_checked'])
+
+    user_info['display_name'] = dropbox_user.display_name
+    user_info['email'] = dropbox_user.email
+    user_info['profile_photo_url'] = dropbox_user.profile_photo_url
+    #user_info['disk_used'] = dropbox_user.disk_used
+    user_info['disk_allocated'] = allocated
+    #user_info['disk_allocated'] = dropbox_user.disk_allocated
+    return user_info
 
 #interested in following file types
 def get_trigger_type(ext):
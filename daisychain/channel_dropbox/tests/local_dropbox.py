@@ -0,0 +1,138 @@
+"""A local stand-in for the Dropbox API.
+
+LocalDropbox runs an HTTP server implementing the routes used by the
+channel, and creates dropbox.Dropbox clients whose requests are sent to it
+instead of the Dropbox servers.
+"""
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from threading import Thread
+from urllib.parse import urlsplit, urlunsplit
+from uuid import uuid4
+import json
+
+from requests.adapters import HTTPAdapter
+from dropbox import Dropbox
+import requests
+
+
+class LocalDropboxHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        api = self.server.api
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        api.requests.append((self.path, length))
+
+        route = getattr(self, 'route_' + self.path[len('/2/'):].replace(
+            '/', '_'), None)
+        if route is None:
+            return self.respond(404, {'error': 'unknown route'})
+
+        if self.headers.get('Dropbox-API-Arg'):
+            arg = json.loads(self.headers['Dropbox-API-Arg'])
+        else:
+            arg = json.loads(body.decode('utf-8'))
+        status, result = route(api, arg, body)
+        self.respond(status, result)
+
+    def respond(self, status, result):
+        body = json.dumps(result).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    @staticmethod
+    def route_files_upload(api, arg, body):
+        return 200, api.commit(arg['path'], body)
+
+    @staticmethod
+    def route_files_upload_session_start(api, arg, body):
+        session_id = uuid4().hex
+        api.sessions[session_id] = body
+        return 200, {'session_id': session_id}
+
+    @staticmethod
+    def route_files_upload_session_append_v2(api, arg, body):
+        return api.append(arg['cursor'], body) or (200, None)
+
+    @staticmethod
+    def route_files_upload_session_finish(api, arg, body):
+        error = api.append(arg['cursor'], body)
+        if error:
+            return error
+        data = api.sessions.pop(arg['cursor']['session_id'])
+        return 200, api.commit(arg['commit']['path'], data)
+
+    def log_message(self, *args):
+        pass
+
+
+class LocalDropbox():
+    """In-memory Dropbox account served over HTTP.
+
+    ``files`` holds the uploaded files by path and ``requests`` the route
+    and body size of every request.
+    """
+
+    def __init__(self):
+        self.files = {}
+        self.sessions = {}
+        self.requests = []
+        self._server = HTTPServer(('127.0.0.1', 0), LocalDropboxHandler)
+        self._server.api = self
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self._server.server_port)
+
+    def start(self):
+        Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def append(self, cursor, body):
+        data = self.sessions.get(cursor['session_id'])
+        if data is None:
+            return 409, {'error_summary': 'not_found/'}
+        if cursor['offset'] != len(data):
+            return 409, {'error_summary': 'incorrect_offset/'}
+        self.sessions[cursor['session_id']] = data + body
+
+    def commit(self, path, data):
+        self.files[path] = data
+        return {'name': path.rsplit('/', 1)[-1],
+                'id': 'id:' + uuid4().hex,
+                'client_modified': '2016-04-13T10:00:00Z',
+                'server_modified': '2016-04-13T10:00:00Z',
+                'rev': '0123456789abcdef',
+                'size': len(data),
+                'path_lower': path.lower(),
+                'path_display': path}
+
+    def client(self, access_token='_test_access_token'):
+        """Return a Dropbox client talking to this server.
+
+        Dropbox is imported directly, so the client can be created while
+        dropbox.Dropbox is patched to return it.
+        """
+        session = requests.Session()
+        session.mount('https://', LocalAdapter(self.url))
+        return Dropbox(access_token, session=session)
+
+
+class LocalAdapter(HTTPAdapter):
+    """Sends all requests to base_url, keeping the path."""
+
+    def __init__(self, base_url):
+        super().__init__()
+        self.base = urlsplit(base_url)
+
+    def send(self, request, **kwargs):
+        url = urlsplit(request.url)
+        request.url = urlunsplit((self.base.scheme, self.base.netloc,
+                                  url.path, url.query, url.fragment))
+        return super().send(request, **kwargs)
@@ -1,21 +1,34 @@
 from django.test import TestCase
-from .models import DropboxAccount, DropboxUser
+from channel_dropbox.models import DropboxAccount, DropboxUser
 from django.contrib.auth.models import User
 from django.http import HttpResponse
 from unittest.mock import patch, Mock
 import dropbox
 from dropbox.files import FileMetadata
 from channel_dropbox.channel import DropboxChannel
+from channel_dropbox.tests.local_dropbox import LocalDropbox
+from tempfile import SpooledTemporaryFile
 import datetime
 from core.channel import NotSupportedAction, NotSupportedTrigger, \
     ConditionNotMet
 
+class FakeResponse():
+    """Streamed response as returned by the Dropbox SDK for downloads."""
+    def __init__(self, path):
+        self.path = path
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        with open(self.path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                yield chunk
+
+    def close(self):
+        self.closed = True
+
 class FakeDropbox():
     def files_download(self, path):
-        f = open(path,'r')
-        data = f.seek(0)
-        res = HttpResponse()
-        res.content = data
+        res = FakeResponse(path)
         ret = ['md_test', res]
         return ret
 
@@ -28,7 +41,7 @@ class FakeDropbox():
         return ret
 
     def files_upload(self, data, path, mode,
-        client_modified,
+        client_modified=None,
         mute=True):
         md = FakeFileMetadata()
         return md
@@ -116,14 +129,43 @@ class TestDropBoxChannel(BaseTestCase):
         dbc.fill_recipe_mappings(trigger_type=1, userid=test_user_id,
             payload=payload, conditions=None, mappings=mappings)
 
+    @patch('channel_dropbox.channel.DOWNLOAD_CHUNK_SIZE', 100)
+    @patch('dropbox.Dropbox')
+    def test_fill_data_streams_file(self, mock_dbx):
+        dbx_user = self.create_dbx_user()
+        test_user_id = dbx_user.dropbox_account.user.id
+        path = 'channel_dropbox/testdata/dropbox2.png'
+        payload = {'size': 0.112312, 'path': path}
+        mock_dbx.return_value = FakeDropbox()
+        dbc = DropboxChannel()
+        mappings = dbc.fill_recipe_mappings(trigger_type=1,
+            userid=test_user_id, payload=payload, conditions=None,
+            mappings={'image': '%jpg%', 'text': 'file: %path%'})
+        with open(path, 'rb') as f:
+            self.assertEqual(mappings['image'].read(), f.read())
+        self.assertEqual(mappings['text'], 'file: ' + path)
+
+    @patch('dropbox.Dropbox')
+    def test_fill_data_large_file(self, mock_dbx):
+        dbx_user = self.create_dbx_user()
+        test_user_id = dbx_user.dropbox_account.user.id
+        # files of 150 MB and more used to be rejected
+        payload = {'size': 300.0,
+                   'path': 'channel_dropbox/testdata/dropbox2.png'}
+        mock_dbx.return_value = FakeDropbox()
+        dbc = DropboxChannel()
+        mappings = dbc.fill_recipe_mappings(trigger_type=1,
+            userid=test_user_id, payload=payload, conditions=None,
+            mappings={'data': '%data%'})
+        self.assertTrue(mappings['data'].read())
+
     @patch('dropbox.Dropbox')
     def test_handle_upload_overwrite_true(self, mock_dbx):
         dbx_user = self.create_dbx_user()
         test_user_id = dbx_user.dropbox_account.user.id
         fbx = FakeDropbox()
         mock_dbx.return_value = fbx
-        f = open('channel_dropbox/testdata/dropbox2.png','r')
-        data = f.seek(0)
+        data = open('channel_dropbox/testdata/dropbox2.png','rb')
         inputs = {'data':data,'path':'channel_dropbox/testdata/dropbox2.png',
             'overwrite':True}
         dbc = DropboxChannel()
@@ -135,13 +177,44 @@ class TestDropBoxChannel(BaseTestCase):
         test_user_id = dbx_user.dropbox_account.user.id
         fbx = FakeDropbox()
         mock_dbx.return_value = fbx
-        f = open('channel_dropbox/testdata/dropbox2.png','r')
-        data = f.seek(0)
+        data = open('channel_dropbox/testdata/dropbox2.png','rb')
         inputs = {'data':data,'path':'channel_dropbox/testdata/dropbox2.png',
             'overwrite':False}
         dbc = DropboxChannel()
         dbc.handle_action(1, test_user_id, inputs)
 
+    def upload_to_local_dropbox(self, data, path):
+        local_dropbox = LocalDropbox()
+        local_dropbox.start()
+        self.addCleanup(local_dropbox.stop)
+        dbx_user = self.create_dbx_user()
+        test_user_id = dbx_user.dropbox_account.user.id
+        with patch('dropbox.Dropbox', side_effect=local_dropbox.client):
+            DropboxChannel().handle_action(1, test_user_id,
+                {'data': data, 'path': path, 'overwrite': True})
+        return local_dropbox
+
+    @patch('channel_dropbox.channel.UPLOAD_SESSION_THRESHOLD', 1000)
+    def test_handle_upload_small_file(self):
+        local_dropbox = self.upload_to_local_dropbox(b'small file',
+                                                     '/small.txt')
+        self.assertEqual(local_dropbox.files, {'/small.txt': b'small file'})
+        self.assertEqual(local_dropbox.requests, [('/2/files/upload', 10)])
+
+    @patch('channel_dropbox.channel.UPLOAD_CHUNK_SIZE', 1000)
+    @patch('channel_dropbox.channel.UPLOAD_SESSION_THRESHOLD', 1000)
+    def test_handle_upload_large_file_in_session(self):
+        content = bytes(range(256)) * 10
+        data = SpooledTemporaryFile(max_size=100)
+        data.write(content)
+        local_dropbox = self.upload_to_local_dropbox(data, '/large.bin')
+
+        self.assertEqual(local_dropbox.files, {'/large.bin': content})
+        self.assertEqual(local_dropbox.requests, [
+            ('/2/files/upload_session/start', 1000),
+            ('/2/files/upload_session/append_v2', 1000),
+            ('/2/files/upload_session/finish', 560)])
+
     @patch('dropbox.Dropbox')
     def test_handle_download(self, mock_dbx):
         dbx_user = self.create_dbx_user()
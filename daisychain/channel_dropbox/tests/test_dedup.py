@@ -0,0 +1,51 @@
+from unittest.mock import patch
+from django.test import SimpleTestCase
+from dropbox.files import FileMetadata
+from channel_dropbox.dedup import SeenFiles, file_version
+
+
+class TestSeenFiles(SimpleTestCase):
+
+    def test_unchanged_file_is_seen(self):
+        seen = SeenFiles()
+        self.assertFalse(seen.is_seen('id:a', 'rev1'))
+        seen.record('id:a', 'rev1')
+        self.assertTrue(seen.is_seen('id:a', 'rev1'))
+        self.assertFalse(seen.is_seen('id:a', 'rev2'))
+
+    def test_stored(self):
+        seen = SeenFiles()
+        seen.record('id:a', 'rev1')
+        self.assertTrue(SeenFiles(seen.dumps()).is_seen('id:a', 'rev1'))
+        self.assertFalse(SeenFiles('').is_seen('id:a', 'rev1'))
+
+    def test_unknown_version_is_not_seen(self):
+        seen = SeenFiles()
+        seen.record('id:a', None)
+        self.assertFalse(seen.is_seen('id:a', None))
+
+    @patch('time.time')
+    def test_ttl(self, mock_time):
+        seen = SeenFiles(ttl=10)
+        mock_time.return_value = 100
+        seen.record('id:a', 'rev1')
+        mock_time.return_value = 111
+        self.assertFalse(seen.is_seen('id:a', 'rev1'))
+
+    def test_max_entries(self):
+        seen = SeenFiles(max_entries=2)
+        seen.record('id:a', 'rev1')
+        seen.record('id:b', 'rev1')
+        seen.record('id:a', 'rev1')
+        seen.record('id:c', 'rev1')
+        # id:b was the least recently seen file
+        seen = SeenFiles(seen.dumps(), max_entries=2)
+        self.assertTrue(seen.is_seen('id:a', 'rev1'))
+        self.assertFalse(seen.is_seen('id:b', 'rev1'))
+
+    def test_file_version(self):
+        entry = FileMetadata(name='a.jpg', path_lower='/a.jpg', id='id:a',
+                             rev='0123456789')
+        self.assertEqual(file_version(entry), ('id:a', '0123456789'))
+        entry = FileMetadata(name='a.jpg', path_lower='/a.jpg')
+        self.assertEqual(file_version(entry), ('/a.jpg', None))
@@ -1,6 +1,6 @@
 from django.contrib.auth.models import User
 from django.test import TestCase
-from .models import DropboxAccount, DropboxUser
+from channel_dropbox.models import DropboxAccount, DropboxUser
 
 class TestModelsDropboxAccount(TestCase):
 
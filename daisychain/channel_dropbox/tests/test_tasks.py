@@ -1,10 +1,17 @@
-from django.test import TestCase
-from .models import DropboxAccount, DropboxUser
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from channel_dropbox.models import DropboxAccount, DropboxUser
 from django.contrib.auth.models import User
 from unittest.mock import patch, Mock
-from channel_dropbox.tasks import fireTrigger
+from channel_dropbox.tasks import fireTrigger, queue_walk
+from channel_dropbox.dedup import dedup_stats
+from celery.exceptions import Retry
+from django.utils import timezone
+from datetime import timedelta
 import dropbox
-from dropbox.files import ListFolderResult, FileMetadata, GetTemporaryLinkResult
+from dropbox.files import ListFolderResult, FileMetadata, GetTemporaryLinkResult,\
+    ListFolderGetLatestCursorResult
 from dropbox.users import Account, Name, SpaceUsage,\
     SpaceAllocation, IndividualSpaceAllocation
 
@@ -23,6 +30,10 @@ class FakeDropbox():
         result.has_more = False
         return result
 
+    def files_list_folder_get_latest_cursor(self, path, recursive,
+                include_media_info, include_deleted):
+        return ListFolderGetLatestCursorResult(cursor="latest")
+
     def users_get_current_account(self):
         account = Account(
             name = Name(display_name="John Doe"),
@@ -46,6 +57,20 @@ class FakeDropbox():
         result.link = "www.nice-link.me/enjoy"
         return result
 
+class PagedDropbox(FakeDropbox):
+    """Returns pages of one entry, with cursors 'page1' to 'page<pages>'."""
+    def __init__(self, pages):
+        self.pages = pages
+        self.continued = []
+
+    def files_list_folder_continue(self, cursor):
+        self.continued.append(cursor)
+        page = 1 if cursor == 'foobar' else int(cursor[4:]) + 1
+        result = ListFolderResult(cursor='page{}'.format(page))
+        result.entries = [FakeFileMetadata()]
+        result.has_more = page < self.pages
+        return result
+
 class FakeFileMetadata(FileMetadata):
     path_lower = ''
     name = "entry_name.jpg"
@@ -53,8 +78,15 @@ class FakeFileMetadata(FileMetadata):
     server_modified = "13-4-2016"
     size = 112312
 
+class RevisedFileMetadata(FakeFileMetadata):
+    id = "id:entry"
+    rev = "0123456789"
+
 class BaseTestCase(TestCase):
 
+    def setUp(self):
+        dedup_stats.clear()
+
     def create_dropbox_cursor(self):
         user = User.objects.create_user('John')
         self.dbx_account = DropboxAccount(
@@ -109,9 +141,10 @@ class BaseTestCase(TestCase):
 
 class TestFireTrigger(BaseTestCase):
 
+    @patch('core.core.Core.handle_triggers')
     @patch('core.core.Core.handle_trigger')
     @patch('dropbox.Dropbox')
-    def test_change_data(self, mock_dbx, mock_core):
+    def test_change_data(self, mock_dbx, mock_core, mock_core_batch):
         #self.create_dropbox()
         self.create_dbx_user_changed()
         fbx = FakeDropbox()
@@ -133,24 +166,260 @@ class TestFireTrigger(BaseTestCase):
                     'filename': 'entry_name.jpg', 'path': '/entry_name.jpg',
                     'file_extension': 'jpg'}
 
-        mock_core.assert_called_with(channel_id=770, trigger_type=1, userid=1,
-            payload=payload)
-        mock_core.assert_any_call(channel_id=770, trigger_type=5, userid=1,
-            payload=user_info)
-        mock_core.assert_any_call(channel_id=770, trigger_type=2, userid=1, payload=payload)
+        mock_core.assert_called_once_with(channel_name="Dropbox",
+            trigger_type=5, userid=1, payload=user_info)
+        # the existing files of a new account do not fire triggers
+        self.assertFalse(mock_core_batch.called)
+        self.assertEqual(DropboxAccount.objects.get().cursor, "latest")
 
+    @override_settings(DROPBOX_BACKFILL=True)
+    @patch('core.core.Core.handle_triggers')
+    @patch('core.core.Core.handle_trigger')
+    @patch('dropbox.Dropbox')
+    def test_backfill(self, mock_dbx, mock_core, mock_core_batch):
+        self.create_dbx_user_changed()
+        mock_dbx.return_value = FakeDropbox()
+        fireTrigger(4211)
+
+        payload = {'url': 'www.nice-link.me/enjoy', 'size': 0.112312,
+                    'filename': 'entry_name.jpg', 'path': '/entry_name.jpg',
+                    'file_extension': 'jpg'}
+        mock_core_batch.assert_called_once_with([
+            {'channel_name': "Dropbox", 'trigger_type': 2, 'userid': 1,
+             'payload': payload},
+            {'channel_name': "Dropbox", 'trigger_type': 1, 'userid': 1,
+             'payload': payload}])
+        self.assertEqual(DropboxAccount.objects.get().cursor, "foo")
 
     @patch('core.core.Core.handle_trigger')
     @patch('dropbox.Dropbox')
-    def test_unchanged(self, mock_dbx, mock_core):
+    def test_pages(self, mock_dbx, mock_core):
+        self.create_dbx_user_unchanged()
+        fbx = PagedDropbox(pages=3)
+        mock_dbx.return_value = fbx
+        cursors = []
+
+        def handle_triggers(events):
+            # the cursor is saved at the end of the walk only
+            cursors.append(DropboxAccount.objects.get().cursor)
+            self.assertEqual(len(events), 2)
+
+        with patch('core.core.Core.handle_triggers',
+                   side_effect=handle_triggers):
+            fireTrigger(4211)
+
+        self.assertEqual(fbx.continued, ['foobar', 'page1', 'page2'])
+        self.assertEqual(cursors, ['foobar'] * 3)
+        self.assertEqual(DropboxAccount.objects.get().cursor, 'page3')
+
+
+    @patch('core.core.Core.handle_triggers')
+    @patch('core.core.Core.handle_trigger')
+    @patch('dropbox.Dropbox')
+    def test_unchanged(self, mock_dbx, mock_core, mock_core_batch):
         #self.create_dropbox()
         self.create_dbx_user_unchanged()
         fbx = FakeDropbox()
         mock_dbx.return_value = fbx
         fireTrigger(4211)
 
-        payload = {'url': 'www.nice-link.me/enjoy', 'size': 0.112312,
-                    'filename': 'entry_name.jpg', 'path': '/entry_name.jpg',
-                    'file_extension': 'jpg'}
-        self.assertEqual(True, mock_core.called)#_with(channel_id=770, trigger_type=2, userid=1, payload=payload)
-        self.assertEqual(mock_core.call_count, 2)
+        self.assertEqual(False, mock_core.called)
+        self.assertEqual(mock_core_batch.call_count, 1)
+        self.assertEqual(len(mock_core_batch.call_args[0][0]), 2)
+
+
+class TestWebhookWalk(BaseTestCase):
+
+    @patch('channel_dropbox.tasks.fireTrigger.apply_async')
+    def test_queue_walk_coalesces(self, mock_apply):
+        self.create_dbx_user_unchanged()
+        queue_walk(4211)
+        queue_walk(4211)
+        queue_walk(4211)
+
+        mock_apply.assert_called_once_with(args=[4211], countdown=5)
+        account = DropboxAccount.objects.get()
+        self.assertIsNotNone(account.walk_requested)
+
+    @patch('channel_dropbox.tasks.fireTrigger.apply_async')
+    def test_stale_walk_request_is_queued_again(self, mock_apply):
+        self.create_dbx_user_unchanged()
+        queue_walk(4211)
+        # the queued walk got lost
+        DropboxAccount.objects.update(
+            walk_requested=timezone.now() - timedelta(minutes=10))
+        queue_walk(4211)
+
+        self.assertEqual(mock_apply.call_count, 2)
+        account = DropboxAccount.objects.get()
+        self.assertGreater(account.walk_requested,
+                           timezone.now() - timedelta(minutes=1))
+
+    @patch('core.core.Core.handle_triggers')
+    @patch('core.core.Core.handle_trigger')
+    @patch('dropbox.Dropbox')
+    def test_walk_clears_request_and_lock(self, mock_dbx, mock_core,
+                                          mock_core_batch):
+        self.create_dbx_user_unchanged()
+        mock_dbx.return_value = FakeDropbox()
+        with patch('channel_dropbox.tasks.fireTrigger.apply_async'):
+            queue_walk(4211)
+        fireTrigger(4211)
+
+        account = DropboxAccount.objects.get()
+        self.assertIsNone(account.walk_requested)
+        self.assertEqual(account.lock_owner, '')
+        self.assertIsNone(account.locked_until)
+        self.assertEqual(account.cursor, 'foobar')
+
+    @patch('channel_dropbox.tasks.fireTrigger.retry', side_effect=Retry)
+    @patch('dropbox.Dropbox')
+    def test_locked_account_retries(self, mock_dbx, mock_retry):
+        self.create_dbx_user_unchanged()
+        DropboxAccount.objects.update(
+            lock_owner='other',
+            locked_until=timezone.now() + timedelta(minutes=1))
+
+        with self.assertRaises(Retry):
+            fireTrigger(4211)
+        mock_retry.assert_called_once_with(countdown=5)
+        self.assertFalse(mock_dbx.called)
+        self.assertEqual(DropboxAccount.objects.get().lock_owner, 'other')
+
+    @patch('channel_dropbox.tasks.fireTrigger.retry', side_effect=Retry)
+    @patch('dropbox.Dropbox')
+    def test_locked_account_gives_up(self, mock_dbx, mock_retry):
+        self.create_dbx_user_unchanged()
+        DropboxAccount.objects.update(
+            walk_requested=timezone.now(),
+            lock_owner='other',
+            locked_until=timezone.now() + timedelta(minutes=1))
+
+        fireTrigger.apply(args=[4211],
+                          retries=fireTrigger.max_retries).get()
+        self.assertFalse(mock_retry.called)
+        self.assertIsNone(DropboxAccount.objects.get().walk_requested)
+
+    @patch('core.core.Core.handle_triggers')
+    @patch('core.core.Core.handle_trigger')
+    @patch('dropbox.Dropbox')
+    def test_expired_lock_is_taken_over(self, mock_dbx, mock_core,
+                                        mock_core_batch):
+        self.create_dbx_user_unchanged()
+        DropboxAccount.objects.update(
+            lock_owner='other',
+            locked_until=timezone.now() - timedelta(minutes=1))
+        mock_dbx.return_value = FakeDropbox()
+
+        fireTrigger(4211)
+        self.assertEqual(mock_core_batch.call_count, 1)
+        self.assertEqual(DropboxAccount.objects.get().lock_owner, '')
+
+
+class TestSeenFiles(BaseTestCase):
+
+    @patch('core.core.Core.handle_triggers')
+    @patch('core.core.Core.handle_trigger')
+    @patch('dropbox.Dropbox')
+    def test_unchanged_file_is_suppressed(self, mock_dbx, mock_core,
+                                          mock_core_batch):
+        self.create_dbx_user_unchanged()
+        fbx = FakeDropbox()
+        fbx.files_list_folder_continue = Mock(
+            return_value=ListFolderResult(cursor='foobar', has_more=False,
+                entries=[RevisedFileMetadata()]))
+        fbx.files_get_temporary_link = Mock(
+            side_effect=FakeDropbox().files_get_temporary_link)
+        mock_dbx.return_value = fbx
+
+        fireTrigger(4211)
+        fireTrigger(4211)
+
+        self.assertEqual(fbx.files_get_temporary_link.call_count, 1)
+        self.assertEqual(len(mock_core_batch.call_args_list[0][0][0]), 2)
+        self.assertEqual(mock_core_batch.call_args_list[1][0][0], [])
+        self.assertEqual(dedup_stats.snapshot(),
+                         {'fired': 1, 'suppressed': 1})
+
+    @patch('core.core.Core.handle_triggers')
+    @patch('core.core.Core.handle_trigger')
+    @patch('dropbox.Dropbox')
+    def test_failed_page_is_not_suppressed(self, mock_dbx, mock_core,
+                                           mock_core_batch):
+        self.create_dbx_user_unchanged()
+        fbx = FakeDropbox()
+        fbx.files_list_folder_continue = Mock(
+            return_value=ListFolderResult(cursor='foobar', has_more=False,
+                entries=[RevisedFileMetadata()]))
+        fbx.files_get_temporary_link = Mock(
+            side_effect=[dropbox.exceptions.InternalServerError('id', 500,
+                                                                'error'),
+                         FakeDropbox().files_get_temporary_link('/')])
+        mock_dbx.return_value = fbx
+
+        with self.assertRaises(dropbox.exceptions.InternalServerError):
+            fireTrigger(4211)
+        self.assertEqual(DropboxAccount.objects.get().seen_files, '')
+
+        # the repeated walk fires the trigger
+        fireTrigger(4211)
+        self.assertEqual(len(mock_core_batch.call_args_list[0][0][0]), 2)
+        self.assertNotEqual(DropboxAccount.objects.get().seen_files, '')
+
+
+    @patch('core.core.Core.handle_triggers')
+    @patch('core.core.Core.handle_trigger')
+    @patch('dropbox.Dropbox')
+    def test_seen_files_are_saved_once_per_walk(self, mock_dbx, mock_core,
+                                                mock_core_batch):
+        self.create_dbx_user_unchanged()
+        mock_dbx.return_value = PagedDropbox(3)
+
+        with CaptureQueriesContext(connection) as queries:
+            fireTrigger(4211)
+
+        self.assertEqual(len([q for q in queries.captured_queries
+                              if q['sql'].startswith('UPDATE') and
+                              'seen_files' in q['sql']]), 1)
+        self.assertEqual(DropboxAccount.objects.get().cursor, 'page3')
+
+
+class TestAccountInfo(BaseTestCase):
+
+    @patch('core.core.Core.handle_triggers')
+    @patch('core.core.Core.handle_trigger')
+    @patch('dropbox.Dropbox')
+    def test_checked_once_per_ttl(self, mock_dbx, mock_core, mock_core_batch):
+        self.create_dbx_user_changed()
+        fbx = FakeDropbox()
+        fbx.users_get_current_account = Mock(
+            side_effect=fbx.users_get_current_account)
+        mock_dbx.return_value = fbx
+
+        fireTrigger(4211)
+        fireTrigger(4211)
+
+        self.assertEqual(fbx.users_get_current_account.call_count, 1)
+        self.assertEqual(mock_core.call_count, 1)
+        user = DropboxUser.objects.get(dropbox_userid=4211)
+        self.assertEqual(len(user.info_digest), 64)
+        self.assertIsNotNone(user.info_checked)
+
+    @patch('core.core.Core.handle_triggers')
+    @patch('core.core.Core.handle_trigger')
+    @patch('dropbox.Dropbox')
+    def test_unchanged_after_ttl(self, mock_dbx, mock_core, mock_core_batch):
+        self.create_dbx_user_changed()
+        mock_dbx.return_value = FakeDropbox()
+        fireTrigger(4211)
+        DropboxUser.objects.update(
+            info_checked=timezone.now() - timedelta(days=1))
+
+        with patch('channel_dropbox.models.DropboxUser.save') as mock_save:
+            fireTrigger(4211)
+
+        self.assertFalse(mock_save.called)
+        self.assertEqual(mock_core.call_count, 1)
+        user = DropboxUser.objects.get(dropbox_userid=4211)
+        self.assertGreater(user.info_checked,
+                           timezone.now() - timedelta(minutes=1))
@@ -1,20 +1,20 @@
 from django.contrib.auth.models import User
 from django.test import TestCase, RequestFactory
-from .models import DropboxAccount, DropboxUser
+from channel_dropbox.models import DropboxAccount, DropboxUser
 from django.test.client import Client
 from django.http import HttpResponse
-from unittest.mock import patch, Mock, MagicMock, PropertyMock
+from unittest.mock import patch, call, Mock, MagicMock, PropertyMock
 from config.keys import keys
 from django.core.urlresolvers import reverse
 import dropbox
-from dropbox.files import ListFolderResult
+from dropbox.files import ListFolderResult, ListFolderGetLatestCursorResult
 from dropbox.users import Account, Name, SpaceUsage,\
     SpaceAllocation, IndividualSpaceAllocation
 import json
 import hmac
 import logging
 from hashlib import sha256
-from . import views
+from channel_dropbox import views
 import channel_dropbox.tasks
 
 class FakeDropbox():
@@ -23,6 +23,10 @@ class FakeDropbox():
         result = ListFolderResult()
         result.cursor = "foo"
         return result
+    def files_list_folder_get_latest_cursor(self, path, recursive,
+                include_media_info, include_deleted):
+        result = ListFolderGetLatestCursorResult(cursor="latest")
+        return result
     def users_get_current_account(self):
         account = Account(
             name = Name(display_name="Display_test_name"),
@@ -123,9 +127,11 @@ class TestFinishAuthentication(BaseTestCase):
 
         dropbox_account = DropboxAccount.objects.get(user=self.user)
         self.assertNotEqual(dropbox_account, None)
+        self.assertEqual(dropbox_account.cursor, "latest")
         dropbox_user = DropboxUser.objects\
             .get(dropbox_account=dropbox_account)
         self.assertNotEqual(dropbox_user, None)
+        self.assertEqual(len(dropbox_user.info_digest), 64)
         self.assertEqual(res.status_code, 302)
         self.assertEqual(res.url, "/?status=success")
 
@@ -213,17 +219,29 @@ class TestWebhook(BaseTestCase):
         self.assertContains(response, 'test-challenge')
 
     @patch('hmac.compare_digest')
-    @patch('channel_dropbox.tasks.fireTrigger')
-    def test_dbx_webhook_post(self, mock_fire_trigger, mock_digest):
+    @patch('channel_dropbox.tasks.queue_walk')
+    def test_dbx_webhook_post(self, mock_queue_walk, mock_digest):
         res = self.client.post(self.url,
                                data=self.payload,
                                content_type='application/json',
                                HTTP_X_DROPBOX_SIGNATURE=self.signature)
         self.assertEqual(res.status_code, 200)
-        #mock_fire_trigger.assert_called_once_with(12345678)
+        #mock_queue_walk.assert_called_once_with(12345678)
+
+    @patch('hmac.compare_digest')
+    @patch('channel_dropbox.tasks.queue_walk')
+    def test_dbx_webhook_post_queues_walks(self, mock_queue_walk, mock_digest):
+        payload = '{"delta": {"users": [12345678, 87654321]}}'
+        res = self.client.post(self.url,
+                               data=payload,
+                               content_type='application/json',
+                               HTTP_X_DROPBOX_SIGNATURE=self.signature)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(mock_queue_walk.call_args_list,
+                         [call(12345678), call(87654321)])
 
-    @patch('channel_dropbox.tasks.fireTrigger')
-    def test_dbx_webhook_post_with_wrong_signature(self, mock_fire_trigger):
+    @patch('channel_dropbox.tasks.queue_walk')
+    def test_dbx_webhook_post_with_wrong_signature(self, mock_queue_walk):
         res = self.client.post(self.url,
                        data=self.payload,
                        content_type='application/json',
@@ -16,11 +16,11 @@ import sys
 import urllib
 import datetime
 import dropbox
-from . import views
+from channel_dropbox import views
 import channel_dropbox.tasks
 from config.keys import keys
 from channel_dropbox.channel import DropboxChannel
-from .models import DropboxAccount
+from channel_dropbox.models import DropboxAccount
 
 from core.models import Channel, Trigger, TriggerOutput
 
@@ -18,6 +18,7 @@ from channel_dropbox import tasks
 #needed for webhook
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
+from django.utils import timezone
 import json
 import urllib
 from hashlib import sha256
@@ -148,7 +149,9 @@ class AuthView(LoginRequiredMixin, View):
         if disk.allocation.is_individual() is False:
             return self.error(request)
 
-        init_dropbox_folder = dbx.files_list_folder(path='',
+        # start at the current state, without listing the existing files
+        init_dropbox_folder = dbx.files_list_folder_get_latest_cursor(
+                                                    path='',
                                                     recursive=True,
                                                     include_media_info=True,
                                                     include_deleted=True)
@@ -169,7 +172,13 @@ class AuthView(LoginRequiredMixin, View):
                                    email = account.email,
                                    profile_photo_url = account.profile_photo_url,
                                    disk_used = used,
-                                   disk_allocated = allocated)
+                                   disk_allocated = allocated,
+                                   info_digest = tasks.account_info_digest(
+                                       account.name.display_name,
+                                       account.email,
+                                       account.profile_photo_url,
+                                       allocated),
+                                   info_checked = timezone.now())
         dropbox_user.save()
 
         logger.debug('[Dropbox - View - auth-finish] \
@@ -247,9 +256,9 @@ class WebhookView(View):
 
             for user in data['delta']['users']:
                 logger.debug('[Dropbox - View - webhook] \
-                    firedTrigger for user with id:{}'.format(user))
+                    queue walk for user with id:{}'.format(user))
 
-                tasks.fireTrigger(user)
+                tasks.queue_walk(user)
         except json.decoder.JSONDecodeError:
             pass
         return HttpResponse()
@@ -1,10 +1,12 @@
 import logging
 import re
 from enum import IntEnum
+from time import monotonic
 from uuid import uuid4
 
 import magic
 import requests
+from django.conf import settings
 from django.core.urlresolvers import reverse
 from django.utils.dateparse import parse_datetime
 from django.utils.translation import ugettext as _
@@ -14,10 +16,16 @@ from core import models
 from core.channel import (Channel, NotSupportedTrigger, NotSupportedAction,
                           ConditionNotMet, ChannelStateForUser)
 from core.core import Core
+from core.http import HttpClient
+from core.templating import render_mappings
 from .config import Config
 from .models import FacebookAccount
 
 log = logging.getLogger("channel")
+http_client = HttpClient("Facebook")
+
+# trigger outputs that are filled with text from the payload
+TEXT_FIELDS = frozenset(["message", "link", "permalink_url", "description"])
 
 
 class TriggerType(IntEnum):
@@ -203,7 +211,7 @@ class FacebookChannel(Channel):
         }
 
         fb_request_url = Config.get("API_BASE_URI") + "/me/feed"
-        resp = requests.post(fb_request_url, data=data)
+        resp = http_client.post(fb_request_url, data=data)
         if resp.ok and "id" in resp.json():
             log.info(_("A new Post with ID {} published!".format(resp.json()['id'])))
         else:
@@ -242,7 +250,7 @@ class FacebookChannel(Channel):
         fields['access_token'] = fb_user.access_token
 
         fb_request_url = Config.get("API_BASE_URI") + "/me/feed"
-        resp = requests.post(fb_request_url, data=fields)
+        resp = http_client.post(fb_request_url, data=fields)
         if resp.ok and "id" in resp.json():
             log.info(_("A new link with ID {} published!".format(resp.json()['id'])))
         else:
@@ -265,7 +273,7 @@ class FacebookChannel(Channel):
 
         try:
             fb_request_url = Config.get("API_BASE_URI") + "/{}/photos".format(fb_user.username)
-            resp = requests.post(fb_request_url, files=post_data)
+            resp = http_client.post(fb_request_url, files=post_data)
 
             if resp.ok and "post_id" in resp.json():
                 log.info(_("A new Post with ID {} published!".format(resp.json()['post_id'])))
@@ -305,7 +313,7 @@ class FacebookChannel(Channel):
 
         try:
             fb_request_url = Config.get("API_BASE_URI_VIDEO") + "/me/videos"
-            resp = requests.post(fb_request_url, files=post_data)
+            resp = http_client.post(fb_request_url, files=post_data)
         except Exception:
             pass
             log.error(_("A failure occurred while posting on Facebook : "
@@ -321,36 +329,7 @@ class FacebookChannel(Channel):
 
     @staticmethod
     def _replace_text_inputs(payload, inputs):
-        outs = {}
-        for key in inputs:
-            val = inputs[key]
-            if type(val) is str:
-                if val.find("%message%") > -1:
-                    try:
-                        val = val.replace("%message%",
-                                          payload["message"])
-                    except:
-                        pass
-                if val.find("%link%") > -1:
-                    try:
-                        val = val.replace("%link%",
-                                          payload["link"])
-                    except:
-                        pass
-                if val.find("%permalink_url%") > -1:
-                    try:
-                        val = val.replace("%permalink_url%",
-                                          payload["permalink_url"])
-                    except:
-                        pass
-                if val.find("%description%") > -1:
-                    try:
-                        val = val.replace("%description%",
-                                          payload["description"])
-                    except:
-                        pass
-            outs[key] = val
-        return outs
+        return render_mappings(inputs, payload, TEXT_FIELDS)
 
     @staticmethod
     def _replace_image_inputs(payload, inputs):
@@ -384,35 +363,77 @@ class FacebookChannel(Channel):
         return domain_base + reverse(alias)
 
     def _getFeeds(self, user, time, fields=None):
+        """
+        Fetches the posts of a user published after user.last_post_time.
+
+        The feed is requested from that time on in pages of
+        settings.FACEBOOK_FEED_PAGE_SIZE posts, and paging stops at the
+        first known post or at a page that is not full. All requests share
+        a budget of settings.FACEBOOK_FEED_TIME_BUDGET seconds. The newest
+        fetched post is stored as the last post of the user.
+
+        The pages come newest first, so if paging fails or runs out of time
+        the older posts are missing. Nothing is returned then and the last
+        post is kept, the next call fetches the posts again.
+
+        Returns:
+            The new posts, the oldest first.
+        """
         returnvalue = []
+        page_size = getattr(settings, 'FACEBOOK_FEED_PAGE_SIZE', 25)
+        deadline = monotonic() + getattr(settings,
+                                         'FACEBOOK_FEED_TIME_BUDGET', 20)
+        connect_timeout, read_timeout = http_client.timeout
         data = {
             'access_token': user.access_token,
             'fields': fields,
-            'limit': 1,
+            'limit': page_size,
+            'since': int(user.last_post_time.timestamp()),
         }
         fb_request_url = Config.get("API_BASE_URI") + "/me/feed"
         fb_user_last_post_id = user.last_post_id
         fb_user_last_post_time = user.last_post_time
+        complete = False
         try:
-            resp = requests.get(fb_request_url, params=data)
-            break_loop = False
-            while resp.ok and not break_loop:
-                for feed in resp.json()['data']:
+            while fb_request_url:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    log.warning("Fetching the Facebook feed of {} took too "
+                                "long, retrying later".format(user.username))
+                    break
+                resp = http_client.get(
+                        fb_request_url, params=data,
+                        timeout=(connect_timeout, min(read_timeout,
+                                                      remaining)))
+                if not resp.ok:
+                    break
+                page = resp.json()
+                posts = page.get('data', [])
+                for feed in posts:
                     log.debug(feed)
+                    created_time = parse_datetime(feed['created_time'])
                     if feed['id'] == user.last_post_id \
-                            or parse_datetime(feed['created_time']) <= user.last_post_time \
-                            or feed['id'] == fb_user_last_post_id:
-                        break_loop = True
+                            or created_time <= user.last_post_time:
+                        fb_request_url = None
                         break
                     returnvalue.append(feed)
-                    if fb_user_last_post_time < parse_datetime(feed['created_time']):
+                    if fb_user_last_post_time < created_time:
                         fb_user_last_post_id = feed['id']
-                        fb_user_last_post_time = parse_datetime(feed['created_time'])
-
-                    resp = requests.get(resp.json()['paging']['next'], timeout=5.00)
+                        fb_user_last_post_time = created_time
+                else:
+                    if len(posts) < page_size:
+                        fb_request_url = None
+                    else:
+                        # the next page url carries all parameters
+                        fb_request_url = page.get('paging', {}).get('next')
+                        data = None
+            else:
+                complete = True
         except requests.exceptions.RequestException:
             pass
 
+        if not complete:
+            return []
         user.last_post_id = fb_user_last_post_id
         user.last_post_time = fb_user_last_post_time
         user.save()
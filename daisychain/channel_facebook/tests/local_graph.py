@@ -0,0 +1,85 @@
+"""A local stand-in for the Facebook Graph API.
+
+LocalGraph runs an HTTP server serving the feed of one user, with the
+``since``, ``limit`` and ``after`` parameters of the Graph API, and counts
+the requests it gets.
+"""
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from threading import Thread
+from urllib.parse import parse_qs, urlencode, urlsplit
+import json
+
+
+class LocalGraphHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        api = self.server.api
+        url = urlsplit(self.path)
+        api.requests.append(self.path)
+        if not url.path.endswith('/me/feed'):
+            return self.respond(404, {'error': {'message': 'unknown path'}})
+
+        params = {key: values[0]
+                  for key, values in parse_qs(url.query).items()}
+        self.respond(200, api.feed_page(url.path, params))
+
+    def respond(self, status, result):
+        body = json.dumps(result).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class LocalGraph():
+    """In-memory feed served over HTTP.
+
+    ``posts`` holds the posts, the newest first, and ``requests`` the path
+    of every request.
+    """
+
+    def __init__(self):
+        self.posts = []
+        self.requests = []
+        self._server = HTTPServer(('127.0.0.1', 0), LocalGraphHandler)
+        self._server.api = self
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/v2.7'.format(self._server.server_port)
+
+    def start(self):
+        Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def add_post(self, post_id, created_time, post_type='status'):
+        self.posts.insert(0, {
+            'id': post_id,
+            'message': 'Post {}'.format(post_id),
+            'created_time': created_time.strftime('%Y-%m-%dT%H:%M:%S+0000'),
+            'type': post_type})
+
+    def feed_page(self, path, params):
+        posts = self.posts
+        if 'since' in params:
+            since = datetime.fromtimestamp(int(params['since']),
+                                           tz=timezone.utc)
+            posts = [p for p in posts if datetime.strptime(
+                p['created_time'], '%Y-%m-%dT%H:%M:%S%z') >= since]
+
+        offset = int(params.get('after', 0))
+        limit = int(params.get('limit', 25))
+        page = {'data': posts[offset:offset + limit]}
+        if offset + limit < len(posts):
+            params = dict(params, after=offset + limit)
+            page['paging'] = {'next': 'http://127.0.0.1:{}{}?{}'.format(
+                self._server.server_port, path, urlencode(params))}
+        return page
@@ -74,7 +74,7 @@ class ChannelActionTestCase(FacebookBaseTestCase):
         with self.assertRaises(NotSupportedAction):
             self.channel.handle_action(-99, self.user.id, {})
 
-    @patch('requests.post')
+    @patch('core.http.HttpClient.post')
     @patch('channel_facebook.channel.log.error')
     def test_new_post(self, mock_log, mock_post):
         with self.assertRaises(ValueError):
@@ -99,7 +99,7 @@ class ChannelActionTestCase(FacebookBaseTestCase):
         self.channel.new_post(self.facebook_account, inputs['message'])
         mock_log.assert_called_once()
 
-    @patch('requests.post')
+    @patch('core.http.HttpClient.post')
     @patch('channel_facebook.channel.log.error')
     def test_new_link(self, mock_log, mock_post):
         inputs = {
@@ -121,7 +121,7 @@ class ChannelActionTestCase(FacebookBaseTestCase):
         self.channel.new_link(self.facebook_account, inputs)
         mock_log.assert_called_once()
 
-    @patch('requests.post')
+    @patch('core.http.HttpClient.post')
     @patch('channel_facebook.channel.log.error')
     def test_new_picture(self, mock_log, mock_post):
         inputs = {
@@ -143,7 +143,7 @@ class ChannelActionTestCase(FacebookBaseTestCase):
         self.channel.new_picture(self.facebook_account, inputs)
         mock_log.assert_called_once()
 
-    @patch('requests.post')
+    @patch('core.http.HttpClient.post')
     @patch('channel_facebook.channel.log.error')
     def test_new_video(self, mock_log, mock_post):
         inputs = {
@@ -171,7 +171,7 @@ class ChannelActionTestCase(FacebookBaseTestCase):
         self.channel.new_video(self.facebook_account, inputs)
         mock_log.assert_called_once()
 
-    @patch('requests.get')
+    @patch('core.http.HttpClient.get')
     def test_get_feeds(self, mock_get):
         fb_response_fields = 'message,actions,full_picture,picture,from,created_time,' \
                              'link,permalink_url,type,description,source,object_id'
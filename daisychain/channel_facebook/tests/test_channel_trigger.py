@@ -1,8 +1,12 @@
+from datetime import datetime, timedelta, timezone
+
+from django.test import override_settings
 from mock import patch
 
 from channel_facebook.channel import TriggerType
 from core.channel import (NotSupportedTrigger, ConditionNotMet)
 from core.models import Channel, Trigger
+from .local_graph import LocalGraph
 from .test_base import FacebookBaseTestCase
 
 
@@ -424,3 +428,90 @@ class ChannelTriggerTestCase(FacebookBaseTestCase):
         mock_log.assert_not_called()
         mock_reverse.assert_called_with("test_alias")
         self.assertEqual("http://test.domain:1234/test_alias", actual)
+
+
+@patch('channel_facebook.channel.Config.get')
+class FeedFetchTestCase(FacebookBaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.graph = LocalGraph()
+        self.graph.start()
+        self.addCleanup(self.graph.stop)
+
+        self.start = datetime(2016, 9, 14, 12, 0, tzinfo=timezone.utc)
+        self.facebook_account.last_post_id = 'old'
+        self.facebook_account.last_post_time = self.start
+        self.facebook_account.save()
+        self.graph.add_post('old', self.start)
+
+    def add_posts(self, count):
+        for i in range(count):
+            self.graph.add_post('new{}'.format(i),
+                                self.start + timedelta(minutes=i + 1))
+
+    def test_one_request_for_a_page(self, mock_get):
+        mock_get.return_value = self.graph.url
+        self.add_posts(10)
+
+        feeds = self.channel._getFeeds(self.facebook_account, None,
+                                       self.fields)
+
+        self.assertEqual([feed['id'] for feed in feeds],
+                         ['new{}'.format(i) for i in range(10)])
+        self.assertEqual(len(self.graph.requests), 1)
+        self.facebook_account.refresh_from_db()
+        self.assertEqual(self.facebook_account.last_post_id, 'new9')
+        self.assertEqual(self.facebook_account.last_post_time,
+                         self.start + timedelta(minutes=10))
+
+    @override_settings(FACEBOOK_FEED_PAGE_SIZE=4)
+    def test_follow_pages(self, mock_get):
+        mock_get.return_value = self.graph.url
+        self.add_posts(10)
+
+        feeds = self.channel._getFeeds(self.facebook_account, None,
+                                       self.fields)
+
+        self.assertEqual(len(feeds), 10)
+        # the third page holds the last two new posts and the known one
+        self.assertEqual(len(self.graph.requests), 3)
+
+    def test_no_new_posts(self, mock_get):
+        mock_get.return_value = self.graph.url
+
+        self.assertEqual(self.channel._getFeeds(self.facebook_account, None,
+                                                self.fields), [])
+        self.assertEqual(len(self.graph.requests), 1)
+
+    @override_settings(FACEBOOK_FEED_TIME_BUDGET=0)
+    def test_time_budget(self, mock_get):
+        mock_get.return_value = self.graph.url
+        self.add_posts(1)
+
+        self.assertEqual(self.channel._getFeeds(self.facebook_account, None,
+                                                self.fields), [])
+        self.assertEqual(self.graph.requests, [])
+
+    @override_settings(FACEBOOK_FEED_PAGE_SIZE=4,
+                       FACEBOOK_FEED_TIME_BUDGET=20)
+    def test_partial_fetch(self, mock_get):
+        mock_get.return_value = self.graph.url
+        self.add_posts(10)
+
+        # the budget runs out after the first page
+        with patch('channel_facebook.channel.monotonic',
+                   side_effect=[0, 1, 30]):
+            feeds = self.channel._getFeeds(self.facebook_account, None,
+                                           self.fields)
+        self.assertEqual(feeds, [])
+        self.assertEqual(len(self.graph.requests), 1)
+        self.facebook_account.refresh_from_db()
+        self.assertEqual(self.facebook_account.last_post_id, 'old')
+        self.assertEqual(self.facebook_account.last_post_time, self.start)
+
+        # the older posts are not lost
+        feeds = self.channel._getFeeds(self.facebook_account, None,
+                                       self.fields)
+        self.assertEqual([feed['id'] for feed in feeds],
+                         ['new{}'.format(i) for i in range(10)])
@@ -10,8 +10,8 @@ class TestCallbackView(FacebookBaseTestCase):
         self.user = self.create_user()
         self.user.save()
 
-    @patch('requests.get')
-    @patch('requests.post')
+    @patch('core.http.HttpClient.get')
+    @patch('core.http.HttpClient.post')
     def test_callback_with_valid_user(self, mock_post, mock_get):
         # mock returned json with the users access token
         self.client.force_login(self.user)
@@ -35,8 +35,8 @@ class TestCallbackView(FacebookBaseTestCase):
         facebook_account = FacebookAccount.objects.get(user=self.user)
         self.assertNotEqual(facebook_account, None)
 
-    @patch('requests.get')
-    @patch('requests.post')
+    @patch('core.http.HttpClient.get')
+    @patch('core.http.HttpClient.post')
     def test_callback_with_invalid_post_response(self, mock_post, mock_get):
         # mock returned json with the users access token
         self.client.force_login(self.user)
@@ -60,8 +60,8 @@ class TestCallbackView(FacebookBaseTestCase):
                           user=self.user)
         self.assertEquals(resp.status_code, 400)
 
-    @patch('requests.get')
-    @patch('requests.post')
+    @patch('core.http.HttpClient.get')
+    @patch('core.http.HttpClient.post')
     def test_callback_with_invalid_get_response(self, mock_post, mock_get):
         # mock returned json with the users access token
         self.client.force_login(self.user)
@@ -85,7 +85,7 @@ class TestCallbackView(FacebookBaseTestCase):
                           user=self.user)
         self.assertEquals(resp.status_code, 400)
 
-    @patch('requests.get')
+    @patch('core.http.HttpClient.get')
     def test_callback_with_valid_already_existing_user(self,
                                                        mock_get):
         # mock returned json with the users access token
@@ -6,7 +6,6 @@ from logging import getLogger
 from urllib.parse import urlencode
 from uuid import uuid4
 
-import requests
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.models import User
@@ -17,11 +16,13 @@ from django.utils.translation import ugettext as _
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import View
 
+from core.http import HttpClient
 from .channel import FacebookChannel
 from .config import Config
 from .models import FacebookAccount
 
 log = getLogger('channel')
+http_client = HttpClient("Facebook")
 
 
 def calculate_digest(payload):
@@ -108,7 +109,7 @@ class CallbackView(View):
             'code': code,
             'redirect_uri': request.build_absolute_uri(callback_url),
         }
-        resp = requests.get(Config.get("API_ACCESS_TOKEN_URI"), params=data)
+        resp = http_client.get(Config.get("API_ACCESS_TOKEN_URI"), params=data)
         if not resp.ok:
             return HttpResponseBadRequest()
         try:
@@ -120,8 +121,8 @@ class CallbackView(View):
                 'input_token': access_token,
                 'access_token': Config.get('APP_ID') + '|' + Config.get('APP_SECRET'),
             }
-            user_resp = requests.get(Config.get('API_CHECK_ACCESS_TOKEN_URI'),
-                                     params=data)
+            user_resp = http_client.get(
+                Config.get('API_CHECK_ACCESS_TOKEN_URI'), params=data)
         except Exception:
             return HttpResponseBadRequest()
         username = user_resp.json()['data']['user_id']
@@ -1,9 +1,10 @@
 import json
 import logging
-import requests
 from core.channel import (Channel, NotSupportedTrigger, NotSupportedAction,
                           ConditionNotMet, ChannelStateForUser)
 from core.core import Core
+from core.http import HttpClient
+from core.utils import replace_text_mappings
 from channel_github.models import GithubAccount
 from channel_github.config import (TRIGGER_TYPE, CHANNEL_NAME, CLIENT_ID,
                                    CLIENT_SECRET, TRIGGER_OUTPUT,
@@ -12,6 +13,7 @@ from channel_github.config import (TRIGGER_TYPE, CHANNEL_NAME, CLIENT_ID,
 
 
 log = logging.getLogger('channel')
+http_client = HttpClient(CHANNEL_NAME)
 
 
 class GithubChannel(Channel):
@@ -21,7 +23,7 @@ class GithubChannel(Channel):
         returns true if a webhook for the given repo already exists
         """
         check_url = REPO_HOOKS_URL.format(repo_name)
-        response = requests.get(check_url, headers=auth_header)
+        response = http_client.get(check_url, headers=auth_header)
         data = json.loads(response.content.decode('utf-8'))
         # check if our webhook url is associated with any webhook of the repo
         return any(get_webhook_url() in e['config']['url'] for e in data)
@@ -37,7 +39,7 @@ class GithubChannel(Channel):
         Returns:
             True if the repository exists, false otherwise.
         """
-        resp = requests.get(API_URL.format(repo_name))
+        resp = http_client.get(API_URL.format(repo_name))
         return resp.ok
 
     def create_webhook(self,
@@ -71,7 +73,7 @@ class GithubChannel(Channel):
                     }
                 }
         subscribe_url = REPO_HOOKS_URL.format(repo_name)
-        resp = requests.post(subscribe_url,
+        resp = http_client.post(subscribe_url,
                   json=data,
                   headers=auth_header)
         if resp.ok:
@@ -137,16 +139,7 @@ class GithubChannel(Channel):
             raise NotSupportedTrigger()
 
     def _replace_mappings(self, mappings, to_replace, payload):
-        for key in mappings:
-            val = mappings[key]
-            if type(val) == str:
-                for s in to_replace:
-                    # replace any placeholder by its concrete value
-                    placeholder = '%{}%'.format(s)
-                    val = val.replace(placeholder,
-                                      payload[s])
-                mappings[key] = val
-        return mappings
+        return replace_text_mappings(mappings, to_replace, payload)
 
     def handle_action(self, action_type, userid, inputs):
         raise NotSupportedAction()
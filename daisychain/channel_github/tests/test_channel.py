@@ -49,7 +49,7 @@ class BaseTestCase(TestCase):
         github_account.save()
         return github_account
 
-    @patch('requests.post')
+    @patch('core.http.HttpClient.post')
     @patch('channel_github.channel.GithubChannel._check_for_webhook')
     def test_create_webhook_response_ok(self,
                                         mock_check_for_webhook,
@@ -63,7 +63,7 @@ class BaseTestCase(TestCase):
         expected = '/'.join(['Franz_K', 'test_repo'])
         self.assertEquals(ret, expected)
 
-    @patch('requests.post')
+    @patch('core.http.HttpClient.post')
     @patch('channel_github.channel.GithubChannel._check_for_webhook')
     def test_create_webhook_response_invalid(self,
                                              mock_check_for_webhook,
@@ -76,7 +76,7 @@ class BaseTestCase(TestCase):
                                           owner='www.example.com')
         self.assertEquals(ret, None)
 
-    @patch('requests.post')
+    @patch('core.http.HttpClient.post')
     @patch('channel_github.channel.GithubChannel._check_for_webhook')
     def test_create_webhook_without_owner(self,
                                           mock_check_for_webhook,
@@ -169,7 +169,7 @@ class BaseTestCase(TestCase):
                                        self.user.id,
                                        {})
 
-    @patch('requests.get')
+    @patch('core.http.HttpClient.get')
     def test_check_for_webhook(self, mock_get):
         test_content = b'[{"config": {"url": "https://example.com/github/hooks"}}]'
         mock_get.return_value = self.MockResponse(True,
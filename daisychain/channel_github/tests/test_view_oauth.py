@@ -60,8 +60,8 @@ class TestCallbackView(BaseTestCase):
         def json(self):
             return self.json_data
 
-    @patch('requests.get')
-    @patch('requests.post')
+    @patch('core.http.HttpClient.get')
+    @patch('core.http.HttpClient.post')
     def test_callback_with_valid_user(self, mock_post, mock_get):
         # mock returned json with the users access token
         self.client.force_login(self.user)
@@ -83,8 +83,8 @@ class TestCallbackView(BaseTestCase):
         github_account = GithubAccount.objects.get(user=self.user)
         self.assertNotEqual(github_account, None)
 
-    @patch('requests.get')
-    @patch('requests.post')
+    @patch('core.http.HttpClient.get')
+    @patch('core.http.HttpClient.post')
     def test_callback_with_invalid_post_response(self, mock_post, mock_get):
         # mock returned json with the users access token
         self.client.force_login(self.user)
@@ -108,8 +108,8 @@ class TestCallbackView(BaseTestCase):
                           user=self.user)
         self.assertEquals(resp.status_code, 400)
 
-    @patch('requests.get')
-    @patch('requests.post')
+    @patch('core.http.HttpClient.get')
+    @patch('core.http.HttpClient.post')
     def test_callback_with_invalid_get_response(self, mock_post, mock_get):
         # mock returned json with the users access token
         self.client.force_login(self.user)
@@ -133,9 +133,8 @@ class TestCallbackView(BaseTestCase):
                           user=self.user)
         self.assertEquals(resp.status_code, 400)
 
-
-    @patch('requests.get')
-    @patch('requests.post')
+    @patch('core.http.HttpClient.get')
+    @patch('core.http.HttpClient.post')
     def test_callback_with_valid_already_existing_user(self,
                                                        mock_post,
                                                        mock_get):
@@ -4,18 +4,20 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.http import HttpResponse, HttpResponseRedirect, HttpResponseBadRequest
 from django.core.urlresolvers import reverse
 
-import requests
 import json
 from uuid import uuid4
 from urllib.parse import urlencode
 
 from config.keys import keys
+from core.http import HttpClient
 from core.models import Trigger, TriggerInput
 from recipes.util import Draft
 from channel_github.models import GithubAccount
 from channel_github.forms import TriggerInputForm
 from channel_github.channel import GithubChannel
-from channel_github.config import EVENTS
+from channel_github.config import EVENTS, CHANNEL_NAME
+
+http_client = HttpClient(CHANNEL_NAME)
 
 CLIENT_ID = keys['GITHUB']['CLIENT_ID']
 CLIENT_SECRET = keys['GITHUB']['CLIENT_SECRET']
@@ -82,7 +84,7 @@ class CallbackView(View):
                 'client_secret': CLIENT_SECRET,
                 'code': code
                 }
-        resp = requests.post(access_token_url, json=data,
+        resp = http_client.post(access_token_url, json=data,
                             headers={'Accept': 'application/json'})
 
         if not resp.ok:
@@ -90,7 +92,7 @@ class CallbackView(View):
 
         access_token = resp.json()['access_token']
         # get username
-        user_resp = requests.get(user_url,
+        user_resp = http_client.get(user_url,
                          headers={'Authorization': 'token ' + access_token})
         if not user_resp.ok:
             return HttpResponseBadRequest()
@@ -1,10 +1,11 @@
 from .models import HueAccount
 from core.channel import Channel, NotSupportedAction, NotSupportedTrigger, ChannelStateForUser
 from django.contrib.auth.models import User
-import requests
+from core.http import HttpClient
 
 import logging
 logger = logging.getLogger('channel')
+http_client = HttpClient('Hue')
 
 LIGHT = 100
 
@@ -48,7 +49,7 @@ class HueChannel(Channel):
         address = 'http://'+ hue.bridge_ip + '/api/' + hue.access_token\
                   + '/lights/' + payload['light_id'] + '/state'
         cmd = '{"on":'+payload['state']+'}'
-        res = requests.put(address, cmd)
+        res = http_client.put(address, cmd)
         error = res.json()[0]['error']
         if error is not None:
             raise HueException('Hue-Error occured!\nAddress:{}\nDescription: {}'\
@@ -26,8 +26,8 @@ class TestHueChannel(TestCase):
 
         self.assertEqual(error, True)
 
-    @patch('requests.put.json')
-    @patch('requests.put')
+    @patch('core.http.HttpClient.put.json')
+    @patch('core.http.HttpClient.put')
     def test_handle_unsupported_action(self, mock_put, mock_json):
         self.account = HueAccount(user=self.user, bridge_ip='132.123.123', access_token='770')
         self.account.save()
@@ -44,8 +44,8 @@ class TestRegisterView(BaseTestCase):
         self.assertRedirects(response,
                          '/accounts/login/?next=/hue/authenticate')
 
-    @patch('requests.post')
-    @patch('requests.get')
+    @patch('core.http.HttpClient.post')
+    @patch('core.http.HttpClient.get')
     def test_logged_user(self, mock_get, mock_post):
         self.client.force_login(self.user)
         res = FakeResponseA()
@@ -6,10 +6,11 @@ from django.shortcuts import redirect
 from .models import HueAccount
 
 import json
-import requests
+from core.http import HttpClient
 
 import logging
 logger = logging.getLogger('channel')
+http_client = HttpClient('Hue')
 
 login_url='/accounts/login/'
 class RegisterView(LoginRequiredMixin, View):
@@ -43,7 +44,7 @@ class RegisterView(LoginRequiredMixin, View):
         except HueAccount.DoesNotExist:
             pass
 
-        req = requests.get('https://www.meethue.com/api/nupnp')
+        req = http_client.get('https://www.meethue.com/api/nupnp')
 
         bridge_ip = req.json()[0]['internalipaddress']
 
@@ -51,7 +52,7 @@ class RegisterView(LoginRequiredMixin, View):
         address = 'http://'+bridge_ip+'/api'
         data = '{"devicetype":"daisychain#'+request.user.username+'"}'
 
-        res = requests.post(address, data)
+        res = http_client.post(address, data)
 
         logger.debug('Response from Hue: {}'.format(json.dumps(res.json())))
         access_token = res.json()[0]['success']['username']
@@ -4,19 +4,25 @@ from enum import IntEnum
 from hashlib import sha256
 from hmac import new as hmac_new
 from time import time
-from tempfile import TemporaryFile
 import logging
 import re
 import requests
 
 from core import models
 from core.core import Core
+from core.http import HttpClient
+from core.media import media_cache
+from core.templating import render_mappings
 from core.channel import (Channel, NotSupportedTrigger, NotSupportedAction,
                           ConditionNotMet, ChannelStateForUser)
 from .models import InstagramAccount
 from .conf import Config
 
 log = logging.getLogger("channel")
+http_client = HttpClient("Instagram")
+
+# trigger outputs that are filled with text from the payload
+TEXT_FIELDS = frozenset(["caption_without_hashtags", "caption", "url"])
 
 
 class TriggerType(IntEnum):
@@ -89,7 +95,7 @@ class InstagramChannel(Channel):
         # We have a InstagramAccount object, check if the access_token is valid
         url = Config.get("API_USER_SELF_ENDPOINT") \
             + "?access_token=" + instagram_user.access_token
-        r = requests.get(url)
+        r = http_client.get(url)
 
         # request was successful
         if r.ok:
@@ -140,20 +146,7 @@ class InstagramChannel(Channel):
         return self._replace_text_inputs(payload, inputs_with_photos)
 
     def _replace_text_inputs(self, payload, inputs):
-        outs = {}
-        for key in inputs:
-            val = inputs[key]
-            if type(val) is str:
-                if val.find("%caption_without_hashtags%") > -1:
-                    val = val.replace("%caption_without_hashtags%",
-                                      payload["caption_without_hashtags"])
-                if val.find("%caption%") > -1:
-                    val = val.replace("%caption%", payload["caption"])
-                if val.find("%url%") > -1:
-                    val = val.replace("%url%", payload["url"])
-            outs[key] = val
-
-        return outs
+        return render_mappings(inputs, payload, TEXT_FIELDS)
 
     def _replace_image_inputs(self, payload, inputs):
         outs = {}
@@ -183,7 +176,8 @@ class InstagramChannel(Channel):
             "client_secret": Config.get("CLIENT_SECRET")
         }
 
-        res = requests.get(Config.get("API_SUBSCRIPTION_ENDPOINT"), get_params)
+        res = http_client.get(Config.get("API_SUBSCRIPTION_ENDPOINT"),
+                              get_params)
 
         if res.ok:
             if 'data' in res.json():
@@ -208,7 +202,8 @@ class InstagramChannel(Channel):
             "verify_token": self.generate_subscription_verify_token(),
             "callback_url": self._build_absolute_uri("instagram:subscription")
         }
-        res = requests.post(Config.get("API_SUBSCRIPTION_ENDPOINT"), post_data)
+        res = http_client.post(Config.get("API_SUBSCRIPTION_ENDPOINT"),
+                               post_data)
 
         if not res.ok:
             log.error("Could not subscribe to Instagram. Error message:")
@@ -227,7 +222,7 @@ class InstagramChannel(Channel):
         # request data
         url = (Config.get("API_MEDIA_ENDPOINT") % mediaid) \
             + "?access_token=" + instagram_user.access_token
-        r = requests.get(url)
+        r = http_client.get(url)
 
         # request was successful
         if r.ok:
@@ -250,19 +245,13 @@ class InstagramChannel(Channel):
                                error['error_message'])
 
     def load_image(self, url):
-        r = requests.get(url, stream=True)
-        if r.ok:
-            tmp_file = TemporaryFile()
-            for chunk in r.iter_content(chunk_size=1024):
-                if chunk:
-                    tmp_file.write(chunk)
-            tmp_file.seek(0)
-            return tmp_file
-        else:
+        try:
+            return media_cache.open(url)
+        except requests.HTTPError as e:
             log.error("Error while downloading media from instagram")
-            log.error(r.json())
+            log.error(e)
             raise ApiException("InternalDownloadError",
-                               r.status_code,
+                               e.response.status_code,
                                "Error while loading image %s" % url)
 
     def fire_trigger(self, trigger):
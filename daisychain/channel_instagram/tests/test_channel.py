@@ -4,6 +4,7 @@ from channel_instagram.conf import Config
 from channel_instagram.models import InstagramAccount
 from core import models
 from core.channel import ChannelStateForUser
+from core.media import media_cache
 from django.contrib.auth.models import User
 from mock import MagicMock, patch
 import logging
@@ -16,6 +17,7 @@ class ChannelTest(TestCase):
     def setUp(self):
         self.channel = channel.InstagramChannel()
         logging.disable(logging.CRITICAL)
+        media_cache.clear()
 
     @patch("channel_instagram.channel.Config.get")
     @patch("channel_instagram.channel.reverse")
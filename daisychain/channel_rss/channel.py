@@ -3,11 +3,12 @@ import logging
 from core.channel import (Channel, NotSupportedTrigger, NotSupportedAction,
                           ConditionNotMet, ChannelStateForUser)
 from core.utils import replace_text_mappings
-from core.models import (RecipeCondition, Recipe, TriggerInput)
+from core.models import (RecipeCondition, Recipe, TriggerInput,
+                         value_hash)
 from core.core import Core
 from channel_rss.config import (TRIGGER_TYPE, CHANNEL_NAME, TO_REPLACE)
-from channel_rss.utils import (entries_since, filter_entries_by_keyword,
-                               build_string_from_entry_list)
+from channel_rss.matcher import KeywordMatcher
+from channel_rss.utils import build_string_from_entry_list
 
 
 class RssChannel(Channel):
@@ -49,15 +50,13 @@ class RssChannel(Channel):
         """
         return ChannelStateForUser.unnecessary
 
-    def fetch_entries_by_keyword(self, feed, since):
+    def fetch_entries_by_keyword(self, feed, entries):
         """
+        Fires the keyword triggers for the new entries of a feed.
 
         Args:
-            feed:
-            since:
-
-        Returns:
-
+            feed: RssFeed object.
+            entries: The new entries of the parsed feed.
         """
         # get trigger inputs keyword and feed url
         trigger_type = TRIGGER_TYPE['entries_keyword']
@@ -68,22 +67,26 @@ class RssChannel(Channel):
                 trigger__channel__name='RSS',
                 trigger__trigger_type=trigger_type,
                 name='keyword')
-        # get all recipe conditions of the feeds url,
-        # those correspond to all recipes that use this feed.
-        url_conditions = RecipeCondition.objects.filter(value=feed.feed_url,
-                                                        trigger_input=url_input)
-        # fetch rss feed
-        entries = entries_since(feed.feed_url, since)
-
-        for condition in url_conditions:
-            # for each condition get the keyword via the corresponding recipe
-            keyword_cond = RecipeCondition.objects.get(
-                    recipe=condition.recipe,
-                    trigger_input=keyword_input)
-            keyword = keyword_cond.value
-            # check for occurence / get the entries
-            filtered_entries = filter_entries_by_keyword(entries,
-                                                         keyword)
+        # get the keyword conditions of all recipes that use this feed.
+        url_hash = value_hash(feed.feed_url)
+        keyword_conditions = RecipeCondition.objects.filter(
+                trigger_input=keyword_input,
+                recipe__recipecondition__trigger_input=url_input,
+                recipe__recipecondition__value_hash=url_hash,
+                recipe__recipecondition__value=feed.feed_url,
+        ).order_by('recipe_id').values_list('value', 'recipe__user_id')
+        keyword_conditions = list(keyword_conditions)
+
+        # match the keywords of all recipes in one pass over the entries
+        matcher = KeywordMatcher(keyword for keyword, _ in keyword_conditions)
+        matching_entries = {keyword: [] for keyword in matcher.keywords}
+        for entry in entries:
+            for keyword in matcher.matches(entry['title'], entry['summary']):
+                matching_entries[keyword].append(entry)
+
+        events = []
+        for keyword, user_id in keyword_conditions:
+            filtered_entries = matching_entries[keyword.lower()]
             # build strings, fill payload, fire trigger
             summaries = build_string_from_entry_list(filtered_entries,
                                                      'summary')
@@ -97,10 +100,12 @@ class RssChannel(Channel):
                 'feed_url': feed.feed_url
             }
 
-            Core().handle_trigger(channel_name=CHANNEL_NAME,
-                                  trigger_type=TRIGGER_TYPE['entries_keyword'],
-                                  userid=condition.recipe.user.id,
-                                  payload=payload)
+            events.append({'channel_name': CHANNEL_NAME,
+                           'trigger_type': TRIGGER_TYPE['entries_keyword'],
+                           'userid': user_id,
+                           'payload': payload})
+
+        Core().handle_triggers(events)
 
 
 
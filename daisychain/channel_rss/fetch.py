@@ -0,0 +1,164 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from threading import BoundedSemaphore, Lock
+from urllib.parse import urlsplit
+import logging
+
+from django.conf import settings
+import feedparser
+import requests
+
+from core.http import HttpClient
+
+log = logging.getLogger("channel")
+http_client = HttpClient("RSS")
+
+
+class FetchStats():
+    """Counts the feed downloads and the bytes saved by conditional GETs,
+    and keeps the duration of the last poll."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.clear()
+
+    def record_cycle(self, seconds):
+        """Record the duration of a poll of all feeds."""
+        with self._lock:
+            self.cycles += 1
+            self.last_cycle_seconds = seconds
+
+    def record(self, not_modified, size):
+        """Record a response, size is the length of the feed in bytes."""
+        with self._lock:
+            self.requests += 1
+            if not_modified:
+                self.not_modified += 1
+                self.bytes_saved += size
+            else:
+                self.bytes_received += size
+
+    def snapshot(self):
+        with self._lock:
+            stats = {'requests': self.requests,
+                     'not_modified': self.not_modified,
+                     'bytes_received': self.bytes_received,
+                     'bytes_saved': self.bytes_saved,
+                     'cycles': self.cycles,
+                     'last_cycle_seconds': self.last_cycle_seconds}
+        stats['not_modified_ratio'] = (stats['not_modified'] /
+                                       stats['requests']
+                                       if stats['requests'] else 0.0)
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self.requests = 0
+            self.not_modified = 0
+            self.bytes_received = 0
+            self.bytes_saved = 0
+            self.cycles = 0
+            self.last_cycle_seconds = 0.0
+
+
+fetch_stats = FetchStats()
+
+
+class HostLimiter():
+    """Limits the number of concurrent requests per host."""
+
+    def __init__(self, per_host):
+        self.per_host = per_host
+        self._lock = Lock()
+        self._semaphores = {}
+
+    @contextmanager
+    def limit(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            semaphore = self._semaphores.setdefault(
+                host, BoundedSemaphore(self.per_host))
+        with semaphore:
+            yield
+
+
+def download_feed(feed):
+    """
+    Downloads an RSS feed with a conditional GET.
+
+    The ETag and Last-Modified validators of the previous response are sent
+    along, and those of a new response are stored in the feed, which is not
+    saved. Safe to call from several threads for different feeds.
+
+    Args:
+        feed: RssFeed object.
+
+    Returns:
+        A tuple of the HTTP status code and the response, which is None
+        unless the status is 200 or 304. The status is None if the feed
+        could not be requested.
+    """
+    headers = {}
+    if feed.etag:
+        headers['If-None-Match'] = feed.etag
+    if feed.http_last_modified:
+        headers['If-Modified-Since'] = feed.http_last_modified
+
+    try:
+        response = http_client.get(feed.feed_url, headers=headers)
+        # read the body on the download thread
+        content = response.content
+    except requests.RequestException:
+        log.warning("could not fetch feed {}".format(feed.feed_url))
+        return None, None
+
+    if response.status_code == 304:
+        log.debug("feed {} not modified".format(feed.feed_url))
+        fetch_stats.record(not_modified=True, size=feed.content_length)
+        return 304, response
+    if response.status_code != 200:
+        return response.status_code, None
+
+    fetch_stats.record(not_modified=False, size=len(content))
+    feed.etag = response.headers.get('ETag', '')
+    feed.http_last_modified = response.headers.get('Last-Modified', '')
+    feed.content_length = len(content)
+    return 200, response
+
+
+def parse_feed(response):
+    """Returns the FeedParser object representing a downloaded feed."""
+    # feedparser looks up the headers in lower case
+    headers = {name.lower(): value for name, value in response.headers.items()}
+    return feedparser.parse(response.content, response_headers=headers)
+
+
+def fetch_feeds(feeds):
+    """
+    Fetches RSS feeds concurrently, see download_feed().
+
+    At most settings.RSS_FETCH_CONCURRENCY feeds are downloaded at once,
+    and settings.RSS_HOST_CONCURRENCY of them from the same host. The feeds
+    are parsed in the calling thread.
+
+    Yields:
+        A tuple of the feed, the HTTP status code, the response headers and
+        the FeedParser object for every feed, in the order the downloads
+        finish. The headers are empty and the FeedParser object is None if
+        there was no response, the FeedParser object also unless the status
+        is 200.
+    """
+    limiter = HostLimiter(getattr(settings, 'RSS_HOST_CONCURRENCY', 2))
+
+    def download(feed):
+        with limiter.limit(feed.feed_url):
+            return download_feed(feed)
+
+    workers = getattr(settings, 'RSS_FETCH_CONCURRENCY', 16)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        downloads = {executor.submit(download, feed): feed for feed in feeds}
+        for future in as_completed(downloads):
+            status, response = future.result()
+            headers = response.headers if response is not None else {}
+            parsed_feed = parse_feed(response) if status == 200 else None
+            yield downloads[future], status, headers, parsed_feed
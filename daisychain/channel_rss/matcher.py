@@ -0,0 +1,59 @@
+from collections import deque
+
+
+class KeywordMatcher():
+    """
+    Finds which of several keywords occur in a text in one pass.
+
+    The keywords are compiled into an Aho-Corasick automaton. Matching is
+    case insensitive, like ``keyword.lower() in text.lower()`` for every
+    keyword.
+    """
+
+    def __init__(self, keywords):
+        # per state: transitions, failure state, keywords ending here
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [set()]
+        self.keywords = set(k.lower() for k in keywords)
+
+        for keyword in self.keywords:
+            state = 0
+            for char in keyword:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(set())
+                state = next_state
+            self._output[state].add(keyword)
+
+        # breadth first, so the failure state of the parent is known
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] |= self._output[
+                    self._fail[next_state]]
+
+    def matches(self, *texts):
+        """Returns the set of keywords occurring in any of the texts."""
+        goto, fail, output = self._goto, self._fail, self._output
+        # the empty keyword occurs in every text
+        found = set(output[0])
+        for text in texts:
+            state = 0
+            for char in text.lower():
+                while state and char not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(char, 0)
+                if output[state]:
+                    found |= output[state]
+        return found
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('channel_rss', '0002_auto_20160912_1408'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rssfeed',
+            name='etag',
+            field=models.CharField(blank=True, default='', max_length=255, verbose_name='ETag'),
+        ),
+        migrations.AddField(
+            model_name='rssfeed',
+            name='http_last_modified',
+            field=models.CharField(blank=True, default='', max_length=64, verbose_name='HTTP Last-Modified'),
+        ),
+        migrations.AddField(
+            model_name='rssfeed',
+            name='content_length',
+            field=models.PositiveIntegerField(default=0, verbose_name='Content Length'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('channel_rss', '0003_rssfeed_validators'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rssfeed',
+            name='next_poll',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Next Poll'),
+        ),
+        migrations.AddField(
+            model_name='rssfeed',
+            name='poll_interval',
+            field=models.PositiveIntegerField(default=600, verbose_name='Poll Interval'),
+        ),
+        migrations.AddField(
+            model_name='rssfeed',
+            name='failures',
+            field=models.PositiveIntegerField(default=0, verbose_name='Failures'),
+        ),
+    ]
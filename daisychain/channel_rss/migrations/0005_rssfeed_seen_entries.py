@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('channel_rss', '0004_rssfeed_schedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rssfeed',
+            name='seen_entries',
+            field=models.TextField(blank=True, default='', verbose_name='Seen Entries'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from hashlib import sha1
+
+from django.db import migrations, models
+
+
+# a copy of channel_rss.models.feed_shard_key at the time of this migration
+def feed_shard_key(feed_url):
+    return int(sha1(feed_url.encode('utf-8')).hexdigest()[:7], 16)
+
+
+def set_shard_keys(apps, schema_editor):
+    RssFeed = apps.get_model('channel_rss', 'RssFeed')
+    for feed in RssFeed.objects.all():
+        RssFeed.objects.filter(pk=feed.pk).update(
+            shard_key=feed_shard_key(feed.feed_url))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('channel_rss', '0005_rssfeed_seen_entries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rssfeed',
+            name='shard_key',
+            field=models.PositiveIntegerField(db_index=True, default=0, verbose_name='Shard Key'),
+        ),
+        migrations.AddField(
+            model_name='rssfeed',
+            name='lease_owner',
+            field=models.CharField(blank=True, default='', max_length=32, verbose_name='Lease Owner'),
+        ),
+        migrations.RunPython(set_shard_keys, migrations.RunPython.noop),
+    ]
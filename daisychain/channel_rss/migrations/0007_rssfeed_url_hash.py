@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from hashlib import sha1
+
+from django.db import migrations, models
+
+
+# a copy of core.models.value_hash at the time of this migration
+def value_hash(value):
+    return sha1(value.encode('utf-8')).hexdigest()
+
+
+def set_url_hashes(apps, schema_editor):
+    RssFeed = apps.get_model('channel_rss', 'RssFeed')
+    for feed in RssFeed.objects.all():
+        RssFeed.objects.filter(pk=feed.pk).update(
+            url_hash=value_hash(feed.feed_url))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('channel_rss', '0006_rssfeed_shard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rssfeed',
+            name='url_hash',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=40, verbose_name='Feed URL Hash'),
+        ),
+        migrations.RunPython(set_url_hashes, migrations.RunPython.noop),
+    ]
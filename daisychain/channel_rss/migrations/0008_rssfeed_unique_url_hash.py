@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-18 18:53
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def delete_duplicate_feeds(apps, schema_editor):
+    RssFeed = apps.get_model('channel_rss', 'RssFeed')
+    kept = set()
+    for feed_id, url_hash in RssFeed.objects.order_by('id') \
+                                            .values_list('id', 'url_hash'):
+        if url_hash in kept:
+            RssFeed.objects.filter(pk=feed_id).delete()
+        else:
+            kept.add(url_hash)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('channel_rss', '0007_rssfeed_url_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_feeds,
+                             migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='rssfeed',
+            name='url_hash',
+            field=models.CharField(default='', editable=False, max_length=40, unique=True, verbose_name='Feed URL Hash'),
+        ),
+    ]
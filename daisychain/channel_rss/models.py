@@ -1,10 +1,58 @@
+from hashlib import sha1
+
 from django.db import models
 from django.utils.translation import ugettext_lazy as _
 
+from core.models import value_hash
+
+
+def feed_shard_key(feed_url):
+    """Returns a stable hash of a feed url, see RssFeed.shard_key."""
+    return int(sha1(feed_url.encode('utf-8')).hexdigest()[:7], 16)
+
 
 class RssFeed(models.Model):
+    """
+    A polled RSS feed.
+
+    'last_modified' is the date of the latest entry, 'etag' and
+    'http_last_modified' the validators of the last response, and
+    'content_length' its size in bytes. The feed is polled next at
+    'next_poll', 'poll_interval' seconds after a successful poll, see
+    channel_rss.schedule. 'failures' counts the failed polls in a row.
+    'seen_entries' holds the keys of the entries seen before, see
+    channel_rss.utils.unseen_entries. The feed is polled by the shard
+    'shard_key' modulo the number of shards, and 'lease_owner' is the
+    poller currently polling it. 'url_hash' is the hash of the url, equal
+    to the value_hash of the RecipeConditions of the feed, and unique, so a
+    url is polled once.
+    """
     feed_url = models.CharField(_('Feed URL'), max_length=2000)
+    url_hash = models.CharField(_('Feed URL Hash'), max_length=40,
+                                unique=True, editable=False, default='')
     last_modified = models.DateTimeField(null=True)
+    etag = models.CharField(_('ETag'), max_length=255, blank=True, default='')
+    http_last_modified = models.CharField(_('HTTP Last-Modified'),
+                                          max_length=64, blank=True,
+                                          default='')
+    content_length = models.PositiveIntegerField(_('Content Length'),
+                                                 default=0)
+    next_poll = models.DateTimeField(_('Next Poll'), null=True, blank=True,
+                                     db_index=True)
+    poll_interval = models.PositiveIntegerField(_('Poll Interval'),
+                                                default=600)
+    failures = models.PositiveIntegerField(_('Failures'), default=0)
+    seen_entries = models.TextField(_('Seen Entries'), blank=True,
+                                    default='')
+    shard_key = models.PositiveIntegerField(_('Shard Key'), default=0,
+                                            db_index=True)
+    lease_owner = models.CharField(_('Lease Owner'), max_length=32,
+                                   blank=True, default='')
+
+    def save(self, *args, **kwargs):
+        self.url_hash = value_hash(self.feed_url)
+        self.shard_key = feed_shard_key(self.feed_url)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return 'RSS feed, url: {}, last_modified: {}'.format(self.feed_url,
@@ -0,0 +1,90 @@
+from calendar import timegm
+from datetime import timedelta
+import logging
+import re
+
+from django.conf import settings
+
+log = logging.getLogger("channel")
+
+MAX_AGE_PATTERN = re.compile(r'max-age=(\d+)')
+
+
+def observed_interval(entries, samples=10):
+    """
+    Estimates how often a feed is updated.
+
+    Args:
+        entries: Entries of the parsed feed.
+        samples: Number of gaps between the latest entries to average.
+
+    Returns:
+        The mean number of seconds between the updates of the latest
+        entries, or None if the feed has less than two dated entries.
+    """
+    dates = sorted(timegm(e['updated_parsed']) for e in entries
+                   if e.get('updated_parsed') is not None)[-samples - 1:]
+    if len(dates) < 2:
+        return None
+    return (dates[-1] - dates[0]) / (len(dates) - 1)
+
+
+def hint_seconds(headers, parsed_feed=None):
+    """
+    Returns the number of seconds the server asks to wait for the next
+    request, from the Cache-Control max-age and the RSS <ttl> element, or 0.
+    """
+    hint = 0
+    match = MAX_AGE_PATTERN.search(headers.get('Cache-Control', ''))
+    if match:
+        hint = int(match.group(1))
+
+    ttl = getattr(parsed_feed, 'feed', {}).get('ttl')
+    if ttl and str(ttl).isdigit():
+        # the ttl is given in minutes
+        hint = max(hint, int(ttl) * 60)
+    return hint
+
+
+def schedule_poll(feed, now, changed, observed=None, hint=0):
+    """
+    Schedules the next poll of a feed after a successful request.
+
+    A feed with new entries is polled twice per observed update interval,
+    a feed without new entries a bit later each time. The interval stays
+    between settings.RSS_MIN_INTERVAL and settings.RSS_MAX_INTERVAL, and is
+    not shorter than the hint of the server. The feed is not saved.
+    """
+    min_interval = getattr(settings, 'RSS_MIN_INTERVAL', 300)
+    max_interval = getattr(settings, 'RSS_MAX_INTERVAL', 86400)
+
+    if not changed:
+        interval = feed.poll_interval * 1.5
+    elif observed is not None:
+        interval = observed / 2
+    else:
+        interval = feed.poll_interval
+    interval = max(min_interval, interval, hint)
+
+    feed.poll_interval = int(min(interval, max_interval))
+    feed.failures = 0
+    feed.next_poll = now + timedelta(seconds=feed.poll_interval)
+
+
+def schedule_retry(feed, now):
+    """
+    Schedules the next poll of a feed after a failed request.
+
+    The delay doubles with each failure, up to settings.RSS_MAX_INTERVAL.
+    After settings.RSS_QUARANTINE_FAILURES failures in a row the feed is
+    quarantined for settings.RSS_QUARANTINE_PERIOD. The feed is not saved.
+    """
+    feed.failures += 1
+    if feed.failures >= getattr(settings, 'RSS_QUARANTINE_FAILURES', 5):
+        delay = getattr(settings, 'RSS_QUARANTINE_PERIOD', 7 * 86400)
+        log.warning("feed {} quarantined after {} failures".format(
+            feed.feed_url, feed.failures))
+    else:
+        delay = min(feed.poll_interval * 2 ** feed.failures,
+                    getattr(settings, 'RSS_MAX_INTERVAL', 86400))
+    feed.next_poll = now + timedelta(seconds=delay)
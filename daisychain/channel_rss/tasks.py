@@ -1,14 +1,21 @@
-import feedparser
 from django.contrib.auth.models import User
 from celery.utils.log import get_task_logger
 from celery import shared_task
 
-from core.models import RecipeCondition
+from core.models import RecipeCondition, value_hash
 from core.core import Core
-from datetime import datetime
+from datetime import datetime, timedelta
+from uuid import uuid4
+import time
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
 from channel_rss.models import RssFeed
-from channel_rss.utils import (unique_feed_urls, get_latest_update,
-                               build_string_from_feed)
+from channel_rss.fetch import fetch_feeds, fetch_stats
+from channel_rss.schedule import (observed_interval, hint_seconds,
+                                  schedule_poll, schedule_retry)
+from channel_rss.utils import (register_feeds, unseen_entries,
+                               entries_since, build_string_from_entry_list)
 from channel_rss.config import CHANNEL_NAME
 from channel_rss.channel import RssChannel
 
@@ -16,75 +23,139 @@ log = get_task_logger(__name__)
 
 
 @shared_task()
-def fetch_rss_feeds():
+def fetch_rss_feeds(shard=0, shards=1):
     """
     Fetch RSS feeds periodically and fire trigger if changes are detected.
+
+    The feeds are partitioned into shards by RssFeed.shard_key, every
+    shard is polled by its own task, see settings.RSS_SHARDS.
     """
-    log.debug('fetch rss feeds!')
-    uniques = unique_feed_urls()
-    # create RssFeed object for every unique feed if it does not exist yet.
-    for feed_url in uniques:
-        try:
-            RssFeed.objects.get(feed_url=feed_url)
-        except RssFeed.DoesNotExist:
-            RssFeed(feed_url=feed_url).save()
-
-    # if a known rss feed has been updated fire triggers.
-    for feed in RssFeed.objects.all():
-        parsed_feed = feedparser.parse(feed.feed_url)
-        # check if feed is available via http status code
-        if parsed_feed.status != 200:
-            continue
-
-        latest_update_struct = get_latest_update(parsed_feed)
-        latest_update = datetime(*latest_update_struct[:6])
-
-        # if the last modified date is not known the feed object has to be
-        # instantiated first. No trigger is fired in this case.
-        if not feed.last_modified:
-            feed.last_modified = latest_update
-            feed.save()
-            continue
-
-        # feed has modification date; update it,
-        # save time of previous update as time_struct for later use.
-        previous_update = feed.last_modified.timetuple()
-        # check if feed has been updated.
-        if previous_update >= latest_update_struct:
-            # there are no new entries. Do not fire any trigger.
-            continue
-
-        print("NEW ENTRIES")
-        feed.last_modified = latest_update
+    log.debug('fetch rss feeds of shard {}/{}!'.format(shard, shards))
+    if shard == 0:
+        # create RssFeed object for every unique feed if it does not exist
+        # yet.
+        register_feeds()
+
+    # poll the feeds that are due, see channel_rss.schedule.
+    # the feeds are downloaded concurrently and handled as they arrive.
+    start = time.monotonic()
+    now = timezone.now()
+    owner = uuid4().hex
+    feeds = lease_due_feeds(shard, shards, now, owner)
+    # renew the lease of the feeds not polled yet well before it expires
+    lease_timeout = getattr(settings, 'RSS_LEASE_TIMEOUT', 600)
+    renew_at = start + lease_timeout / 2
+    for feed, status, headers, parsed_feed in fetch_feeds(feeds):
+        if time.monotonic() > renew_at:
+            renew_lease(owner)
+            renew_at = time.monotonic() + lease_timeout / 2
+        feed.lease_owner = ''
+        # check if feed is available via http status code, the feed is not
+        # modified if the server responds with 304
+        if status == 304:
+            schedule_poll(feed, now, changed=False,
+                          hint=hint_seconds(headers))
+        elif status != 200:
+            schedule_retry(feed, now)
+        else:
+            changed = handle_feed(feed, parsed_feed)
+            schedule_poll(feed, now, changed,
+                          observed=observed_interval(parsed_feed.entries),
+                          hint=hint_seconds(headers, parsed_feed))
         feed.save()
 
-        # parse feeds and fire triggers if necessary.
-        rss_channel = RssChannel()
-        rss_channel.fetch_entries_by_keyword(feed, previous_update)
-
-        # build output strings, build payload.
-        summaries_links = build_string_from_feed(feed.feed_url,
-                                                 'summary',
-                                                 'link',
-                                                 since=previous_update)
-        summaries = build_string_from_feed(feed.feed_url,
-                                           'summary',
-                                           since=previous_update)
-        # payload consisting of trigger outputs and feed url
-        # feed url is used in RssChannel.fill_recipe_mappings
-        payload = {
-            'summaries_and_links': summaries_links,
-            'summaries': summaries,
-            'feed_url': feed.feed_url,
-        }
-
-        # get recipe conditions, corresponding user, and trigger_types
-        # then pass the data to the core and let it handle the trigger
-        conditions = RecipeCondition.objects.filter(value=feed.feed_url)
-        for condition in conditions:
-            user_id = condition.recipe.user.id
-            trigger_type = condition.recipe.trigger.trigger_type
-            Core().handle_trigger(channel_name=CHANNEL_NAME,
-                                  trigger_type=trigger_type,
-                                  userid=user_id,
-                                  payload=payload)
+    seconds = time.monotonic() - start
+    fetch_stats.record_cycle(seconds)
+    log.info('fetched {} rss feeds in {:.1f}s'.format(len(feeds), seconds))
+
+
+def lease_due_feeds(shard, shards, now, owner=None):
+    """
+    Leases the due feeds of a shard.
+
+    The feeds are leased in one update, so overlapping runs, also of shards
+    of a different shard count, never poll the same feed. Feeds that are
+    not polled within settings.RSS_LEASE_TIMEOUT seconds are due again,
+    unless the lease is renewed, see renew_lease().
+
+    Returns:
+        List of the leased feeds.
+    """
+    owner = owner or uuid4().hex
+    lease_timeout = getattr(settings, 'RSS_LEASE_TIMEOUT', 600)
+    RssFeed.objects.annotate(shard=F('shard_key') % shards).filter(
+        Q(next_poll__isnull=True) | Q(next_poll__lte=now),
+        shard=shard,
+    ).update(lease_owner=owner,
+             next_poll=now + timedelta(seconds=lease_timeout))
+    return list(RssFeed.objects.filter(lease_owner=owner))
+
+
+def renew_lease(owner):
+    """Extends the lease of the feeds of an owner that are not polled yet."""
+    lease_timeout = getattr(settings, 'RSS_LEASE_TIMEOUT', 600)
+    return RssFeed.objects.filter(lease_owner=owner).update(
+        next_poll=timezone.now() + timedelta(seconds=lease_timeout))
+
+
+def handle_feed(feed, parsed_feed):
+    """
+    Fire triggers for the new entries of a downloaded feed.
+
+    New entries are those whose keys are not in feed.seen_entries, see
+    unseen_entries(). Feeds polled before the keys were stored fall back
+    to the dates of the entries once.
+
+    Returns:
+        True if the feed has new entries. The feed is not saved.
+    """
+    previous_update = feed.last_modified
+    dates = [e['updated_parsed'] for e in parsed_feed.entries
+             if e.get('updated_parsed') is not None]
+    if dates:
+        feed.last_modified = datetime(*max(dates)[:6])
+
+    max_seen = getattr(settings, 'RSS_SEEN_ENTRIES', 1000)
+    had_seen_entries = bool(feed.seen_entries)
+    entries, feed.seen_entries = unseen_entries(parsed_feed.entries,
+                                                feed.seen_entries,
+                                                max_seen)
+    if not had_seen_entries:
+        if previous_update is None:
+            # a new feed. No trigger is fired in this case.
+            return True
+        entries = entries_since(parsed_feed, previous_update.timetuple())
+
+    if not entries:
+        # there are no new entries. Do not fire any trigger.
+        return False
+
+    # fire keyword triggers if necessary.
+    rss_channel = RssChannel()
+    rss_channel.fetch_entries_by_keyword(feed, entries)
+
+    # build output strings, build payload.
+    summaries_links = build_string_from_entry_list(entries,
+                                                   'summary',
+                                                   'link')
+    summaries = build_string_from_entry_list(entries, 'summary')
+    # payload consisting of trigger outputs and feed url
+    # feed url is used in RssChannel.fill_recipe_mappings
+    payload = {
+        'summaries_and_links': summaries_links,
+        'summaries': summaries,
+        'feed_url': feed.feed_url,
+    }
+
+    # get trigger_types and users of the recipe conditions in one query,
+    # then pass the data to the core and let it handle the trigger
+    conditions = RecipeCondition.objects.filter(
+        value_hash=value_hash(feed.feed_url),
+        value=feed.feed_url,
+    ).values_list('recipe__trigger__trigger_type', 'recipe__user_id')
+    Core().handle_triggers([
+        {'channel_name': CHANNEL_NAME,
+         'trigger_type': trigger_type,
+         'userid': user_id,
+         'payload': payload} for trigger_type, user_id in conditions])
+    return True
@@ -167,9 +167,9 @@ class ChannelFeaturesTest(BaseTest):
                                      self.keyword_input,
                                      'teapot')
 
-    @patch('core.core.Core.handle_trigger')
+    @patch('core.core.Core.handle_triggers')
     def test_fetch_entries_by_keyword(self,
-                                      mock_handle_trigger):
+                                      mock_handle_triggers):
         entries = [
             {
                 'summary': 'this is the summary of a very interesting entry',
@@ -195,15 +195,36 @@ class ChannelFeaturesTest(BaseTest):
             'keyword': 'interesting',
             'feed_url': self.feeds[0],
         }
-        # mock_entries_since.return_value = entries
         feed_one = RssFeed(feed_url=self.feeds[0])
-        with patch('channel_rss.channel.entries_since') as mock_entries_since:
-            mock_entries_since.return_value = entries
-            RssChannel().fetch_entries_by_keyword(feed_one, None)
-            mock_handle_trigger.assert_called_once_with(
-                channel_name=CHANNEL_NAME,
-                trigger_type=TRIGGER_TYPE['entries_keyword'],
-                userid=self.user.id,
-                payload=expected_payload
-            )
+        RssChannel().fetch_entries_by_keyword(feed_one, entries)
+        mock_handle_triggers.assert_called_once_with([{
+            'channel_name': CHANNEL_NAME,
+            'trigger_type': TRIGGER_TYPE['entries_keyword'],
+            'userid': self.user.id,
+            'payload': expected_payload
+        }])
+
+    @patch('core.core.Core.handle_triggers')
+    def test_fetch_entries_by_several_keywords(self, mock_handle_triggers):
+        # a third recipe on the first feed
+        recipe3 = self.create_recipe(self.trigger, self.action, self.user)
+        self.create_recipe_condition(recipe3, self.url_input, self.feeds[0])
+        self.create_recipe_condition(recipe3, self.keyword_input, 'Boring')
+        entries = [
+            {'summary': 'an interesting entry', 'title': 'first',
+             'link': 'example.com/first'},
+            {'summary': 'a boring entry', 'title': 'INTERESTING',
+             'link': 'example.com/second'},
+        ]
 
+        feed_one = RssFeed(feed_url=self.feeds[0])
+        with self.assertNumQueries(3):
+            RssChannel().fetch_entries_by_keyword(feed_one, entries)
+
+        events = mock_handle_triggers.call_args[0][0]
+        self.assertEqual([e['payload']['keyword'] for e in events],
+                         ['interesting', 'Boring'])
+        self.assertEqual(events[0]['payload']['summaries'],
+                         build_string_from_entry_list(entries, 'summary'))
+        self.assertEqual(events[1]['payload']['summaries'],
+                         build_string_from_entry_list(entries[1:], 'summary'))
@@ -0,0 +1,64 @@
+from threading import Lock
+from urllib.parse import urlsplit
+import time
+
+from django.test import SimpleTestCase, override_settings
+from mock import patch
+
+from channel_rss.fetch import fetch_feeds, fetch_stats
+from channel_rss.models import RssFeed
+
+
+class FetchTest(SimpleTestCase):
+
+    class MockResponse:
+        def __init__(self, status_code, content=b'', headers=None):
+            self.status_code = status_code
+            self.content = content
+            self.headers = headers or {}
+
+    def setUp(self):
+        fetch_stats.clear()
+        self.lock = Lock()
+        self.running = {}
+        self.max_running = {}
+
+    def get(self, url, headers):
+        host = urlsplit(url).netloc
+        with self.lock:
+            self.running[host] = self.running.get(host, 0) + 1
+            self.max_running[host] = max(self.max_running.get(host, 0),
+                                         self.running[host])
+            total = sum(self.running.values())
+            self.max_running['total'] = max(self.max_running.get('total', 0),
+                                            total)
+        time.sleep(0.05)
+        with self.lock:
+            self.running[host] -= 1
+        if 'missing' in url:
+            return self.MockResponse(404)
+        return self.MockResponse(200, b'<rss><channel></channel></rss>')
+
+    @override_settings(RSS_FETCH_CONCURRENCY=4, RSS_HOST_CONCURRENCY=2)
+    def test_concurrency_limits(self):
+        feeds = [RssFeed(feed_url='http://{}.org/{}'.format(host, i))
+                 for host in ('a', 'b', 'c') for i in range(4)]
+        feeds.append(RssFeed(feed_url='http://c.org/missing'))
+
+        with patch('core.http.HttpClient.get', side_effect=self.get):
+            results = list(fetch_feeds(feeds))
+
+        self.assertEqual(len(results), 13)
+        self.assertEqual(sorted(feed.feed_url for feed, _, _, _ in results),
+                         sorted(feed.feed_url for feed in feeds))
+        for feed, status, headers, parsed_feed in results:
+            if feed.feed_url.endswith('missing'):
+                self.assertEqual(status, 404)
+                self.assertIsNone(parsed_feed)
+            else:
+                self.assertEqual(status, 200)
+                self.assertEqual(parsed_feed.entries, [])
+        self.assertEqual(self.max_running['total'], 4)
+        for host in ('a.org', 'b.org', 'c.org'):
+            self.assertLessEqual(self.max_running[host], 2)
+        self.assertEqual(fetch_stats.snapshot()['requests'], 12)
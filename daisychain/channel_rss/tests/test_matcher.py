@@ -0,0 +1,36 @@
+import random
+
+from django.test import SimpleTestCase
+
+from channel_rss.matcher import KeywordMatcher
+
+
+class KeywordMatcherTest(SimpleTestCase):
+
+    def test_overlapping_keywords(self):
+        matcher = KeywordMatcher(['tea', 'teapot', 'pot', 'apo'])
+        self.assertEqual(matcher.matches('a Teapot'),
+                         {'tea', 'teapot', 'pot', 'apo'})
+        self.assertEqual(matcher.matches('teaspoon'), {'tea'})
+        self.assertEqual(matcher.matches('coffee'), set())
+
+    def test_several_texts(self):
+        matcher = KeywordMatcher(['Django', 'python'])
+        self.assertEqual(matcher.matches('django 1.9', 'Python 3'),
+                         {'django', 'python'})
+
+    def test_empty_keyword(self):
+        matcher = KeywordMatcher(['', 'foo'])
+        self.assertEqual(matcher.matches('bar'), {''})
+
+    def test_same_as_substring_search(self):
+        rand = random.Random(42)
+        keywords = [''.join(rand.choice('abC')
+                            for _ in range(rand.randint(1, 4)))
+                    for _ in range(20)]
+        matcher = KeywordMatcher(keywords)
+        for _ in range(200):
+            text = ''.join(rand.choice('aBc ') for _ in range(30))
+            expected = set(k.lower() for k in keywords
+                           if k.lower() in text.lower())
+            self.assertEqual(matcher.matches(text), expected)
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+
+from django.test import SimpleTestCase, override_settings
+
+from channel_rss.models import RssFeed
+from channel_rss.schedule import (observed_interval, hint_seconds,
+                                  schedule_poll, schedule_retry)
+
+
+@override_settings(RSS_MIN_INTERVAL=300, RSS_MAX_INTERVAL=86400,
+                   RSS_QUARANTINE_FAILURES=3, RSS_QUARANTINE_PERIOD=604800)
+class ScheduleTest(SimpleTestCase):
+
+    def setUp(self):
+        self.now = datetime(2016, 10, 1, 12, 0)
+        self.feed = RssFeed(feed_url='http://example.com/rss')
+
+    def entries(self, hours):
+        return [{'updated_parsed': (self.now - timedelta(hours=h)).timetuple()}
+                for h in hours]
+
+    def test_observed_interval(self):
+        self.assertEqual(observed_interval(self.entries([0, 2, 4, 6])), 7200)
+        self.assertEqual(observed_interval(self.entries([0, 1, 9]),
+                                           samples=1), 3600)
+        self.assertIsNone(observed_interval(self.entries([0])))
+
+    def test_hint_seconds(self):
+        class ParsedFeed:
+            feed = {'ttl': '60'}
+        headers = {'Cache-Control': 'public, max-age=900'}
+        self.assertEqual(hint_seconds(headers), 900)
+        self.assertEqual(hint_seconds({}, ParsedFeed()), 3600)
+        self.assertEqual(hint_seconds({}), 0)
+
+    def test_busy_feed(self):
+        schedule_poll(self.feed, self.now, changed=True, observed=1200)
+        self.assertEqual(self.feed.poll_interval, 600)
+        schedule_poll(self.feed, self.now, changed=True, observed=60)
+        self.assertEqual(self.feed.poll_interval, 300)
+        self.assertEqual(self.feed.next_poll, self.now + timedelta(minutes=5))
+
+    def test_quiet_feed_backs_off(self):
+        for _ in range(30):
+            schedule_poll(self.feed, self.now, changed=False)
+        self.assertEqual(self.feed.poll_interval, 86400)
+
+    def test_hint_is_honored(self):
+        schedule_poll(self.feed, self.now, changed=True, observed=60,
+                      hint=3600)
+        self.assertEqual(self.feed.poll_interval, 3600)
+
+    def test_failures(self):
+        schedule_retry(self.feed, self.now)
+        self.assertEqual(self.feed.next_poll, self.now + timedelta(minutes=20))
+        schedule_retry(self.feed, self.now)
+        self.assertEqual(self.feed.next_poll, self.now + timedelta(minutes=40))
+        # quarantined
+        schedule_retry(self.feed, self.now)
+        self.assertEqual(self.feed.next_poll, self.now + timedelta(days=7))
+        # a successful poll resets the failures
+        schedule_poll(self.feed, self.now, changed=False)
+        self.assertEqual(self.feed.failures, 0)
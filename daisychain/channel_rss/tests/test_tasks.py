@@ -1,11 +1,16 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib.auth.models import User
 
 from mock import patch, mock
 from datetime import datetime, timedelta
+from django.utils import timezone
 
-from channel_rss.tasks import fetch_rss_feeds
+from channel_rss.tasks import (fetch_rss_feeds, lease_due_feeds, renew_lease,
+                               handle_feed)
+from channel_rss.utils import register_feeds
+from core.models import value_hash
 from channel_rss.models import RssFeed
+from channel_rss.fetch import fetch_stats
 from channel_rss.config import CHANNEL_NAME
 from channel_rss.tests.test_base import BaseTest
 
@@ -14,6 +19,17 @@ class TaskTest(BaseTest):
 
     def setUp(self):
         super().setUp()
+        fetch_stats.clear()
+        patcher = patch('core.http.HttpClient.get')
+        self.mock_get = patcher.start()
+        self.mock_get.return_value = self.MockResponse(200, b'<rss/>')
+        self.addCleanup(patcher.stop)
+
+    class MockResponse:
+        def __init__(self, status_code, content=b'', headers=None):
+            self.status_code = status_code
+            self.content = content
+            self.headers = headers or {}
 
     class MockFeedParserDict:
         def __init__(self, entries, status):
@@ -21,11 +37,11 @@ class TaskTest(BaseTest):
             self.status = status
 
     @patch('feedparser.parse')
-    @patch('core.core.Core.handle_trigger')
+    @patch('core.core.Core.handle_triggers')
     @patch('channel_rss.channel.RssChannel.fetch_entries_by_keyword')
     def test_with_one_feed_known_one_unknown(self,
                                              mock_fetch_keyword,
-                                             mock_handle_trigger,
+                                             mock_handle_triggers,
                                              mock_parse):
         # one feed is already known
         last_update = datetime.now()
@@ -51,34 +67,35 @@ class TaskTest(BaseTest):
             'feed_url': self.feeds[1]
         }
         # assertions
-        mock_handle_trigger.assert_called_once_with(channel_name=CHANNEL_NAME,
-                                                    userid=self.user.id,
-                                                    trigger_type=200,
-                                                    payload=expected_payload)
+        mock_handle_triggers.assert_called_once_with([{
+            'channel_name': CHANNEL_NAME,
+            'userid': self.user.id,
+            'trigger_type': 200,
+            'payload': expected_payload}])
         self.assertIsNotNone(RssFeed.objects.get(feed_url=self.feeds[0]))
         self.assertIsNotNone(RssFeed.objects.get(feed_url=self.feeds[1]))
 
     @patch('feedparser.parse')
     @patch('channel_rss.utils.build_string_from_feed')
     @patch('channel_rss.utils.get_latest_update')
-    @patch('core.core.Core.handle_trigger')
+    @patch('core.core.Core.handle_triggers')
     def test_fetch_rss_feeds_feed_unavailable(self,
-                                              mock_handle_trigger,
+                                              mock_handle_triggers,
                                               mock_get_latest_update,
                                               mock_build_string_from_entries,
                                               mock_parse):
-        mock_parse.return_value = self.MockFeedParserDict([], 404)
+        self.mock_get.return_value = self.MockResponse(404)
         fetch_rss_feeds.apply().get()
         mock_get_latest_update.assert_not_called()
         mock_build_string_from_entries.assert_not_called()
-        mock_handle_trigger.assert_not_called()
+        mock_handle_triggers.assert_not_called()
 
     @patch('feedparser.parse')
     @patch('channel_rss.utils.build_string_from_feed')
     @patch('channel_rss.utils.get_latest_update')
-    @patch('core.core.Core.handle_trigger')
+    @patch('core.core.Core.handle_triggers')
     def test_fetch_rss_feed_no_new_entries(self,
-                                           mock_handle_trigger,
+                                           mock_handle_triggers,
                                            mock_get_latest_update,
                                            mock_build_string_from_entries,
                                            mock_parse):
@@ -100,4 +117,221 @@ class TaskTest(BaseTest):
         # no trigger should be fired
         mock_get_latest_update.assert_not_called()
         mock_build_string_from_entries.assert_not_called()
-        mock_handle_trigger.assert_not_called()
+        mock_handle_triggers.assert_not_called()
+
+    @patch('feedparser.parse')
+    @patch('core.core.Core.handle_triggers')
+    def test_conditional_get(self, mock_handle_triggers, mock_parse):
+        RssFeed(feed_url=self.feeds[1], last_modified=datetime.now()).save()
+        self.mock_get.return_value = self.MockResponse(
+            200, b'<rss>' + b' ' * 95 + b'</rss>',
+            {'ETag': '"abc"',
+             'Last-Modified': 'Wed, 12 Oct 2016 10:00:00 GMT'})
+        entries = [{'updated_parsed': datetime(2016, 1, 1).timetuple()}]
+        mock_parse.return_value = self.MockFeedParserDict(entries, 200)
+        fetch_rss_feeds.apply().get()
+
+        feed = RssFeed.objects.get(feed_url=self.feeds[1])
+        self.assertEqual(feed.etag, '"abc"')
+        self.assertEqual(feed.content_length, 106)
+
+        # the feed is not parsed again if it was not modified
+        mock_parse.reset_mock()
+        RssFeed.objects.update(next_poll=None)
+        self.mock_get.return_value = self.MockResponse(304)
+        fetch_rss_feeds.apply().get()
+
+        self.mock_get.assert_any_call(self.feeds[1], headers={
+            'If-None-Match': '"abc"',
+            'If-Modified-Since': 'Wed, 12 Oct 2016 10:00:00 GMT'})
+        mock_parse.assert_not_called()
+        mock_handle_triggers.assert_not_called()
+        stats = fetch_stats.snapshot()
+        self.assertEqual(stats['not_modified'], 2)
+        self.assertEqual(stats['not_modified_ratio'], 0.5)
+        self.assertEqual(stats['bytes_saved'], 2 * 106)
+        self.assertEqual(stats['cycles'], 2)
+
+    @patch('feedparser.parse')
+    @patch('core.core.Core.handle_triggers')
+    @patch('channel_rss.channel.RssChannel.fetch_entries_by_keyword')
+    def test_feed_parsed_once(self, mock_fetch_keyword, mock_handle_triggers,
+                              mock_parse):
+        last_update = datetime.now()
+        RssFeed(feed_url=self.feeds[1], last_modified=last_update).save()
+        new_update = (last_update + timedelta(1, 1)).timetuple()
+        entries = [{'updated_parsed': last_update.timetuple(),
+                    'summary': 'OLD_SUMMARY', 'link': 'OLD_LINK'},
+                   {'updated_parsed': new_update, 'summary': 'TEST_SUMMARY',
+                    'link': 'TEST_LINK'}]
+        mock_parse.return_value = self.MockFeedParserDict(entries, 200)
+
+        fetch_rss_feeds.apply().get()
+
+        # one download and parse per feed
+        self.assertEqual(self.mock_get.call_count, 2)
+        self.assertEqual(mock_parse.call_count, 2)
+        mock_fetch_keyword.assert_called_once_with(
+            RssFeed.objects.get(feed_url=self.feeds[1]), [entries[1]])
+
+    @patch('feedparser.parse')
+    @patch('core.core.Core.handle_triggers')
+    def test_only_due_feeds_are_polled(self, mock_handle_triggers,
+                                       mock_parse):
+        now = timezone.now()
+        RssFeed(feed_url=self.feeds[0], last_modified=datetime.now(),
+                next_poll=now + timedelta(hours=1)).save()
+        RssFeed(feed_url=self.feeds[1], last_modified=datetime.now(),
+                next_poll=now - timedelta(minutes=1)).save()
+        self.mock_get.return_value = self.MockResponse(500)
+
+        fetch_rss_feeds.apply().get()
+
+        self.mock_get.assert_called_once_with(self.feeds[1], headers={})
+        feed = RssFeed.objects.get(feed_url=self.feeds[1])
+        self.assertEqual(feed.failures, 1)
+        # failed feeds are retried later
+        self.assertGreater(feed.next_poll, now + timedelta(minutes=19))
+
+    @patch('feedparser.parse')
+    @patch('core.core.Core.handle_triggers')
+    @patch('channel_rss.channel.RssChannel.fetch_entries_by_keyword')
+    def test_new_entries_by_guid(self, mock_fetch_keyword,
+                                 mock_handle_triggers, mock_parse):
+        now = datetime.now()
+        entries = [{'id': 'a', 'updated_parsed': now.timetuple(),
+                    'summary': 'A', 'link': 'LINK_A'}]
+        mock_parse.return_value = self.MockFeedParserDict(entries, 200)
+        # the first poll of the feeds stores the seen entries
+        fetch_rss_feeds.apply().get()
+        mock_handle_triggers.assert_not_called()
+
+        # an undated entry and a backdated one
+        entries += [{'id': 'b', 'summary': 'B', 'link': 'LINK_B'},
+                    {'id': 'c', 'summary': 'C', 'link': 'LINK_C',
+                     'updated_parsed': (now - timedelta(1)).timetuple()}]
+        RssFeed.objects.update(next_poll=None)
+        fetch_rss_feeds.apply().get()
+
+        payload = mock_handle_triggers.call_args[0][0][0]['payload']
+        self.assertEqual(payload['summaries'], 'B\n\nC\n\n')
+        # both feeds have the new entries
+        self.assertEqual(mock_fetch_keyword.call_count, 2)
+        for args, kwargs in mock_fetch_keyword.call_args_list:
+            self.assertEqual(args[1], entries[1:])
+
+        # nothing new
+        mock_handle_triggers.reset_mock()
+        RssFeed.objects.update(next_poll=None)
+        fetch_rss_feeds.apply().get()
+        mock_handle_triggers.assert_not_called()
+
+
+class ShardTest(BaseTest):
+
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now()
+        for i in range(20):
+            RssFeed(feed_url='http://example.com/{}/rss'.format(i)).save()
+
+    def test_shards_partition_feeds(self):
+        for shards in (4, 3):
+            RssFeed.objects.update(next_poll=None, lease_owner='')
+            leased = [set(f.feed_url for f in
+                          lease_due_feeds(shard, shards, self.now))
+                      for shard in range(shards)]
+            self.assertEqual(sum(len(urls) for urls in leased), 20)
+            self.assertEqual(set.union(*leased),
+                             set(RssFeed.objects.values_list('feed_url',
+                                                             flat=True)))
+
+    def test_overlapping_runs(self):
+        self.assertEqual(len(lease_due_feeds(0, 1, self.now)), 20)
+        self.assertEqual(lease_due_feeds(0, 1, self.now), [])
+        # nor do shards of another shard count
+        self.assertEqual(lease_due_feeds(1, 2, self.now), [])
+        # leases expire
+        later = self.now + timedelta(hours=1)
+        self.assertEqual(len(lease_due_feeds(0, 1, later)), 20)
+
+    def test_renew_lease(self):
+        owner = 'owner'
+        lease_due_feeds(0, 1, self.now, owner)
+        RssFeed.objects.filter(feed_url='http://example.com/0/rss').update(
+            lease_owner='')
+        later = self.now + timedelta(seconds=590)
+
+        with patch('channel_rss.tasks.timezone.now', return_value=later):
+            self.assertEqual(renew_lease(owner), 19)
+        # only the polled feed is due when the first lease expires
+        due = lease_due_feeds(0, 1, later + timedelta(seconds=20))
+        self.assertEqual([f.feed_url for f in due],
+                         ['http://example.com/0/rss'])
+
+    @override_settings(RSS_LEASE_TIMEOUT=0)
+    @patch('channel_rss.tasks.renew_lease')
+    @patch('core.http.HttpClient.get')
+    def test_task_renews_lease(self, mock_get, mock_renew):
+        mock_get.return_value = TaskTest.MockResponse(500)
+
+        fetch_rss_feeds.apply(args=(0, 1)).get()
+        self.assertEqual(mock_renew.call_count, RssFeed.objects.count())
+
+    @patch('core.http.HttpClient.get')
+    def test_task_polls_its_shard(self, mock_get):
+        mock_get.return_value = TaskTest.MockResponse(500)
+        shard_feeds = [f.feed_url for f in RssFeed.objects.all()
+                       if f.shard_key % 2 == 1]
+
+        fetch_rss_feeds.apply(args=(1, 2)).get()
+
+        self.assertEqual(sorted(c[0][0] for c in mock_get.call_args_list),
+                         sorted(shard_feeds))
+        self.assertFalse(RssFeed.objects.exclude(lease_owner='').exists())
+
+
+class RegisterFeedsTest(BaseTest):
+
+    def test_register_feeds(self):
+        RssFeed(feed_url=self.feeds[0]).save()
+        # the urls and the insert, in a savepoint
+        with self.assertNumQueries(4):
+            self.assertEqual(register_feeds(), 1)
+        feed = RssFeed.objects.get(feed_url=self.feeds[1])
+        self.assertEqual(feed.url_hash, value_hash(self.feeds[1]))
+        self.assertEqual(feed.url_hash, self.recipe2.recipecondition_set
+                         .get().value_hash)
+        self.assertNotEqual(feed.shard_key, 0)
+
+        self.assertEqual(register_feeds(), 0)
+        self.assertEqual(RssFeed.objects.count(), 2)
+
+    def test_register_feeds_concurrently(self):
+        RssFeed(feed_url=self.feeds[0]).save()
+
+        # registered by another process after the new urls were looked up
+        with patch('channel_rss.models.RssFeed.objects.values',
+                   return_value=RssFeed.objects.none().values('url_hash')):
+            self.assertEqual(register_feeds(), 1)
+        self.assertEqual(sorted(RssFeed.objects.values_list('feed_url',
+                                                            flat=True)),
+                         sorted(self.feeds[:2]))
+
+    @patch('core.core.Core.handle_triggers')
+    @patch('channel_rss.channel.RssChannel.fetch_entries_by_keyword')
+    def test_dispatch_in_one_query(self, mock_fetch_keyword,
+                                   mock_handle_triggers):
+        feed = RssFeed(feed_url=self.feeds[0], seen_entries='0123456789abcdef')
+        entries = [{'id': 'a', 'summary': 'A', 'link': 'LINK_A'}]
+
+        with self.assertNumQueries(1):
+            handle_feed(feed, TaskTest.MockFeedParserDict(entries, 200))
+
+        mock_handle_triggers.assert_called_once_with([{
+            'channel_name': CHANNEL_NAME,
+            'trigger_type': 200,
+            'userid': self.user.id,
+            'payload': {'summaries': 'A\n\n',
+                        'summaries_and_links': 'A\nLINK_A\n\n',
+                        'feed_url': self.feeds[0]}}])
@@ -0,0 +1,53 @@
+from django.test import SimpleTestCase
+
+from channel_rss.utils import entry_key, unseen_entries
+
+
+class UnseenEntriesTest(SimpleTestCase):
+
+    def entries(self, *ids):
+        return [{'id': 'guid-{}'.format(i), 'title': 'title', 'summary': ''}
+                for i in ids]
+
+    def test_entry_key(self):
+        self.assertEqual(entry_key({'id': 'a', 'link': 'b'}),
+                         entry_key({'id': 'a', 'link': 'c'}))
+        self.assertEqual(entry_key({'link': 'b', 'title': 't'}),
+                         entry_key({'link': 'b', 'title': 'u'}))
+        self.assertNotEqual(entry_key({'title': 't', 'summary': 's'}),
+                            entry_key({'title': 't', 'summary': 'u'}))
+        self.assertEqual(len(entry_key({'id': 'a'})), 16)
+
+    def test_new_entries(self):
+        entries = self.entries(1, 2, 3)
+        new, seen = unseen_entries(entries, '', 10)
+        self.assertEqual(new, entries)
+
+        # an undated or backdated entry is new as well
+        entries = self.entries(4, 1, 2, 0)
+        new, seen = unseen_entries(entries, seen, 10)
+        self.assertEqual(new, [entries[0], entries[3]])
+        self.assertEqual(seen.split()[:4], [entry_key(e) for e in entries])
+        self.assertEqual(len(seen.split()), 5)
+
+        new, seen = unseen_entries(entries, seen, 10)
+        self.assertEqual(new, [])
+
+    def test_retention(self):
+        new, seen = unseen_entries(self.entries(*range(3)), '', 3)
+        new, seen = unseen_entries(self.entries(5), seen, 3)
+        self.assertEqual(seen.split(),
+                         [entry_key(e) for e in self.entries(5, 0, 1)])
+
+    def test_more_entries_than_retained(self):
+        entries = self.entries(*range(12))
+        new, seen = unseen_entries(entries, '', 10)
+        self.assertEqual(len(seen.split()), 12)
+
+        new, seen = unseen_entries(entries, seen, 10)
+        self.assertEqual(new, [])
+
+        # only keys of earlier entries are dropped
+        new, seen = unseen_entries(self.entries(12), seen, 10)
+        self.assertEqual(seen.split(),
+                         [entry_key(e) for e in self.entries(12, *range(9))])
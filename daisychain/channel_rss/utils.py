@@ -1,6 +1,11 @@
+from collections import OrderedDict
+from hashlib import sha1
+
+from django.db import IntegrityError, transaction
 import feedparser
 
-from core.models import RecipeCondition
+from core.models import RecipeCondition, value_hash
+from channel_rss.models import RssFeed, feed_shard_key
 
 
 def feed_updated(feed, last_updated):
@@ -50,6 +55,44 @@ def entries_since(feed, date):
     return [e for e in entries if e['updated_parsed'] > date]
 
 
+def entry_key(entry):
+    """
+    Identifies an entry by a short hash of its id (the guid of RSS), its
+    link or, if it has neither, its title and summary.
+    """
+    key = (entry.get('id') or entry.get('link') or
+           '{}\n{}'.format(entry.get('title', ''), entry.get('summary', '')))
+    return sha1(key.encode('utf-8')).hexdigest()[:16]
+
+
+def unseen_entries(entries, seen, max_seen):
+    """
+    Retrieves the entries of a feed that have not been seen before.
+
+    Args:
+        entries: Entries of the parsed feed.
+        seen: Keys of the entries seen before, separated by spaces, see
+            entry_key().
+        max_seen: Maximal number of keys to remember.
+
+    Returns:
+        A tuple of the list of new entries and the keys to remember, which
+        are the keys of the current entries followed by the most recently
+        seen keys of earlier entries. The keys of the current entries are
+        always kept, even more than max_seen of them, otherwise they would
+        be new again on the next poll.
+    """
+    seen = seen.split()
+    seen_set = set(seen)
+    keys = [entry_key(e) for e in entries]
+    new = [e for e, key in zip(entries, keys) if key not in seen_set]
+
+    current = set(keys)
+    remembered = (list(OrderedDict.fromkeys(keys)) +
+                  [key for key in seen if key not in current])
+    return new, ' '.join(remembered[:max(max_seen, len(current))])
+
+
 def build_string_from_feed(feed, *args, since=None, keyword=None):
     """
     Retrieves fields for every entry in the feed.
@@ -118,7 +161,48 @@ def unique_feed_urls():
         trigger_input__trigger__channel__name='RSS',
         trigger_input__name='feed_url',
     )
-    return set(e.value for e in recipe_conditions)
+    return set(recipe_conditions.values_list('value', flat=True).distinct())
+
+
+def register_feeds():
+    """
+    Creates an RssFeed for every feed url of a RecipeCondition that has
+    none yet, in one query to find the urls and one to create the feeds.
+    If another process registered some of the feeds in the meantime, the
+    feeds are created one by one, skipping the existing ones.
+
+    Returns:
+        Number of created feeds.
+    """
+    new_urls = RecipeCondition.objects.filter(
+        trigger_input__trigger__channel__name='RSS',
+        trigger_input__name='feed_url',
+    ).exclude(
+        value_hash__in=RssFeed.objects.values('url_hash'),
+    ).values_list('value', flat=True).distinct()
+    new_urls = set(new_urls)
+
+    # bulk_create() does not call save(), which sets the hashes
+    feeds = [RssFeed(feed_url=url,
+                     url_hash=value_hash(url),
+                     shard_key=feed_shard_key(url)) for url in new_urls]
+    try:
+        with transaction.atomic():
+            RssFeed.objects.bulk_create(feeds)
+        return len(feeds)
+    except IntegrityError:
+        pass
+
+    created = 0
+    for url in new_urls:
+        try:
+            with transaction.atomic():
+                RssFeed.objects.create(feed_url=url)
+            created += 1
+        except IntegrityError:
+            # registered by another process
+            pass
+    return created
 
 
 def _parse_feed_if_necessary(feed):
@@ -3,6 +3,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings_production')
 
 from django.conf import settings
 from celery import Celery
+from celery.signals import worker_init
 
 app = Celery(app='daisychain',
              backend='amqp')
@@ -14,6 +15,14 @@ app.config_from_object('django.conf:settings')
 app.autodiscover_tasks(lambda: settings.INSTALLED_APPS)
 
 
+@worker_init.connect
+def preload_channels(**kwargs):
+    """Import all channels before the pool processes are forked, so the
+    first trigger does not pay for importing the channel SDKs."""
+    from core.registry import channel_registry
+    channel_registry.load()
+
+
 @app.task(bind=True)
 def debug_task(self):
     print("Request: {0!r}".format(self.request))
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/1.9/ref/settings/
 """
 
 import os
+import tempfile
 import django
 from datetime import timedelta
 from celery.schedules import crontab
@@ -173,18 +174,105 @@ CELERY_TRACK_STARTED = True
 CELERY_ENABLE_UTC = True
 CELERY_TIMEZONE = 'Europe/London'
 
+# maximum number of triggers put into one message, see
+# core.core.Core.handle_triggers
+TRIGGER_BATCH_SIZE = 100
+
+# RSS feeds are polled by this many tasks, each polling the due feeds of
+# its shard, see channel_rss.tasks.fetch_rss_feeds
+RSS_SHARDS = 4
+
+# several beats may run, of which the one holding the lease in the
+# database sends the periodic tasks, see core.beat
+CELERYBEAT_SCHEDULER = 'core.beat.LeaderScheduler'
+# seconds until a standby beat takes over from a stopped one
+BEAT_LEASE_TIMEOUT = 30
+# missed Clock minutes fired late, e.g. after a beat failover, see
+# channel_clock.tasks.beat
+CLOCK_CATCH_UP = 300  # seconds
+
 CELERYBEAT_SCHEDULE = {
-    'fetch_rss_feeds': {
-        'task': 'channel_rss.tasks.fetch_rss_feeds',
-        'schedule': timedelta(minutes=10),
-    },
     'clock_channel': {
         'task': 'channel_clock.tasks.beat',
         'schedule': crontab()
     }
 }
+for shard in range(RSS_SHARDS):
+    # polls the feeds that are due, see RSS_MIN_INTERVAL
+    CELERYBEAT_SCHEDULE['fetch_rss_feeds_{}'.format(shard)] = {
+        'task': 'channel_rss.tasks.fetch_rss_feeds',
+        'schedule': timedelta(minutes=1),
+        'args': (shard, RSS_SHARDS),
+    }
 # #######################
 
+# ######## Recipe index ########
+# in-process index of recipes per (channel, trigger type, user), checked
+# against the RecipeVersion of the user, see core.routing
+RECIPE_INDEX_MAX_ENTRIES = 4096
+RECIPE_INDEX_TTL = 300  # seconds
+# ################################
+
+# ######## HTTP client ########
+# shared by all channels, see core.http
+HTTP_POOL_HOSTS = 20  # number of hosts with a connection pool
+HTTP_POOL_SIZE = 10  # connections per host
+HTTP_MAX_RETRIES = 3  # idempotent requests only
+HTTP_BACKOFF_FACTOR = 0.5
+# (connect, read) timeouts in seconds per channel
+HTTP_TIMEOUTS = {
+    'default': (3.05, 30),
+    'facebook': (3.05, 120),  # photo and video uploads
+    'hue': (2, 10),
+    'media': (3.05, 60),
+    'rss': (3.05, 20),
+}
+# #############################
+
+# ######## Media cache ########
+# worker-local cache of media downloaded for recipes, see core.media
+MEDIA_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'daisychain-media')
+MEDIA_CACHE_MAX_BYTES = 512 * 1000000
+# seconds after which a url is downloaded again
+MEDIA_CACHE_TTL = 86400
+# #############################
+
+# ######## Dropbox ########
+# fire the triggers for all existing files of newly connected accounts
+DROPBOX_BACKFILL = False
+# file versions remembered per account to skip unchanged files, see
+# channel_dropbox.dedup
+DROPBOX_SEEN_FILES_MAX_ENTRIES = 1024
+DROPBOX_SEEN_FILES_TTL = 3600  # seconds
+# the account informations are fetched at most once in this many seconds
+DROPBOX_ACCOUNT_INFO_TTL = 3600
+# #########################
+
+# ######## Facebook ########
+# posts requested per page of a feed, and seconds allowed for all pages
+# fetched for one webhook, see channel_facebook.channel
+FACEBOOK_FEED_PAGE_SIZE = 25
+FACEBOOK_FEED_TIME_BUDGET = 20
+# ##########################
+
+# ######## RSS ########
+# feeds downloaded at once per poll, and from the same host, see
+# channel_rss.fetch
+RSS_FETCH_CONCURRENCY = 16
+RSS_HOST_CONCURRENCY = 2
+# seconds between the polls of a feed, adapted to its updates
+RSS_MIN_INTERVAL = 300
+RSS_MAX_INTERVAL = 86400
+# feeds failing this many polls in a row are polled again after
+# RSS_QUARANTINE_PERIOD seconds
+RSS_QUARANTINE_FAILURES = 5
+RSS_QUARANTINE_PERIOD = 7 * 86400
+# keys of seen entries remembered per feed, see channel_rss.utils
+RSS_SEEN_ENTRIES = 1000
+# seconds after which feeds leased by a poller that died are polled again
+RSS_LEASE_TIMEOUT = 600
+# #####################
+
 # ########## Account #############
 # # http://django-allauth.readthedocs.io/en/latest/configuration.html
 
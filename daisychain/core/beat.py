@@ -0,0 +1,105 @@
+from datetime import timedelta
+from uuid import uuid4
+import logging
+
+from celery.beat import PersistentScheduler
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import DateTimeField, ExpressionWrapper, Q
+from django.db.models.functions import Now
+
+from core.models import BeatLease
+
+log = logging.getLogger('channel')
+
+
+class DatabaseTimeIn(ExpressionWrapper):
+    """The database time ``seconds`` from now."""
+
+    def __init__(self, seconds):
+        super().__init__(Now() + timedelta(seconds=seconds),
+                         output_field=DateTimeField())
+
+    def as_sqlite(self, compiler, connection):
+        # the sum of django_format_dtdelta carries an UTC offset, which the
+        # backend cannot read back
+        sql, params = self.as_sql(compiler, connection)
+        return 'datetime({})'.format(sql), params
+
+
+class LeaderLease():
+    """Lease in the database that at most one process holds at a time.
+
+    The holder has to renew the lease before it expires after ``timeout``
+    seconds, otherwise another process can take it over. Expiry is computed
+    and compared in the database, so the clocks of the hosts do not matter.
+    """
+
+    def __init__(self, name, timeout):
+        self.name = name
+        self.timeout = timeout
+        self.owner = uuid4().hex
+
+    def acquire(self):
+        """Take or renew the lease, return True if this process holds it."""
+        expires = DatabaseTimeIn(self.timeout)
+        try:
+            if BeatLease.objects \
+                    .filter(name=self.name) \
+                    .filter(Q(owner=self.owner) | Q(expires__lte=Now())) \
+                    .update(owner=self.owner, expires=expires):
+                return True
+            with transaction.atomic():
+                BeatLease.objects.create(name=self.name, owner=self.owner,
+                                         expires=expires)
+            return True
+        except IntegrityError:
+            # created by another process in the meantime
+            return False
+        except DatabaseError as e:
+            log.warning("Could not acquire lease {}: {}".format(self.name, e))
+            # reconnect on the next attempt
+            connection.close()
+            return False
+
+    def release(self):
+        """Give up the lease, so another process can take it right away."""
+        try:
+            BeatLease.objects.filter(name=self.name, owner=self.owner) \
+                             .update(expires=Now())
+        except DatabaseError as e:
+            log.warning("Could not release lease {}: {}".format(self.name, e))
+
+
+class LeaderScheduler(PersistentScheduler):
+    """Celery beat scheduler for running several beats, of which one is
+    active.
+
+    Each beat competes for a LeaderLease of settings.BEAT_LEASE_TIMEOUT
+    seconds and only the holder sends the periodic tasks. The others take
+    over within that many seconds after the active beat stops.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.lease = LeaderLease(
+                'celerybeat', getattr(settings, 'BEAT_LEASE_TIMEOUT', 30))
+        self.is_leader = False
+        super().__init__(*args, **kwargs)
+
+    def tick(self):
+        # renew the lease well before it expires
+        interval = self.lease.timeout / 3
+
+        is_leader = self.lease.acquire()
+        if is_leader != self.is_leader:
+            log.info("celery beat {} {} the lease".format(
+                self.lease.owner, "acquired" if is_leader else "lost"))
+            self.is_leader = is_leader
+        if not is_leader:
+            return interval
+        return min(super().tick(), interval)
+
+    def close(self):
+        if self.is_leader:
+            self.lease.release()
+        super().close()
@@ -1,4 +1,8 @@
-from core.tasks import handle_trigger
+from collections import OrderedDict
+
+from django.conf import settings
+
+from core.tasks import handle_trigger, handle_trigger_batch
 
 
 class Core():
@@ -21,3 +25,41 @@ class Core():
 
         """
         handle_trigger.delay(channel_name, trigger_type, userid, payload)
+
+    def handle_triggers(self, events):
+        """Queue several triggers at once.
+
+        Channels that fire many triggers in one go should use this method
+        instead of calling handle_trigger() for each of them. The triggers
+        are grouped by channel, trigger type and user and sent in as few
+        messages as possible, each holding up to settings.TRIGGER_BATCH_SIZE
+        triggers. The triggers of a large group are split across messages.
+
+        Args:
+            events (iterable): dicts with the keys ``channel_name``,
+                ``trigger_type``, ``userid`` and ``payload``, as passed to
+                handle_trigger()
+
+        """
+        channels = OrderedDict()
+        for event in events:
+            groups = channels.setdefault(event['channel_name'], OrderedDict())
+            key = (int(event['trigger_type']), int(event['userid']))
+            groups.setdefault(key, []).append(event['payload'])
+
+        batch_limit = getattr(settings, 'TRIGGER_BATCH_SIZE', 100)
+        for channel_name, groups in channels.items():
+            batch = []
+            batch_size = 0
+            for (trigger_type, userid), payloads in groups.items():
+                while payloads:
+                    part = payloads[:batch_limit - batch_size]
+                    payloads = payloads[len(part):]
+                    batch.append([trigger_type, userid, part])
+                    batch_size += len(part)
+                    if batch_size >= batch_limit:
+                        handle_trigger_batch.delay(channel_name, batch)
+                        batch = []
+                        batch_size = 0
+            if batch:
+                handle_trigger_batch.delay(channel_name, batch)
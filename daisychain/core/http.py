@@ -0,0 +1,122 @@
+from collections import defaultdict
+from threading import Lock
+from urllib.parse import urlsplit
+import logging
+import time
+
+from django.conf import settings
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+log = logging.getLogger("channel")
+
+# (connect, read) timeout in seconds
+DEFAULT_TIMEOUT = (3.05, 30)
+
+
+class HostMetrics():
+    """Request counts and latencies per host."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._hosts = defaultdict(lambda: {'requests': 0,
+                                           'errors': 0,
+                                           'total_seconds': 0.0,
+                                           'max_seconds': 0.0})
+
+    def record(self, host, seconds, error=False):
+        with self._lock:
+            metrics = self._hosts[host]
+            metrics['requests'] += 1
+            metrics['total_seconds'] += seconds
+            metrics['max_seconds'] = max(metrics['max_seconds'], seconds)
+            if error:
+                metrics['errors'] += 1
+
+    def snapshot(self):
+        """Return a copy of the metrics, incl. the mean latency per host."""
+        with self._lock:
+            hosts = {host: dict(metrics)
+                     for host, metrics in self._hosts.items()}
+        for metrics in hosts.values():
+            metrics['mean_seconds'] = (metrics['total_seconds'] /
+                                       metrics['requests'])
+        return hosts
+
+    def clear(self):
+        with self._lock:
+            self._hosts.clear()
+
+
+def create_session():
+    """Create the session shared by all channels.
+
+    The adapters keep a connection pool per host. Idempotent requests
+    (GET, HEAD, PUT, DELETE, OPTIONS, TRACE) are retried with an exponential
+    backoff on connection errors and on 5xx responses of a gateway.
+    """
+    retry = Retry(total=getattr(settings, 'HTTP_MAX_RETRIES', 3),
+                  backoff_factor=getattr(settings, 'HTTP_BACKOFF_FACTOR', 0.5),
+                  status_forcelist=(500, 502, 503, 504),
+                  raise_on_status=False)
+    adapter = HTTPAdapter(
+            pool_connections=getattr(settings, 'HTTP_POOL_HOSTS', 20),
+            pool_maxsize=getattr(settings, 'HTTP_POOL_SIZE', 10),
+            max_retries=retry)
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+session = create_session()
+host_metrics = HostMetrics()
+
+
+class HttpClient():
+    """HTTP client of a channel.
+
+    Provides the functions of the requests module (get, post, ...) on the
+    shared session. Requests without an explicit timeout get the timeout of
+    the channel, configured in settings.HTTP_TIMEOUTS.
+    """
+
+    def __init__(self, channel_name):
+        self.channel_name = channel_name
+        timeouts = getattr(settings, 'HTTP_TIMEOUTS', {})
+        self.timeout = timeouts.get(channel_name.lower(),
+                                    timeouts.get('default', DEFAULT_TIMEOUT))
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        host = urlsplit(url).netloc
+
+        start = time.monotonic()
+        try:
+            response = session.request(method, url, **kwargs)
+        except requests.RequestException:
+            host_metrics.record(host, time.monotonic() - start, error=True)
+            log.warning("{} request to {} failed".format(self.channel_name,
+                                                         host))
+            raise
+
+        host_metrics.record(host, time.monotonic() - start,
+                            error=response.status_code >= 500)
+        return response
+
+    def get(self, url, params=None, **kwargs):
+        return self.request('GET', url, params=params, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request('HEAD', url, **kwargs)
+
+    def post(self, url, data=None, json=None, **kwargs):
+        return self.request('POST', url, data=data, json=json, **kwargs)
+
+    def put(self, url, data=None, **kwargs):
+        return self.request('PUT', url, data=data, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
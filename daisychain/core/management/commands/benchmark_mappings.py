@@ -0,0 +1,58 @@
+from timeit import timeit
+
+from django.core.management.base import BaseCommand
+
+from channel_rss.config import TO_REPLACE
+from core.utils import replace_text_mappings
+
+
+def replace_text_mappings_naive(mappings, to_replace, payload):
+    """The former implementation: one str.replace per placeholder."""
+    for key in mappings:
+        val = mappings[key]
+        if type(val) is str:
+            for s in to_replace:
+                placeholder = '%{}%'.format(s)
+                val = val.replace(placeholder, payload[s])
+            mappings[key] = val
+    return mappings
+
+
+class Command(BaseCommand):
+    help = ("Compare filling recipe mappings with compiled templates to "
+            "plain string replacement, using long RSS payloads.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entries', type=int, default=200,
+                            help="number of feed entries in the payload")
+        parser.add_argument('--runs', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        entries = options['entries']
+        runs = options['runs']
+
+        summary = "Lorem ipsum dolor sit amet, consectetur adipiscing. " * 4
+        link = "https://example.com/articles/{}"
+        payload = {
+            'summaries': '\n\n'.join(summary for _ in range(entries)),
+            'summaries_and_links': '\n\n'.join(
+                summary + link.format(i) for i in range(entries)),
+            'feed_url': 'https://example.com/rss',
+        }
+        mappings = {
+            'title': 'New entries in your feed',
+            'body': 'Hi,\n\n%summaries_and_links%\n\nBye',
+            'short': '%summaries%',
+        }
+
+        results = []
+        for name, func in [('str.replace', replace_text_mappings_naive),
+                           ('compiled', replace_text_mappings)]:
+            seconds = timeit(lambda: func(dict(mappings), TO_REPLACE, payload),
+                             number=runs)
+            results.append(seconds)
+            self.stdout.write("{:<12} {:8.2f} us per event".format(
+                name, seconds / runs * 1e6))
+
+        self.stdout.write("speedup      {:8.2f}x".format(
+            results[0] / results[1]))
@@ -0,0 +1,256 @@
+from contextlib import contextmanager
+from hashlib import sha256
+from threading import Lock
+import fcntl
+import logging
+import os
+import tempfile
+import time
+
+from django.conf import settings
+
+from core.http import HttpClient
+
+log = logging.getLogger("channel")
+http_client = HttpClient("media")
+
+
+class MediaCache():
+    """Worker-local on-disk cache of downloaded media files.
+
+    Files are stored by the SHA-256 of their content in ``blobs/``, so the
+    same media behind different URLs is stored once. ``urls/`` maps the
+    hash of each URL to the content hash. A URL is downloaded again after
+    ``ttl`` seconds, in case its content changed.
+
+    The size of the cache is tracked from the downloads of this process.
+    The directory is only scanned when the tracked size exceeds
+    ``max_bytes`` or the last scan is SCAN_INTERVAL seconds old, to catch
+    the downloads of other processes. The least recently used blobs are
+    then removed until the cache is below LOW_WATER of ``max_bytes``.
+
+    Concurrent requests for the same URL are downloaded only once: the
+    threads of a process share a lock per URL, and the worker processes
+    one of LOCK_STRIPES lock files chosen by the hash of the URL. The
+    requests waiting for a download then find the file in the cache.
+    Requests for other URLs only wait if their URL maps to the same lock
+    file. The lock files are never removed, so all processes always lock
+    the same file.
+
+    Expired url entries are removed when they are looked up, and with the
+    url entries of evicted blobs when the directory is scanned.
+    """
+
+    SCAN_INTERVAL = 60  # seconds
+    LOW_WATER = 0.9
+    LOCK_STRIPES = 256
+
+    def __init__(self, directory, max_bytes, ttl=86400,
+                 chunk_size=64 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.chunk_size = chunk_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = Lock()
+        # url key -> [lock, number of requests using it]
+        self._flights = {}
+        # size at the last scan plus the downloads since, None before
+        self._size = None
+        self._scanned = 0.0
+        self._directories_created = False
+
+    def _path(self, kind, name):
+        return os.path.join(self.directory, kind, name)
+
+    def _create_directories(self):
+        if not self._directories_created:
+            for kind in ('blobs', 'urls', 'locks', 'tmp'):
+                os.makedirs(self._path(kind, ''), exist_ok=True)
+            self._directories_created = True
+
+    def _count(self, counter, n=1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + n)
+
+    @contextmanager
+    def _single_flight(self, url_key):
+        with self._lock:
+            flight = self._flights.setdefault(url_key, [Lock(), 0])
+            flight[1] += 1
+        stripe = str(int(url_key[:8], 16) % self.LOCK_STRIPES)
+        try:
+            with flight[0], open(self._path('locks', stripe),
+                                 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        finally:
+            with self._lock:
+                flight[1] -= 1
+                if not flight[1]:
+                    del self._flights[url_key]
+
+    def open(self, url):
+        """Return the media at url as a file opened for binary reading.
+
+        Raises:
+            requests.HTTPError: If the download failed.
+        """
+        self._create_directories()
+        url_key = sha256(url.encode('utf-8')).hexdigest()
+
+        with self._single_flight(url_key):
+            media_file = self._open_cached(url_key)
+            if media_file is not None:
+                self._count('hits')
+                log.debug("media cache hit for {}".format(url))
+                return media_file
+
+            self._count('misses')
+            log.debug("media cache miss for {}".format(url))
+            digest, size = self._download(url)
+
+            # write the url entry atomically
+            with tempfile.NamedTemporaryFile('w',
+                                             dir=self._path('tmp', ''),
+                                             delete=False) as entry:
+                entry.write(digest)
+            os.replace(entry.name, self._path('urls', url_key))
+
+            media_file = open(self._path('blobs', digest), 'rb')
+
+        # the opened file stays readable even if it is evicted now
+        self._added(size)
+        return media_file
+
+    def _open_cached(self, url_key):
+        entry_path = self._path('urls', url_key)
+        try:
+            with open(entry_path) as entry:
+                if self._expired(os.fstat(entry.fileno())):
+                    self._unlink(entry_path)
+                    return None
+                digest = entry.read()
+            media_file = open(self._path('blobs', digest), 'rb')
+        except FileNotFoundError:
+            return None
+
+        # the modification time is the time of the last use
+        os.utime(media_file.fileno())
+        return media_file
+
+    def _expired(self, url_entry_stat):
+        return time.time() - url_entry_stat.st_mtime > self.ttl
+
+    def _download(self, url):
+        r = http_client.get(url, stream=True)
+        r.raise_for_status()
+
+        content_hash = sha256()
+        size = 0
+        with tempfile.NamedTemporaryFile(dir=self._path('tmp', ''),
+                                         delete=False) as tmp_file:
+            try:
+                for chunk in r.iter_content(chunk_size=self.chunk_size):
+                    if chunk:
+                        content_hash.update(chunk)
+                        tmp_file.write(chunk)
+                        size += len(chunk)
+            except Exception:
+                os.unlink(tmp_file.name)
+                raise
+
+        digest = content_hash.hexdigest()
+        blob_path = self._path('blobs', digest)
+        if os.path.exists(blob_path):
+            # the same content is cached for another url already
+            os.unlink(tmp_file.name)
+            return digest, 0
+        os.replace(tmp_file.name, blob_path)
+        return digest, size
+
+    def _added(self, size):
+        with self._lock:
+            if self._size is not None:
+                self._size += size
+                if (self._size <= self.max_bytes and
+                        time.monotonic() - self._scanned < self.SCAN_INTERVAL):
+                    return
+            self._scanned = time.monotonic()
+        self._evict()
+
+    def _evict(self):
+        blobs = []
+        total = 0
+        for entry in os.scandir(self._path('blobs', '')):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            blobs.append((stat.st_mtime, stat.st_size, entry.name))
+            total += stat.st_size
+
+        evicted = set()
+        if total > self.max_bytes:
+            # remove the least recently used files first
+            for mtime, size, digest in sorted(blobs):
+                if total <= self.max_bytes * self.LOW_WATER:
+                    break
+                self._unlink(self._path('blobs', digest))
+                evicted.add(digest)
+                total -= size
+                log.debug("media cache evicted {}".format(digest))
+            self._count('evictions', len(evicted))
+
+        # drop the url entries that expired or point to the removed files
+        for entry in os.scandir(self._path('urls', '')):
+            try:
+                if self._expired(entry.stat()):
+                    self._unlink(entry.path)
+                    continue
+                if not evicted:
+                    continue
+                with open(entry.path) as url_entry:
+                    digest = url_entry.read()
+            except FileNotFoundError:
+                continue
+            if digest in evicted:
+                self._unlink(entry.path)
+
+        with self._lock:
+            self._size = total
+
+    @staticmethod
+    def _unlink(path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions}
+
+    def clear(self):
+        self._create_directories()
+        for kind in ('blobs', 'urls'):
+            for entry in os.scandir(self._path(kind, '')):
+                self._unlink(entry.path)
+        with self._lock:
+            self.hits = self.misses = self.evictions = 0
+            self._size = None
+
+
+media_cache = MediaCache(
+        directory=getattr(settings, 'MEDIA_CACHE_DIR',
+                          os.path.join(tempfile.gettempdir(),
+                                       'daisychain-media')),
+        max_bytes=getattr(settings, 'MEDIA_CACHE_MAX_BYTES', 512 * 1000000),
+        ttl=getattr(settings, 'MEDIA_CACHE_TTL', 86400))
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from hashlib import sha1
+
+from django.db import migrations, models
+
+
+# a copy of core.models.value_hash at the time of this migration
+def value_hash(value):
+    return sha1(value.encode('utf-8')).hexdigest()
+
+
+def set_value_hashes(apps, schema_editor):
+    RecipeCondition = apps.get_model('core', 'RecipeCondition')
+    for condition in RecipeCondition.objects.all():
+        RecipeCondition.objects.filter(pk=condition.pk).update(
+            value_hash=value_hash(condition.value))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_recipe_synopsis'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipecondition',
+            name='value_hash',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=40, verbose_name='Condition Value Hash'),
+        ),
+        migrations.RunPython(set_value_hashes, migrations.RunPython.noop),
+    ]
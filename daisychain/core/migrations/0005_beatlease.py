@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-18 18:09
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_recipecondition_value_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BeatLease',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True, verbose_name='Lease Name')),
+                ('owner', models.CharField(max_length=32, verbose_name='Lease Owner')),
+                ('expires', models.DateTimeField(verbose_name='Lease Expiry')),
+            ],
+            options={
+                'verbose_name': 'Beat Lease',
+                'verbose_name_plural': 'Beat Leases',
+            },
+        ),
+    ]
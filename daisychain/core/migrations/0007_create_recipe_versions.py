@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations
+
+
+def create_recipe_versions(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    RecipeVersion = apps.get_model('core', 'RecipeVersion')
+    RecipeVersion.objects.bulk_create(
+        RecipeVersion(user_id=user_id)
+        for user_id in User.objects.values_list('id', flat=True))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0006_recipeversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_recipe_versions,
+                             migrations.RunPython.noop),
+    ]
@@ -1,9 +1,16 @@
+from hashlib import sha1
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils.translation import ugettext_lazy as _
 from django.utils import timezone
 
 
+def value_hash(value):
+    """Returns the hash of a condition value, see RecipeCondition."""
+    return sha1(value.encode('utf-8')).hexdigest()
+
+
 class ChannelManager(models.Manager):
     def get_by_natural_key(self, name):
         return self.get(name__iexact=name)
@@ -178,9 +185,47 @@ class ActionInput(models.Model):
                                                          self.action)
 
 
+class RecipeManager(models.Manager):
+    def for_trigger(self, user, channel, trigger_type):
+        """Load all recipes of a user for a trigger of the given channel.
+
+        The action, its channel, the mappings (with their action inputs) and
+        the conditions (with their trigger inputs) are fetched together with
+        the recipes, so the number of queries does not depend on the number
+        of matching recipes.
+        """
+        return self._with_recipe_data(
+                self.filter(user=user,
+                            trigger__channel=channel,
+                            trigger__trigger_type=trigger_type))
+
+    def for_triggers(self, channel, trigger_types, user_ids):
+        """Like for_trigger(), but for all combinations of the given trigger
+        types and users at once."""
+        return self._with_recipe_data(
+                self.filter(user__in=user_ids,
+                            trigger__channel=channel,
+                            trigger__trigger_type__in=trigger_types))
+
+    @staticmethod
+    def _with_recipe_data(recipes):
+        mappings = models.Prefetch(
+                'recipemapping_set',
+                queryset=RecipeMapping.objects.select_related('action_input'))
+        conditions = models.Prefetch(
+                'recipecondition_set',
+                queryset=RecipeCondition.objects.select_related(
+                    'trigger_input'))
+
+        return recipes.select_related('trigger', 'action__channel') \
+                      .prefetch_related(mappings, conditions)
+
+
 class Recipe(models.Model):
     """A recipe that is created by exactly one user."""
 
+    objects = RecipeManager()
+
     trigger = models.ForeignKey(Trigger, on_delete=models.CASCADE)
     action = models.ForeignKey(Action, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -217,14 +262,83 @@ class RecipeMapping(models.Model):
                                                         self.action_input)
 
 
+class RecipeConditionQuerySet(models.QuerySet):
+    """Keeps RecipeCondition.value_hash in sync on the bulk paths, which do
+    not call save() or send pre_save."""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for condition in objs:
+            condition.value_hash = value_hash(condition.value)
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def update(self, **kwargs):
+        if 'value' in kwargs:
+            if not isinstance(kwargs['value'], str):
+                raise TypeError("RecipeCondition values can only be "
+                                "updated with plain strings")
+            kwargs['value_hash'] = value_hash(kwargs['value'])
+        return super().update(**kwargs)
+
+
 class RecipeCondition(models.Model):
-    """ Conditions that have to hold for a trigger to fire """
+    """ Conditions that have to hold for a trigger to fire
+
+    'value_hash' is the indexed hash of the value, to look up conditions by
+    long values such as urls. It is set by a pre_save receiver (see
+    core.signals), which also covers fixture loads, and by the
+    bulk_create() and update() of the manager.
+    """
+
+    objects = RecipeConditionQuerySet.as_manager()
 
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
     trigger_input = models.ForeignKey(TriggerInput, on_delete=models.CASCADE)
     value = models.CharField(_("Condition Value"), max_length=1024)
+    value_hash = models.CharField(_("Condition Value Hash"), max_length=40,
+                                  db_index=True, editable=False, default='')
 
     class Meta:
         verbose_name = _('Recipe Condition')
         verbose_name_plural = _('Recipe Conditions')
         unique_together = ('recipe', 'trigger_input')
+
+
+class BeatLease(models.Model):
+    """ Lease held by the active celery beat, see core.beat
+
+    Only the owner of an unexpired lease sends the periodic tasks.
+    """
+
+    name = models.CharField(_("Lease Name"), max_length=64, unique=True)
+    owner = models.CharField(_("Lease Owner"), max_length=32)
+    expires = models.DateTimeField(_("Lease Expiry"))
+
+    class Meta:
+        verbose_name = _('Beat Lease')
+        verbose_name_plural = _('Beat Leases')
+
+    def __str__(self):
+        return 'Beat lease {} held by {} until {}'.format(self.name,
+                                                          self.owner,
+                                                          self.expires)
+
+
+class RecipeVersion(models.Model):
+    """ Counter of the changes to the recipes of a user
+
+    Created with the user and bumped in the transaction that changes a
+    recipe, its conditions or its mappings, see core.signals. Every worker
+    process compares it to the version of its indexed recipes, see
+    core.routing.
+    """
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE)
+    version = models.PositiveIntegerField(_("Version"), default=0)
+
+    class Meta:
+        verbose_name = _('Recipe Version')
+        verbose_name_plural = _('Recipe Versions')
+
+    def __str__(self):
+        return 'Recipe version {} of {}'.format(self.version, self.user)
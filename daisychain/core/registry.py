@@ -0,0 +1,88 @@
+from importlib import import_module
+from threading import Lock
+import logging
+
+from django.apps import apps
+from django.core.exceptions import ImproperlyConfigured
+
+from core.channel import Channel
+
+log = logging.getLogger("channel")
+
+APP_PREFIX = 'channel_'
+
+
+class ChannelRegistry():
+    """Holds one instance of every channel.
+
+    All installed apps named ``channel_<name>`` are discovered on first use
+    (or by calling load()). Each has to provide the class
+    ``channel_<name>.channel.<Name>Channel`` implementing core.channel.Channel.
+    Channels must not keep per-call state, since the instances are shared.
+    """
+
+    def __init__(self):
+        self._instances = None
+        self._lock = Lock()
+
+    def load(self):
+        """Import and instantiate all channels, if not done yet."""
+        if self._instances is not None:
+            return
+
+        with self._lock:
+            if self._instances is not None:
+                return
+
+            instances = {}
+            for app_config in apps.get_app_configs():
+                if app_config.name.startswith(APP_PREFIX):
+                    name = app_config.name[len(APP_PREFIX):]
+                    instances[name] = self._create_instance(app_config.name,
+                                                            name)
+            log.debug("channels loaded: {}".format(sorted(instances)))
+
+            self._instances = instances
+
+    @staticmethod
+    def _create_instance(app_name, name):
+        channel_module = import_module('{}.channel'.format(app_name))
+        channel_class_name = '{}Channel'.format(name.capitalize())
+
+        try:
+            channel_class = getattr(channel_module, channel_class_name)
+        except AttributeError:
+            raise ImproperlyConfigured("{}.channel has no class {}".format(
+                app_name, channel_class_name))
+
+        if not issubclass(channel_class, Channel):
+            raise ImproperlyConfigured(
+                "{} does not implement core.channel.Channel".format(
+                    channel_class_name))
+
+        try:
+            return channel_class()
+        except TypeError as e:
+            # raised for channels that miss abstract methods
+            raise ImproperlyConfigured("{} can not be instantiated: {}".format(
+                channel_class_name, e))
+
+    def get(self, channel):
+        """Return the instance of the channel with the given name.
+
+        Raises:
+            ImportError: If there is no such channel.
+        """
+        self.load()
+
+        try:
+            return self._instances[channel.lower()]
+        except KeyError:
+            raise ImportError("No channel named {}".format(channel))
+
+    def names(self):
+        self.load()
+        return sorted(self._instances)
+
+
+channel_registry = ChannelRegistry()
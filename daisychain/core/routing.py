@@ -0,0 +1,97 @@
+from collections import OrderedDict, namedtuple
+from threading import Lock
+import time
+
+from django.conf import settings
+
+
+RecipeSnapshot = namedtuple('RecipeSnapshot', ['id',
+                                               'conditions',
+                                               'mappings',
+                                               'action_channel',
+                                               'action_type'])
+
+
+def compile_recipe(recipe):
+    """Create a RecipeSnapshot from a recipe loaded by
+    ``Recipe.objects.for_trigger()``.
+
+    The snapshot holds everything the worker needs to run the recipe, so it
+    can be kept in memory without referring back to the database.
+    """
+    mappings = {}
+    for mapping in recipe.recipemapping_set.all():
+        mappings[mapping.action_input.name] = mapping.trigger_output
+
+    conditions = {}
+    for c in recipe.recipecondition_set.all():
+        conditions[c.trigger_input.name] = c.value
+
+    return RecipeSnapshot(id=recipe.id,
+                          conditions=conditions,
+                          mappings=mappings,
+                          action_channel=recipe.action.channel.name,
+                          action_type=recipe.action.action_type)
+
+
+class RecipeIndex():
+    """In-process LRU index of the recipes matching a trigger.
+
+    Maps (channel name, trigger type, user id) to the list of RecipeSnapshots
+    that have to be executed for such a trigger. Each entry carries the
+    RecipeVersion of its user read before the recipes were loaded, and is
+    only returned for that version, so changes made in any process are
+    seen at once. Entries are also dropped after ``ttl`` seconds and when
+    more than ``max_entries`` keys are stored.
+    """
+
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    @staticmethod
+    def key(channel_name, trigger_type, user_id):
+        return (channel_name.lower(), int(trigger_type), int(user_id))
+
+    def get(self, key, version=0):
+        with self._lock:
+            try:
+                expires, entry_version, snapshots = self._entries[key]
+            except KeyError:
+                return None
+
+            if expires < time.monotonic() or entry_version != version:
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return snapshots
+
+    def set(self, key, snapshots, version=0):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, version,
+                                  tuple(snapshots))
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id):
+        user_id = int(user_id)
+        with self._lock:
+            for key in [k for k in self._entries if k[2] == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+recipe_index = RecipeIndex(
+        max_entries=getattr(settings, 'RECIPE_INDEX_MAX_ENTRIES', 1024),
+        ttl=getattr(settings, 'RECIPE_INDEX_TTL', 300))
@@ -0,0 +1,55 @@
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from core.models import (Recipe, RecipeCondition, RecipeMapping,
+                         RecipeVersion, value_hash)
+from core.routing import recipe_index
+
+
+def invalidate_recipes_of_user(user_id):
+    """Drop the indexed recipes of a user in all worker processes.
+
+    The RecipeVersion of the user is bumped in the running transaction, the
+    other processes reload the recipes once it is committed.
+    """
+    recipe_index.invalidate_user(user_id)
+    RecipeVersion.objects.filter(user_id=user_id) \
+                         .update(version=F('version') + 1)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created=False, **kwargs):
+    # also for raw saves, so users loaded from fixtures get one
+    if created:
+        RecipeVersion.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=RecipeCondition)
+def set_condition_value_hash(sender, instance, **kwargs):
+    # also for raw saves, fixtures carry no or outdated hashes
+    instance.value_hash = value_hash(instance.value)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate_recipes_of_user(instance.user_id)
+
+
+@receiver(post_save, sender=RecipeCondition)
+@receiver(post_delete, sender=RecipeCondition)
+@receiver(post_save, sender=RecipeMapping)
+@receiver(post_delete, sender=RecipeMapping)
+def recipe_part_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    try:
+        user_id = instance.recipe.user_id
+    except Recipe.DoesNotExist:
+        # deleted together with its recipe, which invalidates on its own
+        return
+    invalidate_recipes_of_user(user_id)
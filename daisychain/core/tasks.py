@@ -1,92 +1,212 @@
 from __future__ import absolute_import
-from django.contrib.auth.models import User
 from celery.utils.log import get_task_logger
-from core.models import Channel, Recipe, RecipeMapping, RecipeCondition
+from core.models import Channel, Recipe, RecipeVersion
 from core.channel import (NotSupportedTrigger, NotSupportedAction,
                           ConditionNotMet)
+from core.routing import recipe_index, compile_recipe
 from core.utils import get_channel_instance
 from celery import shared_task
+import requests
+from requests.packages.urllib3.exceptions import NewConnectionError
 
 
 log = get_task_logger('channel')
 
+# retries of a failing action and the delay (in seconds) before the first one
+ACTION_MAX_RETRIES = 3
+ACTION_RETRY_DELAY = 30
 
-@shared_task
-def handle_trigger(channel_name, trigger_type, user_id, payload):
+
+def _is_transient(error):
+    """Return True if an action failed before it could have had an effect.
+
+    Actions such as posts are not idempotent, so only errors establishing
+    the connection and responses refusing the request (503, 429) are
+    retried. Other errors, such as a dropped connection or a gateway
+    timeout, may come after the action succeeded and are not retried.
     """
-        Handle incoming triggers via celery.
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if isinstance(error, requests.ConnectionError):
+        # requests wraps the urllib3 error, whose reason tells whether the
+        # connection was ever made
+        reason = getattr(error.args[0] if error.args else None, 'reason',
+                         None)
+        return isinstance(reason, NewConnectionError)
+    response = getattr(error, 'response', None)
+    status_code = getattr(response, 'status_code',
+                          getattr(error, 'status_code', None))
+    return status_code in (429, 503)
+
+
+def _get_recipes(channel_name, keys):
+    """Return the channel name and the RecipeSnapshots for several triggers.
+
+    Args:
+        channel_name (str): the triggered channel
+        keys (list): (trigger_type, user_id) pairs
+
+    Returns:
+        tuple: the channel name and a dict mapping each of the given keys to
+            its RecipeSnapshots, or None if the channel does not exist.
+
+    The snapshots are taken from the in-process recipe index if their
+    RecipeVersion is current. All others are loaded from the database at
+    once and added to the index.
     """
-    log.debug("handle trigger called")
-    # retrieve the user object from db
-    try:
-        triggered_user = User.objects.get(pk=user_id)
-    except User.DoesNotExist:
-        log.error("Triggered user does not exist")
-        return
+    # read before the recipes, so the index never holds recipes older than
+    # their version
+    versions = dict(RecipeVersion.objects
+                    .filter(user_id__in={user_id for _, user_id in keys})
+                    .values_list('user_id', 'version'))
+
+    recipes = {}
+    missing = set()
+    for trigger_type, user_id in keys:
+        key = recipe_index.key(channel_name, trigger_type, user_id)
+        snapshots = recipe_index.get(key, versions.get(user_id, 0))
+        if snapshots is None:
+            missing.add((trigger_type, user_id))
+        else:
+            recipes[(trigger_type, user_id)] = snapshots
+
+    if not missing:
+        log.debug("recipes taken from index")
+        return channel_name, recipes
 
     # retrieve the channel from db
     try:
         channel = Channel.objects.get(name__iexact=channel_name)
     except Channel.DoesNotExist:
         log.error("Triggered channel does not exist")
-        return
+        return None
+
+    # get the recipes together with their mappings, conditions and actions
+    loaded = {key: [] for key in missing}
+    for recipe in Recipe.objects.for_triggers(
+            channel=channel,
+            trigger_types={trigger_type for trigger_type, _ in missing},
+            user_ids={user_id for _, user_id in missing}):
+        key = (recipe.trigger.trigger_type, recipe.user_id)
+        if key in loaded:
+            loaded[key].append(compile_recipe(recipe))
+
+    for (trigger_type, user_id), snapshots in loaded.items():
+        recipe_index.set(recipe_index.key(channel.name, trigger_type, user_id),
+                         snapshots,
+                         version=versions.get(user_id, 0))
+        recipes[(trigger_type, user_id)] = tuple(snapshots)
+
+    return channel.name, recipes
 
-    # instanciate channel
-    triggered_channel_inst = get_channel_instance(channel.name)
 
-    # get the recipes
-    recipes = list(Recipe.objects.filter(user=triggered_user,
-                                         trigger__channel=channel,
-                                         trigger__trigger_type=trigger_type))
-    log.debug("recipes found: {}".format(recipes))
+def _run_recipes(channel_name, trigger_type, user_id, payload, recipes):
+    log.debug("recipes found: {}".format([r.id for r in recipes]))
 
+    # each recipe runs in its own task, so a slow or failing action does not
+    # hold up the other recipes
     for recipe in recipes:
-        # create dict for recipe mapping and fill it.
-        inputs = {}
-        recipe_mappings = RecipeMapping.objects.filter(recipe=recipe)
-        for mapping in recipe_mappings:
-            inputs[mapping.action_input.name] = mapping.trigger_output
-
-        # create dictionary for recipe conditions and fill it.
-        conditions = {}
-        recipe_conditions = RecipeCondition.objects.filter(recipe=recipe)
-        for c in recipe_conditions:
-            conditions[c.trigger_input.name] = c.value
-        # the triggered channel has to fill the mapping dictionary
-        try:
-            log.debug("Trying to get mappings from trigger channel")
-            mappings = triggered_channel_inst.fill_recipe_mappings(
-                                                  trigger_type=trigger_type,
-                                                  userid=user_id,
-                                                  payload=payload,
-                                                  conditions=conditions,
-                                                  mappings=inputs)
-        except NotSupportedTrigger:
-            log.debug("NotSupportedTrigger {}".format(trigger_type))
-            return
-        except ConditionNotMet as e:
-            log.debug(e)
-            continue
-        except Exception as e:
-            log.error("Unexpected error in task.handle_trigger "
-                      "while trying to get mappings from trigger channel")
-            log.error(e)
-            return
+        # the snapshots are shared, channels get their own copies
+        run_recipe.delay(recipe.id,
+                         channel_name,
+                         trigger_type,
+                         user_id,
+                         payload,
+                         dict(recipe.conditions),
+                         dict(recipe.mappings),
+                         recipe.action_channel,
+                         recipe.action_type)
 
-        # get the action channel
-        action_channel = get_channel_instance(recipe.action.channel.name)
-        # initiate action
-
-        try:
-            log.debug("task: handle action")
-            action_channel.handle_action(action_type=recipe.action.action_type,
-                                         userid=user_id,
-                                         inputs=mappings)
-        except NotSupportedAction:
-            log.debug("NotSupportedAction {}".format(recipe.action))
-            return
-        except Exception as e:
-            log.error("Unexpected error in task.handle_trigger "
-                      "while trying to action. handle_action")
-            log.error(e)
+
+@shared_task
+def handle_trigger(channel_name, trigger_type, user_id, payload):
+    """
+        Handle incoming triggers via celery.
+    """
+    log.debug("handle trigger called")
+    handle_trigger_batch(channel_name, [[trigger_type, user_id, [payload]]])
+
+
+@shared_task
+def handle_trigger_batch(channel_name, groups):
+    """
+        Handle a batch of triggers of one channel, as queued by
+        Core.handle_triggers().
+
+        groups is a list of [trigger_type, user_id, payloads] entries. The
+        recipes of all entries are resolved at once.
+    """
+    log.debug("handle trigger batch called")
+    found = _get_recipes(channel_name,
+                         [(int(trigger_type), int(user_id))
+                          for trigger_type, user_id, _ in groups])
+    if found is None:
+        return
+    channel_name, recipes = found
+
+    for trigger_type, user_id, payloads in groups:
+        key = (int(trigger_type), int(user_id))
+        for payload in payloads:
+            _run_recipes(channel_name, trigger_type, user_id, payload,
+                         recipes[key])
+
+
+@shared_task(bind=True, max_retries=ACTION_MAX_RETRIES,
+             default_retry_delay=ACTION_RETRY_DELAY)
+def run_recipe(self, recipe_id, channel_name, trigger_type, user_id, payload,
+               conditions, mappings, action_channel, action_type):
+    """
+        Run a single recipe for a trigger: let the triggered channel fill the
+        mappings and pass them on to the action channel.
+
+        The mappings are filled in this task, since they may hold files that
+        can not be sent to another task. Transient errors of the action are
+        retried with an exponential backoff, all others fail the recipe.
+    """
+    log.debug("task: run recipe {}".format(recipe_id))
+
+    # the triggered channel has to fill the mapping dictionary
+    triggered_channel_inst = get_channel_instance(channel_name)
+    try:
+        log.debug("Trying to get mappings from trigger channel")
+        inputs = triggered_channel_inst.fill_recipe_mappings(
+                                              trigger_type=trigger_type,
+                                              userid=user_id,
+                                              payload=payload,
+                                              conditions=conditions,
+                                              mappings=mappings)
+    except NotSupportedTrigger:
+        log.debug("NotSupportedTrigger {}".format(trigger_type))
+        return
+    except ConditionNotMet as e:
+        log.debug(e)
+        return
+    except Exception as e:
+        log.error("Unexpected error in task.run_recipe "
+                  "while trying to get mappings from trigger channel "
+                  "for recipe {}".format(recipe_id))
+        log.error(e)
+        return
+
+    # get the action channel
+    action_channel_inst = get_channel_instance(action_channel)
+
+    # initiate action
+    try:
+        log.debug("task: handle action")
+        action_channel_inst.handle_action(action_type=action_type,
+                                          userid=user_id,
+                                          inputs=inputs)
+    except NotSupportedAction:
+        log.debug("NotSupportedAction {} on {}".format(action_type,
+                                                       action_channel))
+    except Exception as e:
+        log.error("Unexpected error in task.run_recipe "
+                  "while trying to action. handle_action "
+                  "(recipe {}, attempt {})".format(recipe_id,
+                                                   self.request.retries + 1))
+        log.error(e)
+        if not _is_transient(e):
             return
+        raise self.retry(exc=e, countdown=(self.default_retry_delay *
+                                           2 ** self.request.retries))
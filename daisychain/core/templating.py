@@ -0,0 +1,81 @@
+from functools import lru_cache
+import re
+
+
+# %name% placeholders as used in the trigger outputs of recipe mappings
+PLACEHOLDER_PATTERN = re.compile(r'%([A-Za-z0-9_\-]+)%')
+
+TEMPLATE_CACHE_SIZE = 4096
+
+
+class MappingTemplate():
+    """A mapping string split into literal text and placeholders.
+
+    The string is scanned once when the template is created. Rendering
+    joins the segments in a single pass, so the cost does not grow with
+    the number of possible placeholders or the size of the values.
+    """
+
+    __slots__ = ('text', 'segments', 'fields')
+
+    def __init__(self, text):
+        self.text = text
+        # placeholders are stored as 1-tuples, literal text as str
+        segments = []
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(text):
+            if match.start() > position:
+                segments.append(text[position:match.start()])
+            segments.append((match.group(1),))
+            position = match.end()
+        if position < len(text):
+            segments.append(text[position:])
+
+        self.segments = tuple(segments)
+        self.fields = frozenset(s[0] for s in segments if type(s) is tuple)
+
+    def render(self, values, fields=None):
+        """Replace the placeholders by their values.
+
+        Args:
+            values (dict): the values by placeholder name
+            fields (set): if given, only these placeholders are replaced
+
+        Placeholders without a value (or not in ``fields``) are kept as they
+        are. Values are inserted verbatim, i.e. placeholders within a value
+        are not replaced.
+        """
+        if not self.fields:
+            return self.text
+
+        parts = []
+        for segment in self.segments:
+            if type(segment) is tuple:
+                name = segment[0]
+                if (fields is None or name in fields) and name in values:
+                    parts.append(str(values[name]))
+                else:
+                    parts.append('%{}%'.format(name))
+            else:
+                parts.append(segment)
+        return ''.join(parts)
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def compile_template(text):
+    """Return the (cached) MappingTemplate of the given string."""
+    return MappingTemplate(text)
+
+
+def render_mappings(mappings, values, fields=None):
+    """Fill the placeholders of all string mappings.
+
+    Returns a new dict; values that are not strings (e.g. files filled in
+    before) are taken over unchanged.
+    """
+    rendered = {}
+    for key, val in mappings.items():
+        if type(val) is str:
+            val = compile_template(val).render(values, fields)
+        rendered[key] = val
+    return rendered
@@ -3,17 +3,42 @@ from django.contrib.sites.models import Site
 from django.core.urlresolvers import resolve, reverse
 from django.http import HttpRequest
 
+from django.db.models import F
+from django.test import override_settings
 from django.test.client import Client
+from django.utils import timezone
 from django.contrib.auth.models import User
 from mock import Mock, patch
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from datetime import timedelta
+from tempfile import TemporaryDirectory
+from threading import Event, Thread
+import os
+import time
+
+import requests
+from requests.packages.urllib3.exceptions import (MaxRetryError,
+                                                  NewConnectionError,
+                                                  ProtocolError)
+import responses
+
+from django.core.exceptions import ImproperlyConfigured
 
 from core import tasks
+from core.beat import LeaderLease, LeaderScheduler
+from core.core import Core
+from core.http import HttpClient, host_metrics
+from core.media import MediaCache
 from core.channel import (NotSupportedTrigger, NotSupportedAction,
                           ConditionNotMet)
-from core.models import (Action, ActionInput, Channel, Recipe,
-                         RecipeMapping, RecipeCondition,
-                         Trigger, TriggerInput, TriggerOutput)
-from core.utils import get_local_url, replace_text_mappings
+from core.models import (Action, ActionInput, BeatLease, Channel, Recipe,
+                         RecipeMapping, RecipeCondition, RecipeVersion,
+                         Trigger, TriggerInput, TriggerOutput, value_hash)
+from core.registry import ChannelRegistry
+from core.routing import RecipeIndex, recipe_index
+from core.templating import MappingTemplate, compile_template, render_mappings
+from core.utils import (get_local_url, replace_text_mappings,
+                        get_channel_instance)
 
 
 class BaseTestCase(TestCase):
@@ -62,7 +87,14 @@ class BaseTestCase(TestCase):
 class TaskTest(BaseTestCase):
 
     def setUp(self):
+        recipe_index.clear()
         super().setUp()
+        # run the per-recipe tasks right away
+        patcher = patch('core.tasks.run_recipe.delay',
+                        side_effect=lambda *args: tasks.run_recipe.apply(
+                            args))
+        patcher.start()
+        self.addCleanup(patcher.stop)
         self.inputs_mock = {self.action_input.name: self.trigger_output}
         self.inputs_filled = {'test': 'test_data'}
 
@@ -258,4 +290,776 @@ class TaskTest(BaseTestCase):
                              self.user.pk,
                              self.payload)
         mock_fill_recipe_mappings.assert_called_once()
+        # the action may have had an effect, it is not retried
         mock_handle_action.assert_called_once()
+
+    @patch('channel_twitter.channel.TwitterChannel.handle_action')
+    @patch('channel_twitter.channel.TwitterChannel.fill_recipe_mappings')
+    def test_task_handle_action_transient_error(
+            self, mock_fill_recipe_mappings, mock_handle_action):
+
+        mock_handle_action.side_effect = requests.ConnectTimeout
+        tasks.handle_trigger(self.trigger_channel.name,
+                             self.trigger.trigger_type,
+                             self.user.pk,
+                             self.payload)
+        # the first attempt and all retries
+        self.assertEqual(mock_fill_recipe_mappings.call_count,
+                         tasks.ACTION_MAX_RETRIES + 1)
+        self.assertEqual(mock_handle_action.call_count,
+                         tasks.ACTION_MAX_RETRIES + 1)
+
+    @patch('channel_twitter.channel.TwitterChannel.handle_action')
+    @patch('channel_twitter.channel.TwitterChannel.fill_recipe_mappings')
+    def test_task_handle_action_retry_succeeds(
+            self, mock_fill_recipe_mappings, mock_handle_action):
+
+        mock_fill_recipe_mappings.return_value = self.inputs_filled
+        response = Mock(status_code=503)
+        mock_handle_action.side_effect = [
+            requests.HTTPError(response=response), None]
+        tasks.handle_trigger(self.trigger_channel.name,
+                             self.trigger.trigger_type,
+                             self.user.pk,
+                             self.payload)
+        self.assertEqual(mock_handle_action.call_count, 2)
+        mock_handle_action.assert_called_with(action_type=200,
+                                              userid=self.user.pk,
+                                              inputs=self.inputs_filled)
+
+    def test_transient_errors(self):
+        self.assertTrue(tasks._is_transient(requests.ConnectTimeout()))
+        refused = MaxRetryError(None, '/', NewConnectionError(None, ''))
+        self.assertTrue(tasks._is_transient(requests.ConnectionError(refused)))
+        for status_code in (429, 503):
+            self.assertTrue(tasks._is_transient(
+                requests.HTTPError(response=Mock(status_code=status_code))))
+
+        # the request may have reached the server
+        aborted = ProtocolError('Connection aborted.')
+        self.assertFalse(tasks._is_transient(
+            requests.ConnectionError(aborted)))
+        for status_code in (400, 500, 502, 504):
+            self.assertFalse(tasks._is_transient(
+                requests.HTTPError(response=Mock(status_code=status_code))))
+        self.assertFalse(tasks._is_transient(requests.ReadTimeout()))
+        self.assertFalse(tasks._is_transient(ValueError()))
+
+    @patch('channel_twitter.channel.TwitterChannel.handle_action')
+    @patch('channel_twitter.channel.TwitterChannel.fill_recipe_mappings')
+    def test_task_failing_recipe_does_not_stop_others(
+            self, mock_fill_recipe_mappings, mock_handle_action):
+
+        self.create_recipe(self.trigger, self.action, self.user)
+        mock_fill_recipe_mappings.side_effect = [Exception,
+                                                 self.inputs_filled]
+        tasks.handle_trigger(self.trigger_channel.name,
+                             self.trigger.trigger_type,
+                             self.user.pk,
+                             self.payload)
+        self.assertEqual(mock_fill_recipe_mappings.call_count, 2)
+        mock_handle_action.assert_called_once_with(action_type=200,
+                                                   userid=self.user.pk,
+                                                   inputs=self.inputs_filled)
+
+    @patch('core.tasks.run_recipe.delay')
+    def test_task_fans_out_recipes(self, mock_delay):
+        other_recipe = self.create_recipe(self.trigger, self.action, self.user)
+        tasks.handle_trigger(self.trigger_channel.name,
+                             self.trigger.trigger_type,
+                             self.user.pk,
+                             self.payload)
+        self.assertEqual(sorted(c[0][0] for c in mock_delay.call_args_list),
+                         [self.recipe.pk, other_recipe.pk])
+        mock_delay.assert_any_call(self.recipe.pk,
+                                   self.trigger_channel.name,
+                                   self.trigger.trigger_type,
+                                   self.user.pk,
+                                   self.payload,
+                                   self.conditions_dict,
+                                   self.inputs_mock,
+                                   self.action_channel.name,
+                                   self.action.action_type)
+
+    @patch('channel_twitter.channel.TwitterChannel.handle_action')
+    @patch('channel_twitter.channel.TwitterChannel.fill_recipe_mappings')
+    def test_task_number_of_queries_independent_of_recipe_count(
+            self, mock_fill_recipe_mappings, mock_handle_action):
+
+        mock_fill_recipe_mappings.return_value = self.inputs_filled
+
+        for i in range(10):
+            recipe = self.create_recipe(self.trigger, self.action, self.user)
+            self.create_recipe_mapping(recipe,
+                                       self.trigger_output,
+                                       self.action_input)
+            self.create_recipe_condition(recipe,
+                                         self.trigger_input,
+                                         "test value")
+
+        # versions, channel, recipes (incl. actions), mappings and conditions
+        with self.assertNumQueries(5):
+            tasks.handle_trigger(self.trigger_channel.name,
+                                 self.trigger.trigger_type,
+                                 self.user.pk,
+                                 self.payload)
+
+        self.assertEqual(mock_fill_recipe_mappings.call_count, 11)
+        self.assertEqual(mock_handle_action.call_count, 11)
+
+        # the recipes are taken from the index the second time, only the
+        # versions are read
+        with self.assertNumQueries(1):
+            tasks.handle_trigger(self.trigger_channel.name,
+                                 self.trigger.trigger_type,
+                                 self.user.pk,
+                                 self.payload)
+
+        self.assertEqual(mock_handle_action.call_count, 22)
+        mock_fill_recipe_mappings.assert_called_with(
+                                        trigger_type=self.trigger.trigger_type,
+                                        userid=self.user.id,
+                                        payload=self.payload,
+                                        conditions=self.conditions_dict,
+                                        mappings=self.inputs_mock)
+
+    @patch('channel_twitter.channel.TwitterChannel.handle_action')
+    @patch('channel_twitter.channel.TwitterChannel.fill_recipe_mappings')
+    def test_task_recipe_index_invalidated_on_change(
+            self, mock_fill_recipe_mappings, mock_handle_action):
+
+        mock_fill_recipe_mappings.return_value = self.inputs_filled
+
+        tasks.handle_trigger(self.trigger_channel.name,
+                             self.trigger.trigger_type,
+                             self.user.pk,
+                             self.payload)
+        self.assertEqual(len(recipe_index), 1)
+
+        self.recipe_mapping.trigger_output = "changed"
+        self.recipe_mapping.save()
+        self.assertEqual(len(recipe_index), 0)
+
+        tasks.handle_trigger(self.trigger_channel.name,
+                             self.trigger.trigger_type,
+                             self.user.pk,
+                             self.payload)
+
+        mock_fill_recipe_mappings.assert_called_with(
+                                        trigger_type=self.trigger.trigger_type,
+                                        userid=self.user.id,
+                                        payload=self.payload,
+                                        conditions=self.conditions_dict,
+                                        mappings={"image_data": "changed"})
+
+        self.recipe.delete()
+        self.assertEqual(len(recipe_index), 0)
+
+    @patch('channel_twitter.channel.TwitterChannel.handle_action')
+    @patch('channel_twitter.channel.TwitterChannel.fill_recipe_mappings')
+    def test_task_recipe_index_of_other_process(
+            self, mock_fill_recipe_mappings, mock_handle_action):
+        mock_fill_recipe_mappings.return_value = self.inputs_filled
+        # the index of another worker process, which the signals of this
+        # one do not reach
+        other_index = RecipeIndex()
+
+        with patch('core.tasks.recipe_index', other_index):
+            tasks.handle_trigger(self.trigger_channel.name,
+                                 self.trigger.trigger_type,
+                                 self.user.pk,
+                                 self.payload)
+            self.assertEqual(len(other_index), 1)
+
+            self.recipe_mapping.trigger_output = "changed"
+            self.recipe_mapping.save()
+            tasks.handle_trigger(self.trigger_channel.name,
+                                 self.trigger.trigger_type,
+                                 self.user.pk,
+                                 self.payload)
+            mock_fill_recipe_mappings.assert_called_with(
+                    trigger_type=self.trigger.trigger_type,
+                    userid=self.user.id,
+                    payload=self.payload,
+                    conditions=self.conditions_dict,
+                    mappings={"image_data": "changed"})
+
+            self.recipe.delete()
+            mock_fill_recipe_mappings.reset_mock()
+            tasks.handle_trigger(self.trigger_channel.name,
+                                 self.trigger.trigger_type,
+                                 self.user.pk,
+                                 self.payload)
+            mock_fill_recipe_mappings.assert_not_called()
+
+    @patch('channel_twitter.channel.TwitterChannel.handle_action')
+    @patch('channel_twitter.channel.TwitterChannel.fill_recipe_mappings')
+    def test_task_does_not_modify_indexed_mappings(
+            self, mock_fill_recipe_mappings, mock_handle_action):
+
+        def fill(mappings, **kwargs):
+            mappings["image_data"] = "filled"
+            return mappings
+        mock_fill_recipe_mappings.side_effect = fill
+
+        for i in range(2):
+            tasks.handle_trigger(self.trigger_channel.name,
+                                 self.trigger.trigger_type,
+                                 self.user.pk,
+                                 self.payload)
+
+        key = recipe_index.key(self.trigger_channel.name,
+                               self.trigger.trigger_type,
+                               self.user.pk)
+        version = RecipeVersion.objects.get(user=self.user).version
+        self.assertEqual(recipe_index.get(key, version)[0].mappings,
+                         self.inputs_mock)
+
+    @patch('channel_twitter.channel.TwitterChannel.handle_action')
+    @patch('channel_twitter.channel.TwitterChannel.fill_recipe_mappings')
+    def test_task_batch(self, mock_fill_recipe_mappings, mock_handle_action):
+        mock_fill_recipe_mappings.return_value = self.inputs_filled
+
+        other_user = User.objects.create_user('Otheruser')
+        other_trigger = self.create_trigger(channel=self.trigger_channel,
+                                            trigger_type=201,
+                                            name="Other Trigger")
+        for user in [self.user, other_user]:
+            recipe = self.create_recipe(other_trigger, self.action, user)
+            self.create_recipe_mapping(recipe,
+                                       self.trigger_output,
+                                       self.action_input)
+
+        groups = [[self.trigger.trigger_type, self.user.pk, [{"n": 1}]],
+                  [other_trigger.trigger_type, self.user.pk, [{"n": 2}]],
+                  [other_trigger.trigger_type, other_user.pk,
+                   [{"n": 3}, {"n": 4}]]]
+
+        # the recipes of all groups are loaded at once
+        with self.assertNumQueries(5):
+            tasks.handle_trigger_batch(self.trigger_channel.name, groups)
+
+        payloads = [c[1]['payload']
+                    for c in mock_fill_recipe_mappings.call_args_list]
+        self.assertEqual(payloads, [{"n": 1}, {"n": 2}, {"n": 3}, {"n": 4}])
+        mock_fill_recipe_mappings.assert_called_with(
+            trigger_type=other_trigger.trigger_type,
+            userid=other_user.pk,
+            payload={"n": 4},
+            conditions={},
+            mappings=self.inputs_mock)
+        self.assertEqual(mock_handle_action.call_count, 4)
+
+
+class CoreTest(TestCase):
+
+    @patch('core.tasks.handle_trigger_batch.delay')
+    def test_handle_triggers_groups_events(self, mock_delay):
+        events = [
+            {'channel_name': 'RSS', 'trigger_type': 100, 'userid': 1,
+             'payload': {'n': 1}},
+            {'channel_name': 'Clock', 'trigger_type': 1, 'userid': 1,
+             'payload': None},
+            {'channel_name': 'RSS', 'trigger_type': 100, 'userid': 2,
+             'payload': {'n': 2}},
+            {'channel_name': 'RSS', 'trigger_type': 100, 'userid': 1,
+             'payload': {'n': 3}},
+        ]
+        Core().handle_triggers(events)
+
+        self.assertEqual(mock_delay.call_count, 2)
+        mock_delay.assert_any_call('RSS', [[100, 1, [{'n': 1}, {'n': 3}]],
+                                           [100, 2, [{'n': 2}]]])
+        mock_delay.assert_any_call('Clock', [[1, 1, [None]]])
+
+    @override_settings(TRIGGER_BATCH_SIZE=2)
+    @patch('core.tasks.handle_trigger_batch.delay')
+    def test_handle_triggers_splits_batches(self, mock_delay):
+        Core().handle_triggers({'channel_name': 'Clock',
+                                'trigger_type': 1,
+                                'userid': userid,
+                                'payload': None} for userid in range(5))
+
+        self.assertEqual(mock_delay.call_count, 3)
+        mock_delay.assert_called_with('Clock', [[1, 4, [None]]])
+
+    @override_settings(TRIGGER_BATCH_SIZE=2)
+    @patch('core.tasks.handle_trigger_batch.delay')
+    def test_handle_triggers_splits_groups(self, mock_delay):
+        events = [{'channel_name': 'RSS', 'trigger_type': 100, 'userid': 1,
+                   'payload': {'n': n}} for n in range(3)]
+        events.append({'channel_name': 'RSS', 'trigger_type': 100,
+                       'userid': 2, 'payload': {'n': 3}})
+        Core().handle_triggers(events)
+
+        self.assertEqual(
+            [c[0][1] for c in mock_delay.call_args_list],
+            [[[100, 1, [{'n': 0}, {'n': 1}]]],
+             [[100, 1, [{'n': 2}]], [100, 2, [{'n': 3}]]]])
+
+
+class MappingTemplateTest(TestCase):
+
+    def test_render(self):
+        template = MappingTemplate('%title%: %summary% (%link%)')
+        self.assertEqual(template.fields, {'title', 'summary', 'link'})
+        self.assertEqual(template.render({'title': 'News',
+                                          'summary': 'text',
+                                          'link': 'example.com'}),
+                         'News: text (example.com)')
+
+    def test_unknown_placeholders_are_kept(self):
+        template = MappingTemplate('%title% by %author% - 100% sure')
+        self.assertEqual(template.render({'title': 'News'}),
+                         'News by %author% - 100% sure')
+        self.assertEqual(template.render({'title': 'News', 'author': 'paul'},
+                                         fields={'title'}),
+                         'News by %author% - 100% sure')
+
+    def test_values_are_not_rendered_again(self):
+        template = MappingTemplate('%a% %b%')
+        self.assertEqual(template.render({'a': '%b%', 'b': 'x'}), '%b% x')
+
+    def test_compiled_templates_are_cached(self):
+        self.assertIs(compile_template('%a%'), compile_template('%a%'))
+
+    def test_render_mappings(self):
+        data = object()
+        mappings = {'text': 'hi %name%', 'file': data}
+        res = render_mappings(mappings, {'name': 'paul'})
+        self.assertEqual(res, {'text': 'hi paul', 'file': data})
+        self.assertEqual(mappings['text'], 'hi %name%')
+
+
+class MediaCacheTest(TestCase):
+
+    def setUp(self):
+        media_dir = TemporaryDirectory()
+        self.addCleanup(media_dir.cleanup)
+        self.cache = MediaCache(media_dir.name, max_bytes=100)
+
+    def blobs(self):
+        return os.listdir(os.path.join(self.cache.directory, 'blobs'))
+
+    @responses.activate
+    def test_second_request_is_served_from_cache(self):
+        responses.add(responses.GET, 'http://example.com/a', body=b'image')
+
+        for _ in range(2):
+            with self.cache.open('http://example.com/a') as media_file:
+                self.assertEqual(media_file.read(), b'image')
+
+        self.assertEqual(len(responses.calls), 1)
+        self.assertEqual(self.cache.stats(),
+                         {'hits': 1, 'misses': 1, 'evictions': 0})
+
+    @responses.activate
+    def test_same_content_is_stored_once(self):
+        responses.add(responses.GET, 'http://example.com/a', body=b'image')
+        responses.add(responses.GET, 'http://example.com/b', body=b'image')
+
+        self.cache.open('http://example.com/a').close()
+        self.cache.open('http://example.com/b').close()
+
+        self.assertEqual(len(self.blobs()), 1)
+
+    @responses.activate
+    def test_least_recently_used_files_are_evicted(self):
+        for name in 'abc':
+            responses.add(responses.GET, 'http://example.com/' + name,
+                          body=name.encode() * 40)
+
+        self.cache.open('http://example.com/a').close()
+        time.sleep(0.01)
+        self.cache.open('http://example.com/b').close()
+        time.sleep(0.01)
+        # a is used again, so b is the least recently used file
+        self.cache.open('http://example.com/a').close()
+        time.sleep(0.01)
+        self.cache.open('http://example.com/c').close()
+
+        self.assertEqual(len(self.blobs()), 2)
+        self.assertEqual(self.cache.evictions, 1)
+
+        with self.cache.open('http://example.com/a') as media_file:
+            self.assertEqual(media_file.read(), b'a' * 40)
+        self.assertEqual(len(responses.calls), 3)
+
+    def url_entries(self):
+        urls = os.path.join(self.cache.directory, 'urls')
+        return [os.path.join(urls, name) for name in os.listdir(urls)]
+
+    def expire(self, path):
+        os.utime(path, (time.time() - 61, time.time() - 61))
+
+    @responses.activate
+    def test_expired_url_is_downloaded_again(self):
+        bodies = [b'old', b'new']
+        responses.add_callback(responses.GET, 'http://example.com/a',
+                               callback=lambda request: (200, {},
+                                                         bodies.pop(0)))
+        self.cache.ttl = 60
+
+        self.cache.open('http://example.com/a').close()
+        self.expire(self.url_entries()[0])
+
+        with self.cache.open('http://example.com/a') as media_file:
+            self.assertEqual(media_file.read(), b'new')
+        self.assertEqual(len(responses.calls), 2)
+
+    @responses.activate
+    def test_expired_url_entries_are_removed(self):
+        for name in 'ab':
+            responses.add(responses.GET, 'http://example.com/' + name,
+                          body=name.encode())
+        self.cache.ttl = 60
+
+        self.cache.open('http://example.com/a').close()
+        self.expire(self.url_entries()[0])
+        self.cache._scanned = 0
+        self.cache.open('http://example.com/b').close()
+
+        self.assertEqual(len(self.url_entries()), 1)
+
+    @responses.activate
+    def test_lock_files_are_kept(self):
+        for name in 'abc':
+            responses.add(responses.GET, 'http://example.com/' + name,
+                          body=name.encode() * 40)
+
+        for name in 'abc':
+            self.cache.open('http://example.com/' + name).close()
+
+        # one lock file per stripe, also for the evicted url
+        self.assertEqual(self.cache.evictions, 1)
+        self.assertEqual(
+            len(os.listdir(os.path.join(self.cache.directory, 'locks'))), 3)
+
+    @patch('core.media.MediaCache._evict')
+    @responses.activate
+    def test_directory_is_scanned_above_budget(self, mock_evict):
+        for name in 'abc':
+            responses.add(responses.GET, 'http://example.com/' + name,
+                          body=name.encode() * 40)
+        self.cache._size = 0
+        self.cache._scanned = time.monotonic()
+
+        self.cache.open('http://example.com/a').close()
+        self.cache.open('http://example.com/b').close()
+        mock_evict.assert_not_called()
+        self.cache.open('http://example.com/c').close()
+        mock_evict.assert_called_once_with()
+
+    @responses.activate
+    def test_other_urls_do_not_wait_for_a_download(self):
+        started = Event()
+        released = Event()
+
+        def slow_response(request):
+            started.set()
+            released.wait(5)
+            return (200, {}, b'video')
+
+        responses.add_callback(responses.GET, 'http://example.com/a',
+                               callback=slow_response)
+        responses.add(responses.GET, 'http://example.com/b', body=b'image')
+
+        thread = Thread(target=lambda: self.cache.open(
+            'http://example.com/a').close())
+        thread.start()
+        started.wait(5)
+        self.cache.open('http://example.com/b').close()
+        self.assertFalse(released.is_set())
+        released.set()
+        thread.join()
+
+    @responses.activate
+    def test_failed_download(self):
+        responses.add(responses.GET, 'http://example.com/a', status=404)
+
+        with self.assertRaises(requests.HTTPError):
+            self.cache.open('http://example.com/a')
+        self.assertEqual(self.blobs(), [])
+
+    @responses.activate
+    def test_concurrent_requests_download_once(self):
+        def slow_response(request):
+            time.sleep(0.1)
+            return (200, {}, b'video')
+
+        responses.add_callback(responses.GET, 'http://example.com/a',
+                               callback=slow_response)
+
+        threads = [Thread(target=lambda: self.cache.open(
+            'http://example.com/a').close()) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(responses.calls), 1)
+        self.assertEqual(self.cache.hits, 3)
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Fails the first request of each method with 503."""
+
+    def respond(self):
+        self.server.calls.append(self.command)
+        if self.server.calls.count(self.command) == 1:
+            self.send_response(503)
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        self.respond()
+
+    def do_POST(self):
+        self.respond()
+
+    def log_message(self, *args):
+        pass
+
+
+class HttpClientTest(TestCase):
+
+    def setUp(self):
+        host_metrics.clear()
+
+    def start_server(self):
+        server = HTTPServer(('127.0.0.1', 0), FlakyHandler)
+        server.calls = []
+        Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server, 'http://127.0.0.1:{}/'.format(server.server_port)
+
+    @override_settings(HTTP_TIMEOUTS={'default': (1, 2),
+                                      'facebook': (1, 60)})
+    def test_timeouts_per_channel(self):
+        self.assertEqual(HttpClient('Facebook').timeout, (1, 60))
+        self.assertEqual(HttpClient('Github').timeout, (1, 2))
+
+    @patch('core.http.session.request')
+    def test_timeout_is_applied(self, mock_request):
+        mock_request.return_value = Mock(status_code=200)
+        client = HttpClient('Github')
+        client.get('https://api.github.com/user')
+        client.get('https://api.github.com/user', timeout=5)
+
+        self.assertEqual(mock_request.call_args_list[0][1]['timeout'],
+                         client.timeout)
+        self.assertEqual(mock_request.call_args_list[1][1]['timeout'], 5)
+
+    def test_idempotent_requests_are_retried(self):
+        server, url = self.start_server()
+        client = HttpClient('Github')
+
+        self.assertEqual(client.get(url).status_code, 200)
+        self.assertEqual(client.post(url).status_code, 503)
+        self.assertEqual(server.calls, ['GET', 'GET', 'POST'])
+
+    def test_host_metrics(self):
+        server, url = self.start_server()
+        client = HttpClient('Github')
+        client.post(url)
+        client.post(url)
+
+        metrics = host_metrics.snapshot()['127.0.0.1:{}'.format(
+            server.server_port)]
+        self.assertEqual(metrics['requests'], 2)
+        self.assertEqual(metrics['errors'], 1)
+        self.assertGreater(metrics['mean_seconds'], 0)
+
+
+class ValueHashTest(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user('user', 'user@example.com', 'pw')
+        channel = Channel.objects.create(name="Test", color="#000000",
+                                         image="", font_color="#ffffff")
+        self.trigger = Trigger.objects.create(channel=channel,
+                                              trigger_type=100, name="Test")
+        action = Action.objects.create(channel=channel, action_type=100,
+                                       name="Test")
+        self.recipe = Recipe.objects.create(trigger=self.trigger,
+                                            action=action, user=user)
+        self.recipe_condition = RecipeCondition.objects.create(
+            recipe=self.recipe,
+            trigger_input=TriggerInput.objects.create(trigger=self.trigger,
+                                                      name="test input"),
+            value="test value")
+
+    def assertHashes(self):
+        for condition in RecipeCondition.objects.all():
+            self.assertEqual(condition.value_hash, value_hash(condition.value))
+
+    def test_save(self):
+        self.recipe_condition.value = "other value"
+        self.recipe_condition.save()
+        self.assertHashes()
+
+    def test_raw_save(self):
+        self.recipe_condition.value = "other value"
+        self.recipe_condition.save_base(raw=True)
+        self.assertHashes()
+
+    def test_bulk_create(self):
+        other_input = TriggerInput.objects.create(trigger=self.trigger,
+                                                  name="other input")
+        RecipeCondition.objects.bulk_create([
+            RecipeCondition(recipe=self.recipe, trigger_input=other_input,
+                            value="other value")])
+        self.assertEqual(RecipeCondition.objects.count(), 2)
+        self.assertHashes()
+
+    def test_update(self):
+        RecipeCondition.objects.filter(recipe=self.recipe) \
+            .update(value="other value")
+        self.assertHashes()
+
+    def test_update_with_expression(self):
+        with self.assertRaises(TypeError):
+            RecipeCondition.objects.update(value=F('trigger_input__name'))
+
+
+class RecipeIndexTest(TestCase):
+
+    def test_lru_eviction(self):
+        index = RecipeIndex(max_entries=2)
+        index.set(('rss', 100, 1), [])
+        index.set(('rss', 100, 2), [])
+        index.get(('rss', 100, 1))
+        index.set(('rss', 100, 3), [])
+
+        self.assertEqual(index.get(('rss', 100, 1)), ())
+        self.assertIsNone(index.get(('rss', 100, 2)))
+        self.assertEqual(index.get(('rss', 100, 3)), ())
+
+    def test_ttl(self):
+        index = RecipeIndex(ttl=-1)
+        index.set(('rss', 100, 1), [])
+        self.assertIsNone(index.get(('rss', 100, 1)))
+
+    def test_invalidate_user(self):
+        index = RecipeIndex()
+        index.set(index.key('RSS', 100, 1), [])
+        index.set(index.key('Clock', 1, 1), [])
+        index.set(index.key('RSS', 100, 2), [])
+        index.invalidate_user(1)
+
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.get(('rss', 100, 2)), ())
+
+    def test_version(self):
+        index = RecipeIndex()
+        index.set(('rss', 100, 1), [], version=1)
+
+        self.assertIsNone(index.get(('rss', 100, 1), version=2))
+        self.assertEqual(len(index), 0)
+
+
+class LeaderLeaseTest(TestCase):
+
+    def test_one_holder(self):
+        first = LeaderLease('beat', 30)
+        second = LeaderLease('beat', 30)
+        self.assertTrue(first.acquire())
+        self.assertFalse(second.acquire())
+        # renewed by the holder
+        self.assertTrue(first.acquire())
+        self.assertFalse(second.acquire())
+        self.assertTrue(LeaderLease('other', 30).acquire())
+
+    def test_take_over_expired_lease(self):
+        first = LeaderLease('beat', 30)
+        second = LeaderLease('beat', 30)
+        self.assertTrue(first.acquire())
+        BeatLease.objects.update(expires=timezone.now() - timedelta(seconds=1))
+
+        self.assertTrue(second.acquire())
+        self.assertFalse(first.acquire())
+
+    def test_clock_skew(self):
+        first = LeaderLease('beat', 30)
+        second = LeaderLease('beat', 30)
+        self.assertTrue(first.acquire())
+        expires = BeatLease.objects.get().expires
+        self.assertAlmostEqual(expires.timestamp(), time.time() + 30, delta=5)
+
+        # the lease expires by the database time, not by the host clock
+        with patch('django.utils.timezone.now',
+                   return_value=timezone.now() + timedelta(hours=1)):
+            self.assertFalse(second.acquire())
+
+    def test_release(self):
+        first = LeaderLease('beat', 30)
+        second = LeaderLease('beat', 30)
+        self.assertTrue(first.acquire())
+        first.release()
+        self.assertTrue(second.acquire())
+
+
+class LeaderSchedulerTest(TestCase):
+
+    def create_scheduler(self):
+        return LeaderScheduler(Mock(), max_interval=300, Publisher=Mock(),
+                               lazy=True)
+
+    @patch('celery.beat.PersistentScheduler.tick', return_value=60)
+    @override_settings(BEAT_LEASE_TIMEOUT=30)
+    def test_only_leader_sends_tasks(self, mock_tick):
+        leader = self.create_scheduler()
+        standby = self.create_scheduler()
+
+        self.assertEqual(leader.tick(), 10)
+        self.assertEqual(standby.tick(), 10)
+        mock_tick.assert_called_once_with()
+        self.assertTrue(leader.is_leader)
+        self.assertFalse(standby.is_leader)
+
+    @patch('celery.beat.PersistentScheduler.close')
+    @patch('celery.beat.PersistentScheduler.tick', return_value=5)
+    def test_failover(self, mock_tick, mock_close):
+        leader = self.create_scheduler()
+        standby = self.create_scheduler()
+        self.assertEqual(leader.tick(), 5)
+
+        leader.close()
+        self.assertEqual(standby.tick(), 5)
+        self.assertTrue(standby.is_leader)
+        self.assertEqual(mock_tick.call_count, 2)
+
+
+class ChannelRegistryTest(TestCase):
+
+    def test_discovers_channel_apps(self):
+        registry = ChannelRegistry()
+        self.assertIn('rss', registry.names())
+        self.assertIn('dropbox', registry.names())
+        self.assertEqual(type(registry.get('RSS')).__name__, 'RssChannel')
+
+    def test_instances_are_reused(self):
+        self.assertIs(get_channel_instance('Twitter'),
+                      get_channel_instance('twitter'))
+
+    def test_unknown_channel(self):
+        with self.assertRaises(ImportError):
+            get_channel_instance('NotExistentChannel')
+
+    @patch('core.registry.import_module')
+    @patch('core.registry.apps.get_app_configs')
+    def test_class_not_implementing_channel(self, mock_get_app_configs,
+                                            mock_import_module):
+        class TwitterChannel():
+            pass
+        app_config = Mock()
+        app_config.name = 'channel_twitter'
+        mock_get_app_configs.return_value = [app_config]
+        mock_import_module.return_value = Mock(TwitterChannel=TwitterChannel)
+
+        with self.assertRaises(ImproperlyConfigured):
+            ChannelRegistry().load()
+        mock_import_module.assert_called_once_with('channel_twitter.channel')
@@ -1,8 +1,9 @@
-from tempfile import TemporaryFile
 import requests
 from django.contrib.sites.models import Site
 import logging
-from importlib import import_module
+from core.media import media_cache
+from core.registry import channel_registry
+from core.templating import render_mappings
 
 log = logging.getLogger("channel")
 
@@ -25,40 +26,27 @@ def get_local_url():
 
 
 def download_file(url):
-    r = requests.get(url, stream=True)
-    if r.ok:
-        tmp_file = TemporaryFile()
-        for chunk in r.iter_content(chunk_size=1024):
-            if chunk:
-                tmp_file.write(chunk)
-        tmp_file.seek(0)
-        return tmp_file
-    else:
+    """Return the file at url, taken from the media cache if possible."""
+    try:
+        return media_cache.open(url)
+    except requests.HTTPError as e:
         log.error("Error while downloading media")
-        log.error(r.json())
+        log.error(e)
         raise ApiException("InternalDownloadError",
-                           r.status_code,
+                           e.response.status_code,
                            "Error while loading file %s" % url)
 
 
 def replace_text_mappings(mappings, to_replace, payload):
-    for key in mappings:
-        val = mappings[key]
-        if type(val) is str:
-            for s in to_replace:
-                # replace any placeholder by its concrete value
-                placeholder = '%{}%'.format(s)
-                val = val.replace(placeholder,
-                                  payload[s])
-            mappings[key] = val
+    # replace the placeholders named in to_replace by their concrete values
+    mappings.update(render_mappings(mappings, payload, frozenset(to_replace)))
     return mappings
 
 
 def get_channel_instance(channel):
+    """Return the shared instance of the channel with the given name.
 
-    module_name = 'channel_{}.channel'.format(channel.lower())
-    channel_module = import_module(module_name)
-    channel_class_name = '{}Channel'.format(channel.capitalize())
-    channel_instance = getattr(channel_module, channel_class_name)()
-
-    return channel_instance
+    Raises:
+        ImportError: If there is no such channel.
+    """
+    return channel_registry.get(channel)
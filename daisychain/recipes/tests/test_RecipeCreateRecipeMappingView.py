@@ -75,7 +75,7 @@ class RecipeCreateRecipeMappingViewTest(RecipeTestCase):
         self.set_recipe_draft({
             'trigger_channel_id': sessionTrigger.channel.id,
             'trigger_id': sessionTrigger.id,
-            'action_id': 99,
+            'action_id': Action.objects.latest('id').id + 1,
             'action_channel_id': testAction.channel.id
         })
         res = self.client.get(reverse("recipes:new_step6"), follow=True)